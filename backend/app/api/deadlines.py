@@ -0,0 +1,22 @@
+from fastapi import Header
+from typing import Optional
+from app.services.deadline import DEADLINE_MAX, set_deadline
+
+
+def request_deadline(default: float):
+    """
+    Dependency factory: the request gets `default` seconds, or what the client
+    sent in X-Request-Timeout (capped at REQUEST_DEADLINE_MAX). Outbound Groq
+    and Supabase calls made for it derive their timeouts from what is left (see
+    app.services.deadline). Async so the contextvar is set in the endpoint's task.
+    """
+    async def dependency(x_request_timeout: Optional[str] = Header(None)):
+        seconds = default
+        if x_request_timeout:
+            try:
+                seconds = min(DEADLINE_MAX, max(0.0, float(x_request_timeout)))
+            except ValueError:
+                pass
+        set_deadline(seconds)
+
+    return dependency
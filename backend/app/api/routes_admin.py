@@ -0,0 +1,38 @@
+from fastapi import APIRouter, Header, HTTPException, Query
+from typing import Optional
+from app.services.groq_service import groq_client
+from app.services.llm_usage import llm_usage
+import hmac
+import os
+
+router = APIRouter()
+
+# Bearer token for /admin; empty disables every admin route
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "").strip()
+
+
+def _require_admin(authorization: Optional[str]):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin API disabled (ADMIN_TOKEN not set)")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip(), ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+@router.get("/llm-usage", summary="LLM token usage of this worker, per user, endpoint or template")
+async def llm_usage_report(
+    day: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$", description="UTC day, default today"),
+    group_by: str = Query("user", pattern="^(user|endpoint|template)$"),
+    authorization: Optional[str] = Header(None),
+):
+    """
+    Running totals since this worker started (kept LLM_USAGE_DAYS days), with the
+    current adaptive max_tokens per template. Durable history is in the flushed sinks.
+    """
+    _require_admin(authorization)
+    return {
+        "pid": os.getpid(),
+        **llm_usage.report(day, group_by),
+        "ledger": llm_usage.stats(),
+        "groq": groq_client.stats(),
+    }
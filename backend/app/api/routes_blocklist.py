@@ -0,0 +1,431 @@
+import json
+from datetime import datetime, timezone
+from fastapi import APIRouter, Body, Depends, HTTPException, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from typing import List, Optional, Tuple
+from app.services.blocklist_service import (
+    get_blocklist,
+    add_custom,
+    remove_custom,
+    subscribe_categories,
+    unsubscribe_category,
+    add_scheduled,
+    remove_scheduled,
+    add_patterns,
+    remove_pattern,
+    active_blocklist,
+)
+from app.services.blocklist_patterns import PATTERN_MAX_PER_TOKEN, parse_pattern
+from app.services.blocklist_schedule import SCHEDULE_SEP, Schedule, parse_schedule
+from app.services.blocklist_categories import blocklist_categories
+from app.services.blocklist_import import import_domains, get_import_status
+from app.services.domain_utils import normalize_domain
+from app.services.blocklist_match import MAX_BATCH_CHECK, check_many
+from app.services.blocklist_changes import blocklist_changelog
+from app.services.blocklist_cache import CachedBlocklist
+from app.services.blocklist_dnr import render_dnr_bytes, dnr_diff
+from app.services.blocklist_events import blocklist_events
+from app.services.blocklist_render import FORMATS, render_parts, render_json_bytes, iter_render, rules_saved
+from app.api.deadlines import request_deadline
+import os
+
+router = APIRouter()
+
+# Budget for one list read/write, Supabase included, unless X-Request-Timeout says otherwise.
+# Not applied to imports and event streams, which legitimately run long.
+BLOCKLIST_DEADLINE = float(os.getenv("BLOCKLIST_REQUEST_DEADLINE", "5"))
+_DEADLINE = Depends(request_deadline(BLOCKLIST_DEADLINE))
+
+# Clients may keep the body but must revalidate with If-None-Match every time
+_CACHE_HEADERS = {"Cache-Control": "no-cache"}
+
+
+def _transition(next_at: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(next_at, timezone.utc).isoformat() if next_at is not None else None
+
+
+def _list_headers(entry: CachedBlocklist, etag: str, compacted: bool = False, next_at: Optional[float] = None) -> dict:
+    # The cursor lets a client that just downloaded a full list continue with /changes
+    headers = {"ETag": etag, "X-Blocklist-Cursor": blocklist_changelog.cursor(entry), **_CACHE_HEADERS}
+    if compacted:
+        headers["X-Blocklist-Rules-Saved"] = str(rules_saved(entry))
+    if next_at is not None:
+        # The output (and its ETag) changes at this time even without a write
+        headers["X-Blocklist-Next-Transition"] = _transition(next_at)
+    return headers
+
+
+async def _current(token: str) -> Tuple[CachedBlocklist, Optional[float]]:
+    """The token's list for the schedule window active now, and when that window ends."""
+    return active_blocklist(await get_blocklist(token))
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """True when the client's If-None-Match already names this representation."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [c.strip() for c in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, **_CACHE_HEADERS})
+
+
+async def _rendered(token: str, request: Request, fmt: str) -> Response:
+    """Serve a format from cached parts: shared category bodies plus the token's own bytes."""
+    entry, next_at = await _current(token)
+    etag = entry.etag(fmt)
+    if _etag_matches(request, etag):
+        return _not_modified(etag)
+    parts = render_parts(entry, fmt)
+    if parts is None:
+        return await _streamed(token, request, fmt)
+    headers = _list_headers(entry, etag, FORMATS[fmt].suffix, next_at)
+    headers["Content-Length"] = str(sum(len(p) for p in parts))
+    return StreamingResponse(iter(parts), media_type=FORMATS[fmt].media_type, headers=headers)
+
+
+async def _streamed(token: str, request: Request, fmt: str) -> Response:
+    """Stream a format chunk by chunk so large lists never become one string."""
+    entry, next_at = await _current(token)
+    etag = entry.etag(fmt)
+    if _etag_matches(request, etag):
+        return _not_modified(etag)
+    headers = _list_headers(entry, etag, FORMATS[fmt].suffix, next_at)
+    return StreamingResponse(iter_render(entry, fmt), media_type=FORMATS[fmt].media_type, headers=headers)
+
+# ---------- BLOCKLIST (static MVP) ----------
+@router.get("/domains.txt", response_class=PlainTextResponse)
+def blocklist_domains_txt():
+    """
+    Return a newline-separated list of domains suitable for DNS/content-blocking lists.
+    MVP: static list. Later, make this per-user.
+    """
+    domains = [
+        # Social / short-form
+        "www.youtube.com",
+        "m.youtube.com",
+        "youtube.com",
+        "www.tiktok.com",
+        "tiktok.com",
+        "www.instagram.com",
+        "instagram.com",
+        # Entertainment
+        "www.netflix.com",
+        "netflix.com",
+        # Add more domains as needed
+    ]
+    return "\n".join(domains) + "\n"
+
+# ---------- CATEGORIES ----------
+@router.get("/categories")
+def blocklist_category_list():
+    """Available shared category lists. Default ones are part of every token's list."""
+    return {"categories": [c.info() for c in blocklist_categories.all()]}
+
+# ---------- BLOCKLIST (per-user token) ----------
+@router.get("/{token}.txt", response_class=PlainTextResponse, dependencies=[_DEADLINE])
+async def blocklist_token_txt(token: str, request: Request):
+    """Return the combined base + user-specific domains as newline-separated text."""
+    return await _rendered(token, request, "txt")
+
+@router.get("/{token}.filter", response_class=PlainTextResponse, dependencies=[_DEADLINE])
+async def blocklist_token_adblock(token: str, request: Request):
+    """Return Adblock-compatible filter rules for base + user-specific domains.
+    Example lines: ||twitter.com^
+    """
+    return await _rendered(token, request, "filter")
+
+@router.get("/{token}.hosts", response_class=PlainTextResponse, dependencies=[_DEADLINE])
+async def blocklist_token_hosts(token: str, request: Request):
+    """Hosts-file format. Example lines: 0.0.0.0 twitter.com"""
+    return await _streamed(token, request, "hosts")
+
+@router.get("/{token}.dnsmasq", response_class=PlainTextResponse, dependencies=[_DEADLINE])
+async def blocklist_token_dnsmasq(token: str, request: Request):
+    """dnsmasq config. Example lines: address=/twitter.com/#"""
+    return await _streamed(token, request, "dnsmasq")
+
+@router.get("/{token}.unbound", response_class=PlainTextResponse, dependencies=[_DEADLINE])
+async def blocklist_token_unbound(token: str, request: Request):
+    """unbound include file. Example lines: local-zone: "twitter.com." always_nxdomain"""
+    return await _streamed(token, request, "unbound")
+
+@router.get("/{token}.rpz", response_class=PlainTextResponse, dependencies=[_DEADLINE])
+async def blocklist_token_rpz(token: str, request: Request):
+    """DNS Response Policy Zone blocking each domain and its subdomains."""
+    return await _streamed(token, request, "rpz")
+
+# Registered before "/{token}.json", which would otherwise match "abc.dnr.json"
+@router.get("/{token}.dnr.json", dependencies=[_DEADLINE])
+async def blocklist_token_dnr(token: str, request: Request):
+    """Chrome declarativeNetRequest rules (JSON array) with stable, server-assigned IDs."""
+    entry, next_at = await _current(token)
+    etag = entry.etag("dnr")
+    if _etag_matches(request, etag):
+        return _not_modified(etag)
+    headers = _list_headers(entry, etag, compacted=True, next_at=next_at)
+    return Response(await render_dnr_bytes(entry), media_type="application/json", headers=headers)
+
+@router.get("/{token}.json", dependencies=[_DEADLINE])
+async def blocklist_token_json(token: str, request: Request):
+    entry, next_at = await _current(token)
+    etag = entry.etag("json")
+    if _etag_matches(request, etag):
+        return _not_modified(etag)
+    return Response(render_json_bytes(entry), media_type="application/json", headers=_list_headers(entry, etag, next_at=next_at))
+
+def _schedule_from(payload: dict) -> Optional[Schedule]:
+    """Optional {schedule: "mo-fr 09:00-17:00", tz: "Europe/Berlin"} part of a request body."""
+    raw = payload.get("schedule") if isinstance(payload, dict) else None
+    if raw is None:
+        return None
+    tz = payload.get("tz") or "UTC"
+    if not isinstance(raw, str) or not isinstance(tz, str):
+        raise HTTPException(status_code=400, detail="schedule and tz must be strings")
+    try:
+        return parse_schedule(raw, tz)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid schedule: {e}")
+
+@router.post("/{token}", dependencies=[_DEADLINE])
+async def blocklist_add(token: str, payload: dict = Body(...)):
+    """
+    Add one or more domains. Accepts {domain: str} or {domains: [str, ...]}.
+    With {schedule: "mo-fr 09:00-17:00", tz: "Europe/Berlin"} they are only
+    blocked inside that weekly window (tz defaults to UTC).
+    Pattern rules are added with {pattern: str} or {patterns: [str, ...]}, e.g.
+    "*.reddit.com/r/all*" or "/^ads?\\d*\\./".
+    """
+    if isinstance(payload, dict) and ("pattern" in payload or "patterns" in payload):
+        return await _add_patterns(token, payload)
+    schedule = _schedule_from(payload)
+    domains: List[str] = []
+    if isinstance(payload, dict):
+        if "domain" in payload and isinstance(payload["domain"], str):
+            domains.append(payload["domain"])
+        if "domains" in payload and isinstance(payload["domains"], list):
+            for d in payload["domains"]:
+                if isinstance(d, str):
+                    domains.append(d)
+    domains = [d.strip().lower() for d in domains if isinstance(d, str) and d.strip()]
+    if not domains:
+        raise HTTPException(status_code=400, detail="No domains provided")
+    # Accept URLs / host:port and store the bare punycode domain
+    domains = list(dict.fromkeys(n for n in map(normalize_domain, domains) if n))
+    if not domains:
+        raise HTTPException(status_code=400, detail="No valid domains provided")
+    if schedule is not None:
+        return {"scheduled": await add_scheduled(token, domains, schedule)}
+    custom = await add_custom(token, domains)
+    return {"custom": custom}
+
+async def _add_patterns(token: str, payload: dict) -> dict:
+    raw: List[str] = []
+    if isinstance(payload.get("pattern"), str):
+        raw.append(payload["pattern"])
+    if isinstance(payload.get("patterns"), list):
+        raw.extend(p for p in payload["patterns"] if isinstance(p, str))
+    if not raw:
+        raise HTTPException(status_code=400, detail="No patterns provided")
+    try:
+        patterns = list(dict.fromkeys(parse_pattern(p) for p in raw))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid pattern: {e}")
+    current = (await get_blocklist(token)).patterns
+    if len(set(current) | set(patterns)) > PATTERN_MAX_PER_TOKEN:
+        raise HTTPException(status_code=400, detail=f"At most {PATTERN_MAX_PER_TOKEN} patterns per list")
+    return {"patterns": await add_patterns(token, patterns)}
+
+@router.delete("/{token}", dependencies=[_DEADLINE])
+async def blocklist_remove(token: str, payload: dict = Body(...)):
+    """
+    Remove a domain. Accepts {domain: str}, plus {schedule, tz} for a scheduled
+    entry, or {pattern: str} for a pattern rule.
+    """
+    pattern = (payload or {}).get("pattern")
+    if isinstance(pattern, str) and pattern.strip():
+        try:
+            pattern = parse_pattern(pattern)
+        except ValueError:
+            pattern = pattern.strip()
+        return {"patterns": await remove_pattern(token, pattern)}
+    domain = (payload or {}).get("domain")
+    if not domain or not isinstance(domain, str):
+        raise HTTPException(status_code=400, detail="domain required")
+    # Same normalization as blocklist_add, so a URL, host:port or IDN removes what it added
+    domain = normalize_domain(domain) or domain.strip().lower()
+    schedule = _schedule_from(payload)
+    if schedule is not None:
+        return {"scheduled": await remove_scheduled(token, domain, schedule)}
+    custom = await remove_custom(token, domain)
+    return {"custom": custom}
+
+@router.post("/{token}/categories", dependencies=[_DEADLINE])
+async def blocklist_subscribe(token: str, payload: dict = Body(...)):
+    """Subscribe to shared categories. Accepts {category: str} or {categories: [str, ...]}"""
+    names: List[str] = []
+    if isinstance(payload, dict):
+        if isinstance(payload.get("category"), str):
+            names.append(payload["category"])
+        if isinstance(payload.get("categories"), list):
+            names.extend(n for n in payload["categories"] if isinstance(n, str))
+    names = list(dict.fromkeys(n.strip().lower() for n in names if n.strip()))
+    if not names:
+        raise HTTPException(status_code=400, detail="No categories provided")
+    unknown = [n for n in names if blocklist_categories.get(n) is None]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Unknown categories: {', '.join(unknown)}")
+    return {"categories": await subscribe_categories(token, names)}
+
+@router.delete("/{token}/categories/{name}", dependencies=[_DEADLINE])
+async def blocklist_unsubscribe(token: str, name: str):
+    return {"categories": await unsubscribe_category(token, name.strip().lower())}
+
+@router.post("/{token}/import")
+async def blocklist_import(token: str, request: Request):
+    """
+    Bulk import from a raw request body (hosts file, Adblock ||domain^ list or one
+    domain per line). The body is parsed as it streams in and written in chunks.
+    Poll GET /blocklist/{token}/import for progress while a large upload runs.
+    """
+    try:
+        return await import_domains(token, request.stream())
+    except Exception as e:
+        status = get_import_status(token) or {}
+        raise HTTPException(status_code=502, detail={"error": f"Import failed: {e}", **status})
+
+@router.get("/{token}/import")
+async def blocklist_import_status(token: str):
+    """Progress/counts of the running or most recent import for this token."""
+    status = get_import_status(token)
+    if status is None:
+        raise HTTPException(status_code=404, detail="No import for this token")
+    return status
+
+@router.get("/{token}/check", dependencies=[_DEADLINE])
+async def blocklist_check(token: str, url: str):
+    """Is this URL/host blocked right now? Matches the domain itself and any parent rule."""
+    entry, _ = await _current(token)
+    return {"digest": entry.digest, **check_many(entry, [url])[0]}
+
+@router.post("/{token}/check", dependencies=[_DEADLINE])
+async def blocklist_check_batch(token: str, payload: dict = Body(...)):
+    """Batch form. Accepts {urls: [str, ...]} (URLs or bare hosts)."""
+    urls = (payload or {}).get("urls")
+    if not isinstance(urls, list) or not all(isinstance(u, str) for u in urls):
+        raise HTTPException(status_code=400, detail="urls must be a list of strings")
+    if len(urls) > MAX_BATCH_CHECK:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_CHECK} urls per request")
+    entry, _ = await _current(token)
+    return {"digest": entry.digest, "results": check_many(entry, urls)}
+
+async def _changes_since(token: str, since: str) -> Tuple[CachedBlocklist, Optional[List[dict]]]:
+    """The token's list and the ops after `since` (None: resync)."""
+    entry = await get_blocklist(token)
+    changes = blocklist_changelog.since(token, since, entry)
+    if changes is None and since:
+        # Usually a cursor from another worker that wrote after this one cached the list
+        entry = await get_blocklist(token, refresh=True)
+        changes = blocklist_changelog.since(token, since, entry)
+    return entry, changes
+
+@router.get("/{token}/changes", dependencies=[_DEADLINE])
+async def blocklist_changes(token: str, since: str = ""):
+    """
+    Delta sync. Returns the add/remove operations after the `since` cursor.
+    Cursors are content digests, valid on every worker and across restarts; an
+    unknown one reloads the list once. When it is still unknown (first sync,
+    compacted log, a state this worker never saw) the response has resync=true
+    and the full custom list instead.
+    """
+    entry, changes = await _changes_since(token, since)
+    cursor = blocklist_changelog.cursor(entry)
+    if changes is None:
+        return {
+            "cursor": cursor,
+            "resync": True,
+            "categories": list(entry.categories),
+            "custom": list(entry.domains),
+            "scheduled": list(entry.scheduled),
+            "patterns": list(entry.patterns),
+        }
+    return {"cursor": cursor, "resync": False, "changes": changes}
+
+@router.get("/{token}/dnr/changes", dependencies=[_DEADLINE])
+async def blocklist_dnr_changes(token: str, since: str = ""):
+    """
+    Minimal DNR update since a cursor: pass addRules/removeRuleIds straight to
+    chrome.declarativeNetRequest.updateDynamicRules. On resync=true, replace all
+    managed rules with `rules`. Tokens with scheduled entries always resync, since
+    the rules the client holds depend on the window it last fetched in; refetch at
+    next_transition. Cursors are shared with /changes and valid on every worker.
+    """
+    entry, changes = await _changes_since(token, since)
+    view, next_at = active_blocklist(entry)
+    cursor = blocklist_changelog.cursor(entry)
+    if changes is not None and any(SCHEDULE_SEP in c["domain"] for c in changes):
+        changes = None
+    if changes is None or entry.scheduled:
+        rules = json.loads(await render_dnr_bytes(view))
+        return {"cursor": cursor, "resync": True, "rules": rules, "next_transition": _transition(next_at)}
+    return {"cursor": cursor, "resync": False, **(await dnr_diff(entry, changes))}
+
+# Idle SSE connections get a comment line this often (also re-checks the list after TTL)
+_SSE_HEARTBEAT_SECONDS = 15.0
+_LONG_POLL_MAX_SECONDS = 60.0
+
+
+def _version_payload(entry: CachedBlocklist) -> dict:
+    return {"cursor": blocklist_changelog.cursor(entry), "digest": entry.digest}
+
+
+async def _sse_stream(token: str):
+    with blocklist_events.subscribe(token):
+        last = None
+        while True:
+            fut = blocklist_events.future(token)
+            # A TTL reload here can reveal another worker's writes and publishes them
+            entry = await get_blocklist(token)
+            payload = _version_payload(entry)
+            if payload["digest"] != last:
+                last = payload["digest"]
+                yield f"id: {payload['cursor']}\nevent: version\ndata: {json.dumps(payload)}\n\n".encode()
+            if await blocklist_events.wait(fut, _SSE_HEARTBEAT_SECONDS) is None:
+                yield b": ping\n\n"
+
+@router.get("/{token}/events")
+async def blocklist_events_stream(token: str):
+    """
+    Server-Sent Events: a `version` event now and on every change to this token's
+    list. Clients can then fetch /changes or the list itself (with If-None-Match).
+    """
+    if blocklist_events.full():
+        raise HTTPException(status_code=503, detail="Too many event subscribers, use polling")
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(_sse_stream(token), media_type="text/event-stream", headers=headers)
+
+@router.get("/{token}/events/poll")
+async def blocklist_events_poll(token: str, digest: str = "", cursor: str = "", timeout: float = 30.0):
+    """
+    Long-poll fallback: returns as soon as the list's content digest differs from
+    `digest` (or `cursor`, the same value), or after `timeout` seconds with
+    changed=false. Digests are the same on every worker, so a poll answered by
+    another worker does not report a change that did not happen. Writes made on
+    another worker only wake waiters here once this worker reloads the list,
+    i.e. up to BLOCKLIST_CACHE_TTL (default 300 s) later.
+    """
+    if blocklist_events.full():
+        raise HTTPException(status_code=503, detail="Too many event subscribers, retry later")
+    timeout = max(0.0, min(timeout, _LONG_POLL_MAX_SECONDS))
+    with blocklist_events.subscribe(token):
+        fut = blocklist_events.future(token)
+        payload = _version_payload(await get_blocklist(token))
+        if payload["digest"] != (digest or cursor):
+            return {"changed": True, **payload}
+        published = await blocklist_events.wait(fut, timeout)
+    if published is None or published["digest"] == payload["digest"]:
+        return {"changed": False, **payload}
+    return {"changed": True, **published}
@@ -1,30 +1,43 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import JSONResponse
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Union, Dict
-from app.services.history_service import generate_questions, load_chatgpt_history_from_file
+from app.services.history_service import generate_questions, stream_questions, load_chatgpt_history_from_file
+from app.services.question_jobs import FINISHED, PRIORITY_DEFAULT, question_jobs
+from app.services.llm_usage import LLMQuotaExceeded, llm_endpoint
+from app.services.deadline import remaining
+from app.api.deadlines import request_deadline
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import json
 import os
 
-router = APIRouter()
+# Budget for one request, Groq calls and fallbacks included, unless X-Request-Timeout says otherwise
+HISTORY_DEADLINE = float(os.getenv("HISTORY_REQUEST_DEADLINE", "20"))
 
-# Thread pool for blocking Groq calls
-executor = ThreadPoolExecutor(max_workers=3)
+router = APIRouter(dependencies=[Depends(request_deadline(HISTORY_DEADLINE))])
 
 class HistoryPayload(BaseModel):
     user_id: str
     history: List[Union[dict, str]]  # Accepts list of dicts or strings
 
+class JobPayload(HistoryPayload):
+    priority: int = PRIORITY_DEFAULT  # 0-9, higher runs first
+
 class QuestionOut(BaseModel):
     question: str
     options: List[str]  # e.g., ["Agree", "Disagree"]
 
-async def run_generate_questions(history: List[Union[dict, str]]) -> List[Dict]:
+async def run_generate_questions(history: List[Union[dict, str]], user_id: str = "") -> List[Dict]:
     """
-    Run blocking generate_questions function in a thread pool.
+    Generate questions on the event loop; Groq concurrency is bounded by the
+    shared client (see groq_service.GroqClient), not by a thread pool.
+    Outbound calls already fit the request's deadline and fall back to static
+    statements; this only stops anything else from running past it
+    (asyncio.TimeoutError).
     """
-    loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(executor, generate_questions, history)
+    left = remaining()
+    return await asyncio.wait_for(generate_questions(history, user_id), None if left is None else max(0.0, left))
 
 @router.post("/", summary="Generate personalized questions from user history")
 async def upload_history(payload: HistoryPayload):
@@ -32,21 +45,56 @@ async def upload_history(payload: HistoryPayload):
     Accepts user chat history and returns realistic, personalized first-person statements.
     Returns structured statements with Agree/Disagree options.
     """
+    llm_endpoint.set("history")
     try:
-        structured_questions: List[Dict] = await run_generate_questions(payload.history)
+        structured_questions: List[Dict] = await run_generate_questions(payload.history, payload.user_id)
         return {
             "user_id": payload.user_id,
             "questions": structured_questions
         }
+    except LLMQuotaExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Request deadline exceeded")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating questions: {e}")
 
 
+
+def _sse(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+async def _question_events(history: List[Union[dict, str]], user_id: str):
+    llm_endpoint.set("history/stream")
+    count = 0
+    try:
+        async for q in stream_questions(history, user_id):
+            yield _sse("question", {"index": count, **q})
+            count += 1
+    except Exception as e:
+        yield _sse("error", {"detail": f"Error generating questions: {e}"})
+        return
+    yield _sse("done", {"count": count})
+
+
+@router.post("/stream", summary="Stream personalized questions as they are generated")
+async def stream_history(payload: HistoryPayload):
+    """
+    Server-Sent Events over POST (read with fetch): a `question` event per
+    statement as soon as the model writes it ({index, axis?, question, options}),
+    then `done` with the count. Generation stops once every MBTI axis has 4.
+    """
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(_question_events(payload.history, payload.user_id), media_type="text/event-stream", headers=headers)
+
+
 @router.get("/from-file", summary="Generate questions from public/conversations.json")
 async def questions_from_file():
     """
     Reads ChatGPT export at public/conversations.json and returns personalized questions.
     """
+    llm_endpoint.set("history/from-file")
     try:
         # Compute project root and file path cross-platform
         here = os.path.dirname(__file__)  # .../backend/app/api
@@ -69,5 +117,65 @@ async def questions_from_file():
         }
     except HTTPException:
         raise
+    except LLMQuotaExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Request deadline exceeded")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing conversations.json: {e}")
+
+
+# Idle job SSE connections get a comment line this often
+_JOB_SSE_HEARTBEAT_SECONDS = 15.0
+
+
+@router.post("/jobs", status_code=202, summary="Queue question generation and return a job ID")
+async def create_job(payload: JobPayload):
+    """
+    Queue generation in the background and return immediately. Poll
+    GET /history/jobs/{job_id} or listen on /history/jobs/{job_id}/events.
+    """
+    try:
+        job = await question_jobs.submit(payload.user_id, payload.history, payload.priority)
+    except asyncio.QueueFull:
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Question job queue is full, retry later"},
+            headers={"Retry-After": "5"},
+        )
+    return {"job_id": job.id, "status": job.status}
+
+
+@router.get("/jobs/{job_id}", summary="Job status and, once done, its questions")
+async def get_job(job_id: str):
+    job = await question_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job.info()
+
+
+async def _job_events(job_id: str):
+    job = await question_jobs.get(job_id)
+    last = None
+    while True:
+        if job is None:
+            yield _sse("error", {"detail": "Unknown or expired job"})
+            return
+        if job.status in FINISHED:
+            yield _sse(job.status, job.info())
+            return
+        if job.status != last:
+            last = job.status
+            yield _sse("status", {"job_id": job.id, "status": job.status})
+        else:
+            yield b": ping\n\n"
+        job = await question_jobs.wait(job_id, _JOB_SSE_HEARTBEAT_SECONDS)
+
+
+@router.get("/jobs/{job_id}/events", summary="Server-Sent Events until the job finishes")
+async def job_events(job_id: str):
+    """`status` events while queued/running, then one `done` or `failed` event with the job."""
+    if await question_jobs.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(_job_events(job_id), media_type="text/event-stream", headers=headers)
@@ -0,0 +1,140 @@
+import hashlib
+import itertools
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Iterable, Optional, Tuple
+from app.services.blocklist_categories import CATEGORY_PREFIX
+from app.services.blocklist_schedule import SCHEDULE_SEP
+from app.services.blocklist_patterns import PATTERN_PREFIX
+
+# --- Config ---
+CACHE_TTL_SECONDS = float(os.getenv("BLOCKLIST_CACHE_TTL", "300"))
+CACHE_MAX_ENTRIES = int(os.getenv("BLOCKLIST_CACHE_SIZE", "10000"))
+
+# Process-wide, monotonically increasing list version. Every (re)load or write of
+# any token gets a fresh number, so a version never refers to two different lists.
+_version_counter = itertools.count(1)
+
+
+class CachedBlocklist:
+    """Immutable snapshot of one token's custom domains, category subscriptions, scheduled entries and patterns."""
+
+    __slots__ = (
+        "token", "version", "domains", "categories", "scheduled", "patterns", "digest", "state", "loaded_at", "expires_at",
+        "rendered", "trie", "compacted", "matcher", "schedule", "windows", "active",
+    )
+
+    def __init__(self, token: str, domains: Iterable[str], base_digest: str, ttl: float):
+        self.token = token
+        self.version = next(_version_counter)
+        values = set(domains)
+        refs = {v for v in values if v.startswith(CATEGORY_PREFIX)}
+        patterns = {v for v in values if v.startswith(PATTERN_PREFIX)}
+        scheduled = {v for v in values - patterns if SCHEDULE_SEP in v}
+        self.domains: Tuple[str, ...] = tuple(sorted(values - refs - patterns - scheduled))
+        # Subscribed category names; their domains are shared, not copied here
+        self.categories: Tuple[str, ...] = tuple(sorted(r[len(CATEGORY_PREFIX):] for r in refs))
+        # Raw "<domain>#<schedule>" values, only blocked inside their window
+        self.scheduled: Tuple[str, ...] = tuple(sorted(scheduled))
+        # Wildcard/regex rules (without the prefix), compiled lazily (see blocklist_match)
+        self.patterns: Tuple[str, ...] = tuple(sorted(p[len(PATTERN_PREFIX):] for p in patterns))
+        h = hashlib.blake2b(base_digest.encode(), digest_size=12)
+        h.update("\n".join(self.stored()).encode())
+        # Content hash, so every worker derives the same ETag for the same list
+        self.digest = h.hexdigest()
+        # Digest of the stored list; a window view keeps its list's, so cursors do not see windows
+        self.state = self.digest
+        # Wall-clock time this content was first cached; a TTL reload of the same content
+        # keeps the old entry, so it only grows when the list changes (RPZ serials)
+        self.loaded_at = time.time()
+        self.expires_at = time.monotonic() + ttl
+        # Token-specific rendered bodies per format, filled lazily (see blocklist_render)
+        self.rendered: Dict[str, bytes] = {}
+        # Suffix trie of the custom domains, built lazily (see blocklist_match)
+        self.trie = None
+        # Custom domains not covered by a category or a parent (see blocklist_render)
+        self.compacted = None
+        # All patterns merged into one regex, built lazily (see blocklist_match)
+        self.matcher = None
+        # Interval index over `scheduled` and one view per active window (see blocklist_service)
+        self.schedule = None
+        self.windows: Dict[FrozenSet[str], "CachedBlocklist"] = {}
+        # On a window view: domains blocked only because a schedule is active
+        self.active: FrozenSet[str] = frozenset()
+
+    def stored(self) -> Tuple[str, ...]:
+        """Every stored value: category references, custom domains, scheduled entries, patterns."""
+        return (
+            *(CATEGORY_PREFIX + c for c in self.categories),
+            *self.domains,
+            *self.scheduled,
+            *(PATTERN_PREFIX + p for p in self.patterns),
+        )
+
+    def etag(self, fmt: str) -> str:
+        """Strong ETag for one representation (txt, filter, json, ...)."""
+        return f'"{self.digest}-{fmt}"'
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+
+class BlocklistCache:
+    """
+    Per-token read-through cache with TTL and size-bounded LRU eviction.
+    Only touched from the event loop, so no locking is needed.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, CachedBlocklist]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[CachedBlocklist]:
+        entry = self._entries.get(token)
+        if entry is None or entry.expired():
+            # Expired entries stay until replaced, so a reload can be diffed against them
+            self.misses += 1
+            return None
+        self._entries.move_to_end(token)
+        self.hits += 1
+        return entry
+
+    def peek(self, token: str) -> Optional[CachedBlocklist]:
+        """Current entry even if expired; does not touch LRU order or stats."""
+        return self._entries.get(token)
+
+    def put(self, token: str, domains: Iterable[str], base_digest: str) -> CachedBlocklist:
+        entry = CachedBlocklist(token, domains, base_digest, self.ttl)
+        old = self._entries.get(token)
+        if old is not None and old.digest == entry.digest:
+            # Unchanged content (e.g. TTL reload): keep the version and its rendered artifacts
+            old.expires_at = entry.expires_at
+            entry = old
+        elif old is not None:
+            # Two changes within one second still get increasing serials
+            entry.loaded_at = max(entry.loaded_at, int(old.loaded_at) + 1)
+        self._entries[token] = entry
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, token: str):
+        self._entries.pop(token, None)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# Global instance
+blocklist_cache = BlocklistCache()
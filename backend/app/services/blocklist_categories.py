@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from app.services.domain_index import DomainIndex
+from app.services.domain_trie import DomainTrie, compact
+from app.services.domain_utils import normalize_domain
+
+# --- Config ---
+CATEGORIES_PATH = os.getenv(
+    "BLOCKLIST_CATEGORIES_PATH",
+    str(Path(__file__).resolve().parent.parent / "data" / "blocklist_categories.json"),
+)
+
+# A token subscribes to a category by storing "@<name>" next to its custom domains.
+# normalize_domain never yields '@', so references cannot collide with domains.
+CATEGORY_PREFIX = "@"
+
+
+class BlocklistCategory:
+    """
+    One named, versioned domain list, loaded once and shared by every subscriber.
+
+    Small lists are held as strings; their trie, compacted form and rendered bodies
+    are built lazily, once per process. Large ones are backed by a prebuilt
+    memory-mapped DomainIndex instead and are never materialized.
+    """
+
+    __slots__ = ("name", "title", "version", "default", "domains", "index", "digest", "_trie", "_compacted", "rendered")
+
+    def __init__(self, name: str, title: str, version: int, domains: Iterable[str] = (),
+                 default: bool = False, index: Optional[DomainIndex] = None):
+        self.name = name
+        self.title = title
+        self.version = version
+        self.default = default
+        # Empty for index-backed categories; use iter_domains()
+        self.domains: Tuple[str, ...] = tuple(sorted(set(domains)))
+        self.index = index
+        h = hashlib.blake2b(f"{name}:{version}".encode(), digest_size=8)
+        h.update(index.digest.encode() if index is not None else "\n".join(self.domains).encode())
+        self.digest = h.hexdigest()
+        self._trie: Optional[DomainTrie] = None
+        self._compacted: Optional[List[str]] = None
+        # Body lines per output format, without any header (see blocklist_render)
+        self.rendered: Dict[str, bytes] = {}
+
+    def trie(self) -> Union[DomainTrie, DomainIndex]:
+        """Lookup structure; both kinds answer match(), exact() and `in`."""
+        if self.index is not None:
+            return self.index
+        if self._trie is None:
+            self._trie = DomainTrie(self.domains)
+        return self._trie
+
+    def compacted(self) -> List[str]:
+        if self._compacted is None:
+            self._compacted = compact(self.domains, self.trie())
+        return self._compacted
+
+    def size(self) -> int:
+        return self.index.count if self.index is not None else len(self.domains)
+
+    def compacted_size(self) -> int:
+        return self.index.compacted_count if self.index is not None else len(self.compacted())
+
+    def iter_domains(self, compacted: bool = False) -> Iterator[str]:
+        if self.index is not None:
+            return self.index.iter_domains(compacted)
+        return iter(self.compacted() if compacted else self.domains)
+
+    def info(self) -> dict:
+        return {
+            "name": self.name,
+            "title": self.title,
+            "version": self.version,
+            "default": self.default,
+            "count": self.size(),
+            "indexed": self.index is not None,
+            "digest": self.digest,
+        }
+
+
+class CategoryRegistry:
+    """
+    All categories known to this deploy, read from a JSON file at import time.
+
+    Default categories are part of every token's list. A domain that a default
+    category already covers is dropped from the optional ones, so a subscription
+    never repeats a base rule. A category with an "index" entry (path relative to
+    the JSON file, built with `python -m app.services.domain_index`) is mapped
+    from that file as-is.
+    """
+
+    def __init__(self, path: str = CATEGORIES_PATH):
+        self.path = path
+        self._categories: Dict[str, BlocklistCategory] = {}
+        self._load()
+        # Folded into every list ETag: a deploy that edits any category changes all tags
+        h = hashlib.blake2b(digest_size=8)
+        for name in sorted(self._categories):
+            h.update(f"{name}={self._categories[name].digest}\n".encode())
+        self.digest = h.hexdigest()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except Exception as e:
+            print(f"Blocklist categories not loaded ({self.path}): {e}")
+            raw = {}
+        defaults = DomainTrie()
+        # Defaults first so optional categories can be trimmed against them
+        for name, spec in sorted(raw.items(), key=lambda kv: not kv[1].get("default")):
+            if spec.get("index"):
+                path = os.path.join(os.path.dirname(self.path), spec["index"])
+                try:
+                    index = DomainIndex(path)
+                except Exception as e:
+                    print(f"Blocklist category {name} skipped, index not loaded ({path}): {e}")
+                    continue
+                self._categories[name] = BlocklistCategory(
+                    name,
+                    spec.get("title", name),
+                    int(spec.get("version", 1)),
+                    default=bool(spec.get("default")),
+                    index=index,
+                )
+                continue
+            domains = [n for n in map(normalize_domain, spec.get("domains", [])) if n]
+            if spec.get("default"):
+                for d in domains:
+                    defaults.add(d)
+            else:
+                domains = [d for d in domains if d not in defaults]
+            self._categories[name] = BlocklistCategory(
+                name,
+                spec.get("title", name),
+                int(spec.get("version", 1)),
+                domains,
+                default=bool(spec.get("default")),
+            )
+
+    def get(self, name: str) -> Optional[BlocklistCategory]:
+        return self._categories.get(name)
+
+    def all(self) -> List[BlocklistCategory]:
+        return [self._categories[n] for n in sorted(self._categories)]
+
+    def defaults(self) -> List[BlocklistCategory]:
+        return [c for c in self.all() if c.default]
+
+    def layers(self, names: Iterable[str]) -> List[BlocklistCategory]:
+        """Default categories followed by the named ones; unknown names are ignored."""
+        layers = self.defaults()
+        for name in sorted(set(names)):
+            c = self._categories.get(name)
+            if c is not None and not c.default:
+                layers.append(c)
+        return layers
+
+    def default_domains(self) -> List[str]:
+        return [d for c in self.defaults() for d in c.iter_domains()]
+
+    def stats(self) -> dict:
+        return {c.name: c.index.stats() for c in self.all() if c.index is not None}
+
+
+def category_ref(name: str) -> str:
+    return f"{CATEGORY_PREFIX}{name}"
+
+
+# Global instance
+blocklist_categories = CategoryRegistry()
@@ -0,0 +1,98 @@
+import os
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+from app.services.blocklist_cache import CachedBlocklist
+
+# --- Config ---
+CHANGELOG_MAX_OPS = int(os.getenv("BLOCKLIST_CHANGELOG_OPS", "2000"))
+CHANGELOG_MAX_TOKENS = int(os.getenv("BLOCKLIST_CHANGELOG_TOKENS", "10000"))
+
+
+class _TokenLog:
+    __slots__ = ("base", "head", "ops", "states")
+
+    def __init__(self, entry: CachedBlocklist):
+        # Ops are complete for any client state in [base, head]
+        self.base = entry.version
+        self.head = entry.version
+        self.ops: Deque[Tuple[int, str, str, str]] = deque()  # (version, state, "add"/"remove", domain)
+        # List state digest -> latest local version with that content
+        self.states: Dict[str, int] = {entry.state: entry.version}
+
+
+class BlocklistChangeLog:
+    """
+    Ordered per-token log of add/remove operations, keyed by cached list version.
+    Category subscriptions appear as ops on "@<name>" values.
+
+    Every time a token's cached snapshot is replaced (local write or a reload that
+    reveals writes made by another worker) the difference to the previous snapshot
+    is appended. Cursors are the content digest of the list (CachedBlocklist.state),
+    so every worker and every restart names the same list the same way. A worker
+    can answer a cursor for any state it has seen itself; one it has not seen
+    (a compacted log, a state that only lived between two reloads) asks the
+    client to resync instead of silently returning a partial delta.
+    """
+
+    def __init__(self, max_ops: int = CHANGELOG_MAX_OPS, max_tokens: int = CHANGELOG_MAX_TOKENS):
+        self.max_ops = max_ops
+        self.max_tokens = max_tokens
+        self._logs: "OrderedDict[str, _TokenLog]" = OrderedDict()
+
+    def cursor(self, entry: CachedBlocklist) -> str:
+        return entry.state
+
+    def record(self, token: str, old: Optional[CachedBlocklist], new: CachedBlocklist):
+        log = self._logs.get(token)
+        if log is not None:
+            self._logs.move_to_end(token)
+        if new is old:
+            return
+        if log is None or old is None or log.head != old.version:
+            # No continuous history for this token: start a fresh log at `new`
+            self._logs[token] = _TokenLog(new)
+            while len(self._logs) > self.max_tokens:
+                self._logs.popitem(last=False)
+            return
+        before, after = set(old.stored()), set(new.stored())
+        for d in sorted(after - before):
+            log.ops.append((new.version, new.state, "add", d))
+        for d in sorted(before - after):
+            log.ops.append((new.version, new.state, "remove", d))
+        log.head = new.version
+        # A list that returns to an earlier content is the same state for clients
+        log.states[new.state] = new.version
+        # Compact: drop whole versions from the front until within bounds
+        if len(log.ops) > self.max_ops:
+            while len(log.ops) > self.max_ops:
+                dropped = log.ops[0][0]
+                while log.ops and log.ops[0][0] == dropped:
+                    log.ops.popleft()
+                log.base = dropped
+            log.states = {s: v for s, v in log.states.items() if v >= log.base}
+
+    def since(self, token: str, cursor: str, current: CachedBlocklist) -> Optional[List[Dict]]:
+        """
+        Operations after `cursor` up to `current`, or None when the client must resync.
+        """
+        log = self._logs.get(token)
+        if log is None or log.head != current.version:
+            return None
+        version = log.states.get(cursor or "")
+        if version is None:
+            return None
+        return [
+            {"version": state, "op": op, "domain": d}
+            for v, state, op, d in log.ops
+            if v > version
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "tokens": len(self._logs),
+            "ops": sum(len(log.ops) for log in self._logs.values()),
+        }
+
+
+# Global instance
+blocklist_changelog = BlocklistChangeLog()
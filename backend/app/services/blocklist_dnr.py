@@ -0,0 +1,204 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+from app.services.blocklist_cache import CachedBlocklist
+from app.services.blocklist_local import LOCAL_DB_PATH
+from app.services.blocklist_categories import CATEGORY_PREFIX
+from app.services.blocklist_patterns import PATTERN_PREFIX, dnr_condition
+from app.services.blocklist_render import compacted_overlay
+
+# --- Config ---
+# Matches RULE_ID_BASE in extension/background.js
+DNR_RULE_ID_BASE = int(os.getenv("BLOCKLIST_DNR_RULE_ID_BASE", "1000"))
+_MAX_CACHED_TOKENS = 10000
+
+
+def dnr_domains(categories: Iterable[str], custom: Iterable[str]) -> List[str]:
+    """
+    Domains that get a DNR rule. Index-backed categories are left out: Chrome caps
+    dynamic rules far below their size, so extensions check those via /check.
+    """
+    return compacted_overlay(categories, custom, indexed=False)
+
+
+def dnr_keys(categories: Iterable[str], custom: Iterable[str], patterns: Iterable[str]) -> List[str]:
+    """One key per rule: compacted domains, then "~pattern" for pattern rules."""
+    return [*dnr_domains(categories, custom), *(PATTERN_PREFIX + p for p in patterns)]
+
+
+def dnr_rule(rule_id: int, key: str) -> Dict:
+    """One Chrome declarativeNetRequest rule; requestDomains also covers subdomains."""
+    if key.startswith(PATTERN_PREFIX):
+        condition = dnr_condition(key[len(PATTERN_PREFIX):])
+    else:
+        condition = {"requestDomains": [key], "resourceTypes": ["main_frame"]}
+    return {
+        "id": rule_id,
+        "priority": 1,
+        "action": {"type": "redirect", "redirect": {"extensionPath": "/blocked.html"}},
+        "condition": condition,
+    }
+
+
+class RuleIdRegistry:
+    """
+    Persistent (token, domain) -> DNR rule ID allocation.
+
+    IDs are allocated once per token as MAX+1 inside a SQLite transaction, so they
+    never collide, never change, and are not reused after a domain is removed
+    (re-adding it gets its old ID back). The table lives next to the local
+    blocklist snapshot and is shared by all workers on the host. Hot tokens are
+    kept in an in-memory LRU.
+    """
+
+    def __init__(self, path: str = LOCAL_DB_PATH):
+        self.path = path
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._ids: "OrderedDict[str, Dict[str, int]]" = OrderedDict()
+
+    def _open(self):
+        db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=10)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS dnr_rule_ids ("
+            " token TEXT NOT NULL, domain TEXT NOT NULL, rule_id INTEGER NOT NULL,"
+            " PRIMARY KEY (token, domain), UNIQUE (token, rule_id)"
+            ") WITHOUT ROWID"
+        )
+        self._db = db
+
+    def _token_ids(self, token: str) -> Dict[str, int]:
+        """Caller holds self._lock."""
+        ids = self._ids.get(token)
+        if ids is None:
+            ids = {}
+            if self._db is not None:
+                rows = self._db.execute("SELECT domain, rule_id FROM dnr_rule_ids WHERE token = ?", (token,))
+                ids = {d: rid for d, rid in rows}
+            self._ids[token] = ids
+            while len(self._ids) > _MAX_CACHED_TOKENS:
+                self._ids.popitem(last=False)
+        else:
+            self._ids.move_to_end(token)
+        return ids
+
+    def lookup(self, token: str, domains: Iterable[str]) -> Dict[str, int]:
+        """Known IDs only; never allocates."""
+        with self._lock:
+            ids = self._token_ids(token)
+            return {d: ids[d] for d in domains if d in ids}
+
+    def missing(self, token: str, domains: Iterable[str]) -> List[str]:
+        with self._lock:
+            ids = self._token_ids(token)
+            return [d for d in domains if d not in ids]
+
+    def assign(self, token: str, domains: Iterable[str]) -> Dict[str, int]:
+        """Return IDs for all domains, allocating new ones (blocking; may write SQLite)."""
+        domains = list(domains)
+        with self._lock:
+            ids = self._token_ids(token)
+            new = [d for d in domains if d not in ids]
+            if new and self._db is not None:
+                self._db.execute("BEGIN IMMEDIATE")
+                try:
+                    for d in new:
+                        self._db.execute(
+                            "INSERT OR IGNORE INTO dnr_rule_ids (token, domain, rule_id) VALUES (?, ?, "
+                            "(SELECT COALESCE(MAX(rule_id), 0) + 1 FROM dnr_rule_ids WHERE token = ?))",
+                            (token, d, token),
+                        )
+                    self._db.execute("COMMIT")
+                except Exception:
+                    self._db.execute("ROLLBACK")
+                    raise
+                # Re-read so allocations made by other workers are picked up too
+                placeholders = ",".join("?" * len(new))
+                rows = self._db.execute(
+                    f"SELECT domain, rule_id FROM dnr_rule_ids WHERE token = ? AND domain IN ({placeholders})",
+                    (token, *new),
+                )
+                ids.update({d: rid for d, rid in rows})
+            elif new:
+                # No database: allocate in memory only
+                nxt = max(ids.values(), default=0)
+                for d in new:
+                    nxt += 1
+                    ids[d] = nxt
+            return {d: ids[d] for d in domains}
+
+    async def assign_async(self, token: str, domains: List[str]) -> Dict[str, int]:
+        if not self.missing(token, domains):
+            return self.lookup(token, domains)
+        return await asyncio.to_thread(self.assign, token, domains)
+
+    async def start(self):
+        if self._db is None:
+            try:
+                await asyncio.to_thread(self._open)
+            except Exception as e:
+                print(f"DNR rule ID persistence disabled ({self.path}): {e}")
+
+    async def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+async def render_dnr_bytes(entry: CachedBlocklist) -> bytes:
+    """Full ruleset as a JSON array of rules, cached per list version."""
+    body = entry.rendered.get("dnr")
+    if body is None:
+        keys = dnr_keys(entry.categories, entry.domains, entry.patterns)
+        ids = await rule_ids.assign_async(entry.token, keys)
+        rules = [dnr_rule(DNR_RULE_ID_BASE + ids[k], k) for k in keys]
+        body = json.dumps(rules, separators=(",", ":")).encode()
+        entry.rendered["dnr"] = body
+    return body
+
+
+async def dnr_diff(entry: CachedBlocklist, changes: List[Dict]) -> Dict:
+    """
+    Turn change-log operations into addRules / removeRuleIds for updateDynamicRules.
+    The client's previous list is rebuilt from the ops, and both sides are compacted,
+    so removing a parent domain correctly re-adds rules for its listed subdomains.
+    Category subscriptions are ops on "@name" values and expand to their domains;
+    pattern rules are ops on "~pattern" values and map to one rule each.
+    """
+    current = set(entry.stored())
+    # Presence before the first op of each domain: ops alternate, so a leading
+    # "remove" means it was present and a leading "add" means it was absent
+    previous = set(current)
+    first_op: Dict[str, str] = {}
+    for c in changes:
+        first_op.setdefault(c["domain"], c["op"])
+    for d, op in first_op.items():
+        if op == "remove":
+            previous.add(d)
+        else:
+            previous.discard(d)
+    categories = [v[len(CATEGORY_PREFIX):] for v in previous if v.startswith(CATEGORY_PREFIX)]
+    patterns = [v[len(PATTERN_PREFIX):] for v in previous if v.startswith(PATTERN_PREFIX)]
+    custom = sorted(v for v in previous if not v.startswith((CATEGORY_PREFIX, PATTERN_PREFIX)))
+    before = set(dnr_keys(categories, custom, patterns))
+    after = dnr_keys(entry.categories, entry.domains, entry.patterns)
+    added = [d for d in after if d not in before]
+    after_set = set(after)
+    removed = [d for d in before if d not in after_set]
+    add_ids = await rule_ids.assign_async(entry.token, added)
+    remove_ids = rule_ids.lookup(entry.token, removed)
+    # Added IDs are removed first too (Chrome applies removals before additions), so
+    # re-adding a rule the client already has cannot fail with a duplicate ID
+    return {
+        "addRules": [dnr_rule(DNR_RULE_ID_BASE + add_ids[d], d) for d in added],
+        "removeRuleIds": sorted(DNR_RULE_ID_BASE + rid for rid in [*remove_ids.values(), *add_ids.values()]),
+    }
+
+
+# Global instance
+rule_ids = RuleIdRegistry()
@@ -0,0 +1,81 @@
+import asyncio
+import os
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+# --- Config ---
+EVENTS_MAX_SUBSCRIBERS = int(os.getenv("BLOCKLIST_EVENTS_MAX", "10000"))
+
+
+class BlocklistEventHub:
+    """
+    In-process fan-out of "this token's list changed" notifications.
+
+    Each watched token has at most one pending Future shared by all of its
+    subscribers; publishing resolves it and drops it, and the next wait creates
+    a fresh one. An idle subscriber therefore costs one suspended coroutine and
+    no per-connection queue, which keeps thousands of SSE/long-poll clients cheap.
+    Only touched from the event loop.
+    """
+
+    def __init__(self, max_subscribers: int = EVENTS_MAX_SUBSCRIBERS):
+        self.max_subscribers = max_subscribers
+        self._futures: Dict[str, asyncio.Future] = {}
+        self._counts: Dict[str, int] = {}
+        self.subscribers = 0
+        self.published = 0
+
+    def full(self) -> bool:
+        return self.subscribers >= self.max_subscribers
+
+    @contextmanager
+    def subscribe(self, token: str):
+        self.subscribers += 1
+        self._counts[token] = self._counts.get(token, 0) + 1
+        try:
+            yield
+        finally:
+            self.subscribers -= 1
+            left = self._counts[token] - 1
+            if left:
+                self._counts[token] = left
+            else:
+                del self._counts[token]
+                fut = self._futures.pop(token, None)
+                if fut is not None and not fut.done():
+                    fut.cancel()
+
+    def future(self, token: str) -> asyncio.Future:
+        """Resolved with the event payload on the next publish for `token`.
+        Grab it *before* reading current state so no publish can slip in between."""
+        fut = self._futures.get(token)
+        if fut is None or fut.done():
+            fut = asyncio.get_running_loop().create_future()
+            self._futures[token] = fut
+        return fut
+
+    async def wait(self, fut: asyncio.Future, timeout: float) -> Optional[dict]:
+        """Payload of the next publish, or None on timeout."""
+        try:
+            # shield: a timeout must not cancel the Future other subscribers share
+            return await asyncio.wait_for(asyncio.shield(fut), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def publish(self, token: str, payload: dict):
+        self.published += 1
+        fut = self._futures.pop(token, None)
+        if fut is not None and not fut.done():
+            fut.set_result(payload)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": self.subscribers,
+            "max_subscribers": self.max_subscribers,
+            "watched_tokens": len(self._counts),
+            "published": self.published,
+        }
+
+
+# Global instance
+blocklist_events = BlocklistEventHub()
@@ -0,0 +1,121 @@
+import codecs
+import os
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional, Set
+from app.services.blocklist_cache import blocklist_cache
+from app.services.blocklist_service import get_blocklist, cache_blocklist, write_domains
+from app.services.domain_utils import parse_list_line
+
+# --- Config ---
+IMPORT_CHUNK_SIZE = int(os.getenv("BLOCKLIST_IMPORT_CHUNK", "1000"))
+IMPORT_MAX_DOMAINS = int(os.getenv("BLOCKLIST_IMPORT_MAX", "500000"))
+IMPORT_MAX_LINE = 4096
+_MAX_TRACKED_IMPORTS = 1000
+
+# Latest import status per token, so clients can poll progress while uploading
+_IMPORT_STATUS: "OrderedDict[str, Dict]" = OrderedDict()
+
+
+def get_import_status(token: str) -> Optional[Dict]:
+    status = _IMPORT_STATUS.get(token)
+    return dict(status) if status is not None else None
+
+
+def _new_status(token: str) -> Dict:
+    status = {
+        "state": "running",
+        "started_at": time.time(),
+        "finished_at": None,
+        "lines": 0,
+        "parsed": 0,
+        "added": 0,
+        "duplicates": 0,
+        "skipped": 0,
+        "chunks_written": 0,
+        "truncated": False,
+        "error": None,
+    }
+    _IMPORT_STATUS[token] = status
+    _IMPORT_STATUS.move_to_end(token)
+    while len(_IMPORT_STATUS) > _MAX_TRACKED_IMPORTS:
+        _IMPORT_STATUS.popitem(last=False)
+    return status
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Incrementally decode a byte stream into lines; only the current partial line is buffered."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    tail = ""
+    async for chunk in chunks:
+        text = tail + decoder.decode(chunk)
+        lines = text.split("\n")
+        tail = lines.pop()
+        if len(tail) > IMPORT_MAX_LINE:
+            tail = tail[:IMPORT_MAX_LINE]
+        for line in lines:
+            yield line
+    tail += decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+async def import_domains(token: str, chunks: AsyncIterator[bytes]) -> Dict:
+    """
+    Parse a hosts file / Adblock list / plain list from a byte stream and upsert
+    new domains in chunks of IMPORT_CHUNK_SIZE. Returns the final status dict.
+    """
+    status = _new_status(token)
+    entry = await get_blocklist(token)
+    # Every stored value (categories, schedules, patterns too), for deduplication
+    existing = set(entry.stored())
+    domain_count = len(entry.domains)
+    seen: Set[str] = set()
+    pending: List[str] = []
+
+    async def flush():
+        if pending:
+            await write_domains(token, pending)
+            status["added"] += len(pending)
+            status["chunks_written"] += 1
+            pending.clear()
+
+    try:
+        async for line in iter_lines(chunks):
+            status["lines"] += 1
+            if len(line) > IMPORT_MAX_LINE:
+                status["skipped"] += 1
+                continue
+            found = parse_list_line(line)
+            if not found and line.strip() and line.lstrip()[:1] not in "#!;[":
+                status["skipped"] += 1
+            for d in found:
+                status["parsed"] += 1
+                if d in existing or d in seen:
+                    status["duplicates"] += 1
+                    continue
+                if domain_count + len(seen) >= IMPORT_MAX_DOMAINS:
+                    status["truncated"] = True
+                    break
+                seen.add(d)
+                pending.append(d)
+            if status["truncated"]:
+                break
+            if len(pending) >= IMPORT_CHUNK_SIZE:
+                await flush()
+        await flush()
+    except Exception as e:
+        status["state"] = "failed"
+        status["error"] = str(e)
+        status["finished_at"] = time.time()
+        # Some chunks may have landed; let the next read reload from the store
+        blocklist_cache.invalidate(token)
+        raise
+
+    latest = blocklist_cache.peek(token)
+    if seen and latest is not None:
+        # The list may have changed during a long import; add to what is current now
+        cache_blocklist(token, {*latest.stored(), *seen})
+    status["state"] = "done"
+    status["finished_at"] = time.time()
+    return dict(status)
@@ -0,0 +1,260 @@
+import asyncio
+import glob
+import json
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Set
+from app.services.blocklist_store import blocklist_store
+
+# --- Config ---
+WRITE_BEHIND = os.getenv("BLOCKLIST_WRITE_BEHIND", "").lower() in ("1", "true", "yes")
+SPOOL_DIR = os.getenv("BLOCKLIST_SPOOL_DIR", os.path.join(os.getcwd(), ".blocklist-spool"))
+FLUSH_INTERVAL = float(os.getenv("BLOCKLIST_FLUSH_INTERVAL", "2.0"))
+FLUSH_MAX_PENDING = int(os.getenv("BLOCKLIST_FLUSH_MAX", "500"))
+FLUSH_BATCH_ROWS = 500
+DELETE_BATCH = 100
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class WriteBehindJournal:
+    """
+    Optional write-behind mode for blocklist mutations.
+
+    Adds/removes are coalesced per (token, domain) in memory (last operation wins)
+    and appended to a per-process spool file before the request returns. A
+    background task flushes them to Supabase as bulk upserts/deletes every
+    FLUSH_INTERVAL seconds, or sooner once FLUSH_MAX_PENDING operations queue up.
+    On startup, spool files left behind by dead processes are replayed.
+    """
+
+    def __init__(self):
+        self.spool_dir = SPOOL_DIR
+        self.interval = FLUSH_INTERVAL
+        self.max_pending = FLUSH_MAX_PENDING
+        # token -> {domain: True (add) / False (remove)}
+        self._pending: Dict[str, Dict[str, bool]] = {}
+        # Batch being written by flush(); still applied by overlay() until Supabase acknowledges it
+        self._inflight: Dict[str, Dict[str, bool]] = {}
+        self._depth = 0
+        self._spool = None
+        # Lines appended while the spool is being rewritten, copied into the new file
+        self._backlog: Optional[List[str]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self._wake: Optional[asyncio.Event] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self.flushes = 0
+        self.flush_failures = 0
+        self.rows_flushed = 0
+        self.last_flush_ms: Optional[float] = None
+        self.max_flush_ms = 0.0
+        self.last_error: Optional[str] = None
+
+    def enabled(self) -> bool:
+        return WRITE_BEHIND and blocklist_store.enabled()
+
+    def active(self) -> bool:
+        """Started by the app lifespan and accepting mutations."""
+        return self._task is not None
+
+    # ---------- spool ----------
+    def _spool_path(self) -> str:
+        return os.path.join(self.spool_dir, f"journal-{os.getpid()}.jsonl")
+
+    @staticmethod
+    def _line(token: str, ops: Dict[str, bool]) -> str:
+        return json.dumps({"t": token, "ops": ops}, separators=(",", ":")) + "\n"
+
+    def _append(self, token: str, ops: Dict[str, bool]):
+        # Written and flushed to the OS before the request is acknowledged
+        line = self._line(token, ops)
+        self._spool.write(line)
+        self._spool.flush()
+        if self._backlog is not None:
+            self._backlog.append(line)
+
+    def _write_spool(self, lines: List[str]):
+        path = self._spool_path()
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+        os.replace(tmp, path)
+        return open(path, "a", encoding="utf-8")
+
+    async def _rewrite_spool(self):
+        """Replace the spool with exactly the operations still pending; file I/O runs off the loop."""
+        lines = [self._line(token, ops) for token, ops in self._pending.items()]
+        self._backlog = []
+        try:
+            spool = await asyncio.to_thread(self._write_spool, lines)
+        finally:
+            backlog, self._backlog = self._backlog, None
+        # Ops recorded meanwhile went to the replaced file; carry them over
+        spool.writelines(backlog)
+        spool.flush()
+        if self._spool is not None:
+            self._spool.close()
+        self._spool = spool
+
+    def _replay_orphans(self):
+        for path in glob.glob(os.path.join(self.spool_dir, "journal-*.jsonl")):
+            try:
+                pid = int(os.path.basename(path)[len("journal-"):-len(".jsonl")])
+            except ValueError:
+                continue
+            if pid != os.getpid() and _pid_alive(pid):
+                continue
+            claimed = f"{path}.claimed-{os.getpid()}"
+            try:
+                os.rename(path, claimed)  # atomic: only one worker wins each file
+            except OSError:
+                continue
+            with open(claimed, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                        self._merge(rec["t"], rec["ops"], overwrite=True)
+                    except (ValueError, KeyError, TypeError):
+                        continue  # torn final line from a crash
+            os.remove(claimed)
+
+    # ---------- pending ops ----------
+    def _merge(self, token: str, ops: Dict[str, bool], overwrite: bool):
+        cur = self._pending.setdefault(token, {})
+        before = len(cur)
+        for d, add in ops.items():
+            if overwrite:
+                cur[d] = add
+            else:
+                cur.setdefault(d, add)
+        self._depth += len(cur) - before
+
+    def record(self, token: str, adds: Iterable[str] = (), removes: Iterable[str] = ()):
+        ops = {d: True for d in adds}
+        ops.update({d: False for d in removes})
+        if not ops:
+            return
+        self._append(token, ops)
+        self._merge(token, ops, overwrite=True)
+        if self._depth >= self.max_pending and self._wake is not None:
+            self._wake.set()
+
+    def discard(self, token: str, domains: Iterable[str]):
+        """Drop pending ops for domains that are about to be written directly."""
+        cur = self._pending.get(token)
+        if not cur:
+            return
+        for d in domains:
+            if cur.pop(d, None) is not None:
+                self._depth -= 1
+        if not cur:
+            del self._pending[token]
+
+    def overlay(self, token: str, domains: Iterable[str]) -> Set[str]:
+        """Apply not-yet-acknowledged ops (in flight, then pending) on top of a list read from Supabase."""
+        result = set(domains)
+        for ops in (self._inflight.get(token, {}), self._pending.get(token, {})):
+            for d, add in ops.items():
+                if add:
+                    result.add(d)
+                else:
+                    result.discard(d)
+        return result
+
+    # ---------- flushing ----------
+    async def flush(self):
+        async with self._lock:
+            if not self._pending:
+                return
+            batch, self._pending, self._depth = self._pending, {}, 0
+            self._inflight = batch
+            started = time.perf_counter()
+            try:
+                rows = [(t, d) for t, ops in batch.items() for d, add in ops.items() if add]
+                for i in range(0, len(rows), FLUSH_BATCH_ROWS):
+                    await blocklist_store.upsert_rows(rows[i:i + FLUSH_BATCH_ROWS])
+                for t, ops in batch.items():
+                    removes: List[str] = [d for d, add in ops.items() if not add]
+                    for i in range(0, len(removes), DELETE_BATCH):
+                        await blocklist_store.remove_many(t, removes[i:i + DELETE_BATCH])
+                self.flushes += 1
+                self.rows_flushed += sum(len(ops) for ops in batch.values())
+                self.last_error = None
+            except BaseException as e:
+                # Requeue (also on cancellation, so the spool rewrite below keeps them);
+                # newer ops recorded meanwhile take precedence. Replays are idempotent.
+                for t, ops in batch.items():
+                    self._merge(t, ops, overwrite=False)
+                if not isinstance(e, Exception):
+                    raise
+                self.flush_failures += 1
+                self.last_error = str(e)
+                print(f"Blocklist write-behind flush failed: {e}")
+            finally:
+                self._inflight = {}
+                elapsed = (time.perf_counter() - started) * 1000
+                self.last_flush_ms = round(elapsed, 2)
+                self.max_flush_ms = max(self.max_flush_ms, self.last_flush_ms)
+                await self._rewrite_spool()
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def start(self):
+        if not self.enabled() or self._task is not None:
+            return
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._wake = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._replay_orphans()
+        await self._rewrite_spool()
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is None:
+            return
+        # Let a running flush finish rather than cancelling it halfway through
+        self._closing = True
+        self._wake.set()
+        await self._task
+        self._task = None
+        await self.flush()
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+        if not self._pending:
+            os.remove(self._spool_path())
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled(),
+            "queue_depth": self._depth,
+            "tokens_pending": len(self._pending),
+            "in_flight": sum(len(ops) for ops in self._inflight.values()),
+            "flushes": self.flushes,
+            "flush_failures": self.flush_failures,
+            "rows_flushed": self.rows_flushed,
+            "last_flush_ms": self.last_flush_ms,
+            "max_flush_ms": self.max_flush_ms,
+            "last_error": self.last_error,
+        }
+
+
+# Global instance
+blocklist_journal = WriteBehindJournal()
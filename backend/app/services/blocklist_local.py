@@ -0,0 +1,253 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Iterable, Optional, Set
+
+# --- Config ---
+LOCAL_DB_PATH = os.getenv("BLOCKLIST_LOCAL_PATH", os.path.join(os.getcwd(), ".blocklist-local.db"))
+LOCAL_MAX_TOKENS = int(os.getenv("BLOCKLIST_LOCAL_MAX_TOKENS", "50000"))
+LOCAL_SNAPSHOT_INTERVAL = float(os.getenv("BLOCKLIST_LOCAL_SNAPSHOT_INTERVAL", "30"))
+LOCAL_SHARDS = 16
+
+
+class _Shard:
+    __slots__ = ("lock", "sets")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sets: "OrderedDict[str, Set[str]]" = OrderedDict()
+
+
+class LocalBlocklistStore:
+    """
+    Bounded, thread-safe local blocklist store used when Supabase is not configured
+    or fails.
+
+    Tokens are spread over LOCAL_SHARDS shards, each an LRU with its own lock, and
+    idle tokens are evicted once LOCAL_MAX_TOKENS are resident. Reads never create
+    entries, so probing random tokens costs nothing. Adds and removes are kept as
+    per-value ops and written to SQLite every LOCAL_SNAPSHOT_INTERVAL seconds as
+    INSERT OR IGNORE / DELETE of exactly those values, so workers sharing the file
+    never overwrite each other's rows. At startup only the set of known tokens is
+    read and each token's domains are loaded on first use; callers on the event
+    loop await preload() first, so that SQLite read happens in a thread.
+    """
+
+    def __init__(self, path: str = LOCAL_DB_PATH, max_tokens: int = LOCAL_MAX_TOKENS):
+        self.path = path
+        self.max_per_shard = max(1, max_tokens // LOCAL_SHARDS)
+        self._shards = [_Shard() for _ in range(LOCAL_SHARDS)]
+        # token -> {domain: True (add) / False (remove)} since the last snapshot, last op wins;
+        # evicted tokens are rebuilt from SQLite plus these, so eviction loses nothing
+        self._dirty_lock = threading.Lock()
+        self._dirty: Dict[str, Dict[str, bool]] = {}
+        # Ops the running snapshot is writing, still applied by _load until committed
+        self._writing: Dict[str, Dict[str, bool]] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._known: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.evictions = 0
+        self.snapshots = 0
+
+    def _shard(self, token: str) -> _Shard:
+        return self._shards[zlib.crc32(token.encode()) % LOCAL_SHARDS]
+
+    # ---------- persistence ----------
+    def _open(self):
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS blocklist_domains ("
+            " token TEXT NOT NULL, domain TEXT NOT NULL, PRIMARY KEY (token, domain)"
+            ") WITHOUT ROWID"
+        )
+        self._known = {row[0] for row in db.execute("SELECT DISTINCT token FROM blocklist_domains")}
+        self._db = db
+
+    def _load(self, token: str) -> Optional[Set[str]]:
+        if self._db is None:
+            return None
+        with self._dirty_lock:
+            ops = [dict(self._writing.get(token, {})), dict(self._dirty.get(token, {}))]
+        with self._db_lock:
+            rows = []
+            if token in self._known:
+                rows = self._db.execute("SELECT domain FROM blocklist_domains WHERE token = ?", (token,)).fetchall()
+        if not rows and not any(ops):
+            return None
+        # Ops are idempotent, so re-applying ones a concurrent snapshot just committed is harmless
+        s = {row[0] for row in rows}
+        for pending in ops:
+            for d, add in pending.items():
+                if add:
+                    s.add(d)
+                else:
+                    s.discard(d)
+        return s
+
+    def snapshot(self):
+        """Write the ops of every dirty token to SQLite (blocking; run off the event loop)."""
+        if self._db is None:
+            return
+        with self._dirty_lock:
+            batch, self._dirty = self._dirty, {}
+            self._writing = batch
+        if not batch:
+            return
+        try:
+            with self._db_lock, self._db:
+                for token, ops in batch.items():
+                    adds = [(token, d) for d, add in ops.items() if add]
+                    self._db.executemany(
+                        "INSERT OR IGNORE INTO blocklist_domains (token, domain) VALUES (?, ?)", adds
+                    )
+                    self._db.executemany(
+                        "DELETE FROM blocklist_domains WHERE token = ? AND domain = ?",
+                        [(token, d) for d, add in ops.items() if not add],
+                    )
+                    if adds:
+                        self._known.add(token)
+        except Exception:
+            # Retry these ops next time; newer ones recorded meanwhile win
+            with self._dirty_lock:
+                for token, ops in batch.items():
+                    cur = self._dirty.setdefault(token, {})
+                    for d, add in ops.items():
+                        cur.setdefault(d, add)
+            raise
+        finally:
+            with self._dirty_lock:
+                self._writing = {}
+        self.snapshots += 1
+
+    # ---------- access ----------
+    def _resident(self, shard: _Shard, token: str, create: bool) -> Optional[Set[str]]:
+        """Caller holds shard.lock."""
+        s = shard.sets.get(token)
+        if s is not None:
+            shard.sets.move_to_end(token)
+            return s
+        s = self._load(token)
+        if s is None:
+            if not create:
+                return None
+            s = set()
+        shard.sets[token] = s
+        self._trim(shard)
+        return s
+
+    def _trim(self, shard: _Shard):
+        """Caller holds shard.lock."""
+        while len(shard.sets) > self.max_per_shard:
+            shard.sets.popitem(last=False)
+            self.evictions += 1
+
+    def _preload(self, token: str):
+        # SQLite is read without the shard lock, so the loop never waits on it
+        s = self._load(token)
+        if s is None:
+            return
+        shard = self._shard(token)
+        with shard.lock:
+            if token not in shard.sets:
+                shard.sets[token] = s
+                self._trim(shard)
+
+    async def preload(self, token: str):
+        """Make the token resident off the event loop; get/add/discard then stay in memory."""
+        shard = self._shard(token)
+        with shard.lock:
+            if token in shard.sets:
+                return
+        await asyncio.to_thread(self._preload, token)
+
+    def get(self, token: str) -> FrozenSet[str]:
+        shard = self._shard(token)
+        with shard.lock:
+            s = self._resident(shard, token, create=False)
+            return frozenset(s) if s is not None else frozenset()
+
+    def add(self, token: str, domains: Iterable[str]) -> FrozenSet[str]:
+        shard = self._shard(token)
+        domains = list(domains)
+        with shard.lock:
+            s = self._resident(shard, token, create=True)
+            s.update(domains)
+            result = frozenset(s)
+            self._mark_dirty(token, domains, True)
+        return result
+
+    def discard(self, token: str, domains: Iterable[str]) -> FrozenSet[str]:
+        shard = self._shard(token)
+        with shard.lock:
+            s = self._resident(shard, token, create=False)
+            if s is None:
+                return frozenset()
+            domains = list(domains)
+            s.difference_update(domains)
+            result = frozenset(s)
+            self._mark_dirty(token, domains, False)
+        return result
+
+    def _mark_dirty(self, token: str, domains: Iterable[str], add: bool):
+        """Caller holds the token's shard lock, so ops are recorded in the order applied."""
+        if self._db is None:
+            return  # nothing to snapshot to
+        with self._dirty_lock:
+            ops = self._dirty.setdefault(token, {})
+            for d in domains:
+                ops[d] = add
+
+    # ---------- lifecycle ----------
+    async def _run(self):
+        while True:
+            await asyncio.sleep(LOCAL_SNAPSHOT_INTERVAL)
+            try:
+                await asyncio.to_thread(self.snapshot)
+            except Exception as e:
+                print(f"Local blocklist snapshot failed: {e}")
+
+    async def start(self):
+        if self._db is not None:
+            return
+        try:
+            await asyncio.to_thread(self._open)
+        except Exception as e:
+            # Still usable as a bounded in-memory store
+            print(f"Local blocklist snapshot disabled ({self.path}): {e}")
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._db is not None:
+            await asyncio.to_thread(self.snapshot)
+            self._db.close()
+            self._db = None
+
+    def stats(self) -> dict:
+        with self._dirty_lock:
+            dirty = len(self._dirty)
+        return {
+            "resident_tokens": sum(len(sh.sets) for sh in self._shards),
+            "max_tokens": self.max_per_shard * LOCAL_SHARDS,
+            "known_tokens": len(self._known),
+            "dirty_tokens": dirty,
+            "evictions": self.evictions,
+            "snapshots": self.snapshots,
+            "persistent": self._db is not None,
+        }
+
+
+# Global instance
+local_blocklist = LocalBlocklistStore()
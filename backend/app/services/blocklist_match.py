@@ -0,0 +1,59 @@
+from typing import Dict, List, Optional, Sequence
+from app.services.blocklist_cache import CachedBlocklist
+from app.services.blocklist_categories import blocklist_categories
+from app.services.blocklist_patterns import PatternMatcher, split_url
+from app.services.domain_trie import DomainTrie
+from app.services.domain_utils import normalize_domain
+
+# Upper bound for one batch check request
+MAX_BATCH_CHECK = 1000
+
+
+def trie_for(entry: CachedBlocklist) -> DomainTrie:
+    """Suffix trie of the token's custom domains, built once per list version."""
+    if entry.trie is None:
+        entry.trie = DomainTrie(entry.domains)
+    return entry.trie
+
+
+def tries_for(entry: CachedBlocklist) -> List[DomainTrie]:
+    """Shared category tries (defaults + subscriptions) followed by the custom trie."""
+    return [*(c.trie() for c in blocklist_categories.layers(entry.categories)), trie_for(entry)]
+
+
+def matcher_for(entry: CachedBlocklist) -> Optional[PatternMatcher]:
+    """The token's pattern rules compiled into one regex, once per list version."""
+    if entry.matcher is None and entry.patterns:
+        entry.matcher = PatternMatcher(entry.patterns)
+    return entry.matcher
+
+
+def match_any(tries: Sequence[DomainTrie], host: str) -> Optional[str]:
+    """Shortest rule covering `host` across all tries."""
+    best = None
+    for trie in tries:
+        rule = trie.match(host)
+        # Every candidate is a suffix of host, so shorter means fewer labels
+        if rule is not None and (best is None or len(rule) < len(best)):
+            best = rule
+    return best
+
+
+def check_one(tries: Sequence[DomainTrie], value: str, matcher: Optional[PatternMatcher] = None) -> Dict:
+    host = normalize_domain(value)
+    rule = match_any(tries, host) if host else None
+    if rule is None and host and matcher is not None:
+        # Literal rules win; patterns also see the path ("host/path?query")
+        rule = matcher.match(host, split_url(value)[1])
+    return {
+        "input": value,
+        "host": host,
+        "blocked": rule is not None,
+        "rule": rule,
+    }
+
+
+def check_many(entry: CachedBlocklist, values: List[str]) -> List[Dict]:
+    tries = tries_for(entry)
+    matcher = matcher_for(entry)
+    return [check_one(tries, v, matcher) for v in values]
@@ -0,0 +1,225 @@
+import os
+import re
+from typing import Iterable, List, Optional, Tuple
+
+try:
+    from re import _parser as _sre_parse  # 3.11+
+except ImportError:  # pragma: no cover
+    import sre_parse as _sre_parse
+
+try:
+    import re2  # google-re2: linear-time matching, the engine DNR uses too
+    _RE2 = True
+    _RE2_OPTIONS = re2.Options()
+    _RE2_OPTIONS.log_errors = False
+    _REGEX_ERRORS: tuple = (re.error, re2.error)
+except ImportError:
+    _RE2 = False
+    _REGEX_ERRORS = (re.error,)
+
+# --- Config ---
+PATTERN_MAX_LENGTH = int(os.getenv("BLOCKLIST_PATTERN_MAX_LENGTH", "256"))
+PATTERN_MAX_PER_TOKEN = int(os.getenv("BLOCKLIST_PATTERN_MAX_PER_TOKEN", "200"))
+_MAX_WILDCARDS = 4
+_MAX_REPEAT_BOUND = 100
+# Unbounded quantifiers (*, +, {n,}) per regex rule; sequences like a*a*a*b backtrack polynomially
+_MAX_UNBOUNDED = 1
+# Longest host+path a pattern is matched against; without RE2 matching backtracks,
+# so the target is cut much shorter to keep the worst case in the milliseconds
+_MAX_TARGET = 2048 if _RE2 else 128
+# End of text; RE2 has no \Z
+_END = r"\z" if _RE2 else r"\Z"
+
+# Pattern rules are stored as "~<pattern>" next to domains. normalize_domain never
+# yields '~', so they cannot collide with domains, categories or schedules.
+PATTERN_PREFIX = "~"
+
+_WILDCARD_HOST_RE = re.compile(r"^[a-z0-9*._-]+$")
+_WILDCARD_PATH_RE = re.compile(r"^/[\x21-\x7e]*$")
+_REPEATS = ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT")
+_FORBIDDEN = {
+    "GROUPREF": "backreferences",
+    "GROUPREF_EXISTS": "conditional groups",
+    "ASSERT": "lookarounds",
+    "ASSERT_NOT": "lookarounds",
+}
+
+
+def is_regex(pattern: str) -> bool:
+    return len(pattern) > 2 and pattern.startswith("/") and pattern.endswith("/")
+
+
+def _compile(pattern: str):
+    return re2.compile(pattern, options=_RE2_OPTIONS) if _RE2 else re.compile(pattern)
+
+
+def _check_tree(items, in_repeat: bool = False) -> int:
+    """
+    Reject regex features that can backtrack badly or that RE2 (DNR) lacks.
+    Returns the number of unbounded quantifiers.
+    """
+    unbounded_count = 0
+    for op, av in items:
+        name = str(op)
+        if name in _FORBIDDEN:
+            raise ValueError(f"{_FORBIDDEN[name]} are not allowed")
+        if name in _REPEATS:
+            lo, hi, sub = av
+            unbounded = hi == _sre_parse.MAXREPEAT
+            if not unbounded and hi > _MAX_REPEAT_BOUND:
+                raise ValueError(f"repeat counts above {_MAX_REPEAT_BOUND} are not allowed")
+            repeats = unbounded or hi > 1
+            if in_repeat and repeats:
+                raise ValueError("nested quantifiers are not allowed")
+            unbounded_count += unbounded + _check_tree(sub, in_repeat or repeats)
+        elif name == "SUBPATTERN":
+            unbounded_count += _check_tree(av[-1], in_repeat)
+        elif name == "ATOMIC_GROUP":
+            unbounded_count += _check_tree(av, in_repeat)
+        elif name == "BRANCH":
+            unbounded_count += sum(_check_tree(branch, in_repeat) for branch in av[1])
+    return unbounded_count
+
+
+def _wildcard_fragment(pattern: str) -> str:
+    host, slash, path = pattern.partition("/")
+    # A leading "*." also covers the bare domain, like Adblock's "||"
+    lead = ""
+    if host.startswith("*."):
+        lead, host = r"(?:[^/]*\.)?", host[2:]
+    # '*' matches within the host part, or anything in the path part
+    frag = lead + "[^/]*".join(map(re.escape, host.split("*")))
+    if slash:
+        frag += "/" + ".*".join(map(re.escape, path.split("*")))
+        return frag + _END
+    return frag + r"(?:/.*)?" + _END
+
+
+def _regex_fragment(pattern: str) -> str:
+    # Search semantics; a leading '^' still anchors at the start of the host
+    return f".*?(?:{pattern[1:-1]})"
+
+
+def _fragment(pattern: str) -> str:
+    return _regex_fragment(pattern) if is_regex(pattern) else _wildcard_fragment(pattern)
+
+
+def parse_pattern(raw: str) -> str:
+    """
+    Validate a pattern rule and return its canonical form (stored after
+    PATTERN_PREFIX). Two kinds are accepted:
+
+    - wildcards: "*.reddit.com/r/all*" - '*' matches within the host part, or
+      anything in the path part; without a path the whole host must match.
+      A leading "*." also matches the bare domain
+    - regexes: "/^ads?\\d*\\./" - matched (search) against "host/path"
+
+    Raises ValueError when the pattern is malformed or too complex.
+    """
+    s = (raw or "").strip()
+    if not s:
+        raise ValueError("empty pattern")
+    if len(s) > PATTERN_MAX_LENGTH:
+        raise ValueError(f"patterns are limited to {PATTERN_MAX_LENGTH} characters")
+    if is_regex(s):
+        body = s[1:-1]
+        if "(?P<" in body or "(?<" in body:
+            raise ValueError("named groups are not allowed")
+        try:
+            unbounded = _check_tree(_sre_parse.parse(body))
+            _compile(_fragment(s))
+        except _REGEX_ERRORS as e:
+            raise ValueError(f"invalid regex: {e}")
+        if unbounded > _MAX_UNBOUNDED:
+            raise ValueError(f"at most {_MAX_UNBOUNDED} unbounded quantifier (*, +) per regex")
+        return s
+    host, slash, path = s.partition("/")
+    host = host.lower()
+    if "*" not in s and not slash:
+        raise ValueError("not a pattern (no '*' or path); add it as a domain instead")
+    if not _WILDCARD_HOST_RE.match(host) or (slash and not _WILDCARD_PATH_RE.match("/" + path)):
+        raise ValueError("wildcards may only contain host characters, '*' and a path")
+    if s.count("*") > _MAX_WILDCARDS:
+        raise ValueError(f"at most {_MAX_WILDCARDS} '*' per pattern")
+    return host + slash + path
+
+
+class PatternMatcher:
+    """
+    All pattern rules of one list version compiled into a single anchored regex
+    (one named alternative per rule), so a check costs one match. With RE2
+    (google-re2) that match is linear in the target; without it rules are held
+    to _MAX_UNBOUNDED and the target to 128 characters.
+    """
+
+    __slots__ = ("patterns", "_regex")
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: List[str] = []
+        frags = []
+        for p in patterns:
+            try:
+                if is_regex(p):
+                    parse_pattern(p)
+                frag = _fragment(p)
+                _compile(frag)
+            except (ValueError, *_REGEX_ERRORS):
+                continue  # stored before a limit changed; skip rather than fail the list
+            frags.append(f"(?P<p{len(self.patterns)}>{frag})")
+            self.patterns.append(p)
+        self._regex = _compile("|".join(frags)) if frags else None
+
+    def match(self, host: str, path: str = "") -> Optional[str]:
+        if self._regex is None:
+            return None
+        m = self._regex.match((host + path)[:_MAX_TARGET])
+        if m is None:
+            return None
+        # lastgroup is the wrapper: it closes after any groups inside the rule
+        return self.patterns[int(m.lastgroup[1:])]
+
+
+def split_url(value: str) -> Tuple[str, str]:
+    """(raw host part, path with query) of a URL or bare host; the host is not normalized."""
+    s = (value or "").strip()
+    if "://" in s:
+        s = s.split("://", 1)[1]
+    elif s.startswith("//"):
+        s = s[2:]
+    s = s.split("#", 1)[0]
+    cut = min((i for i in (s.find("/"), s.find("?")) if i >= 0), default=len(s))
+    path = s[cut:]
+    if path.startswith("?"):
+        path = "/" + path
+    return s[:cut], path
+
+
+# ---------- renderers ----------
+def _url_filter(pattern: str) -> str:
+    """Adblock/DNR urlFilter for a wildcard. '||' also covers the bare domain."""
+    host, slash, path = pattern.partition("/")
+    if host.startswith("*."):
+        host = host[2:]
+    return f"||{host}{slash}{path}" if slash else f"||{host}^"
+
+
+def _scheme_regex(pattern: str) -> str:
+    """The rule as a regex over the full URL, the form both Adblock and DNR match."""
+    body = pattern[1:-1]
+    if body.startswith("^"):
+        return r"^[a-z][a-z0-9+.-]*://" + body[1:]
+    return body
+
+
+def adblock_line(pattern: str) -> str:
+    if is_regex(pattern):
+        # Adblock delimits regexes with '/', so every slash in the body is escaped once
+        return "/" + _scheme_regex(pattern).replace(r"\/", "/").replace("/", r"\/") + "/\n"
+    return _url_filter(pattern) + "\n"
+
+
+def dnr_condition(pattern: str) -> dict:
+    if is_regex(pattern):
+        # Validation already rejects what RE2 cannot run (backreferences, lookarounds)
+        return {"regexFilter": _scheme_regex(pattern), "resourceTypes": ["main_frame"]}
+    return {"urlFilter": _url_filter(pattern), "resourceTypes": ["main_frame"]}
@@ -0,0 +1,254 @@
+import json
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional
+from app.services.blocklist_cache import CachedBlocklist
+from app.services.blocklist_categories import BlocklistCategory, blocklist_categories
+from app.services.blocklist_service import BASE_BLOCKLIST
+from app.services.blocklist_match import trie_for
+from app.services.blocklist_schedule import parse_value
+from app.services.blocklist_patterns import adblock_line
+from app.services.domain_trie import compact
+
+# Lines joined per yielded chunk when streaming
+STREAM_CHUNK_LINES = 4096
+
+
+class BlocklistFormat(NamedTuple):
+    media_type: str
+    header: Callable[[CachedBlocklist], List[str]]
+    line: Callable[[str], str]
+    # Rules also match subdomains, so covered subdomains can be dropped
+    suffix: bool = False
+    comment: str = "#"
+    # Renders a wildcard/regex rule; formats without one (DNS-level) leave patterns out
+    pattern: Optional[Callable[[str], str]] = None
+
+
+def _rpz_header(entry: CachedBlocklist) -> List[str]:
+    # Unix time the content was first cached: grows with every change, as secondaries
+    # require. Workers that cached the same content at different times may differ in
+    # the serial only, which never makes a secondary refetch an older list.
+    serial = int(entry.loaded_at)
+    return [
+        "; Nudge Blocklist (RPZ zone)",
+        "$TTL 300",
+        f"@ IN SOA localhost. root.localhost. {serial} 3600 600 86400 300",
+        "@ IN NS localhost.",
+    ]
+
+
+FORMATS: Dict[str, BlocklistFormat] = {
+    "txt": BlocklistFormat(
+        "text/plain; charset=utf-8",
+        lambda entry: [],
+        lambda d: f"{d}\n",
+    ),
+    "filter": BlocklistFormat(
+        "text/plain; charset=utf-8",
+        lambda entry: ["! Nudge Blocklist (Adblock format)", "! Syntax: ||domain^"],
+        lambda d: f"||{d}^\n",
+        suffix=True,
+        comment="!",
+        pattern=adblock_line,
+    ),
+    "hosts": BlocklistFormat(
+        "text/plain; charset=utf-8",
+        lambda entry: ["# Nudge Blocklist (hosts format)"],
+        lambda d: f"0.0.0.0 {d}\n",
+    ),
+    # '#' makes dnsmasq answer with the null address for both A and AAAA
+    "dnsmasq": BlocklistFormat(
+        "text/plain; charset=utf-8",
+        lambda entry: ["# Nudge Blocklist (dnsmasq format)"],
+        lambda d: f"address=/{d}/#\n",
+        suffix=True,
+    ),
+    "unbound": BlocklistFormat(
+        "text/plain; charset=utf-8",
+        lambda entry: ["# Nudge Blocklist (unbound local-zone format)"],
+        lambda d: f'local-zone: "{d}." always_nxdomain\n',
+        suffix=True,
+    ),
+    "rpz": BlocklistFormat(
+        "text/dns; charset=utf-8",
+        _rpz_header,
+        lambda d: f"{d} CNAME .\n*.{d} CNAME .\n",
+        suffix=True,
+        comment=";",
+    ),
+}
+
+
+def _layers(entry: CachedBlocklist) -> List[BlocklistCategory]:
+    return blocklist_categories.layers(entry.categories)
+
+
+def _covered(layers: List[BlocklistCategory], domain: str, exact: bool) -> bool:
+    if exact:
+        return any(c.trie().exact(domain) for c in layers)
+    return any(domain in c.trie() for c in layers)
+
+
+def custom_domains(entry: CachedBlocklist, layers: List[BlocklistCategory]) -> List[str]:
+    """Custom domains not already listed by one of the token's categories."""
+    return [d for d in entry.domains if not _covered(layers, d, exact=True)]
+
+
+def custom_compacted(entry: CachedBlocklist) -> List[str]:
+    """Custom domains not covered by a category or a listed parent; cached per version."""
+    if entry.compacted is None:
+        layers = _layers(entry)
+        entry.compacted = [d for d in compact(entry.domains, trie_for(entry)) if not _covered(layers, d, exact=False)]
+    return entry.compacted
+
+
+def combined_domains(entry: CachedBlocklist) -> List[str]:
+    """Category domains (defaults first) followed by the token's custom domains."""
+    layers = _layers(entry)
+    return list(dict.fromkeys([*(d for c in layers for d in c.iter_domains()), *custom_domains(entry, layers)]))
+
+
+def compacted_overlay(categories: Iterable[str], custom: Iterable[str], indexed: bool = True) -> List[str]:
+    """
+    Compacted list for an arbitrary (categories, custom) pair, e.g. an older version.
+    indexed=False leaves out index-backed (very large) categories.
+    """
+    layers = [c for c in blocklist_categories.layers(categories) if indexed or c.index is None]
+    custom = [d for d in compact(custom) if not _covered(layers, d, exact=False)]
+    return list(dict.fromkeys([*(d for c in layers for d in c.iter_domains(compacted=True)), *custom]))
+
+
+def compacted_domains(entry: CachedBlocklist) -> List[str]:
+    """Combined list without subdomains already covered by a parent."""
+    layers = _layers(entry)
+    return list(dict.fromkeys([*(d for c in layers for d in c.iter_domains(compacted=True)), *custom_compacted(entry)]))
+
+
+def rules_saved(entry: CachedBlocklist) -> int:
+    """How many rules compaction removes from suffix-semantics formats."""
+    layers = _layers(entry)
+    saved = sum(c.size() - c.compacted_size() for c in layers)
+    return saved + len(custom_domains(entry, layers)) - len(custom_compacted(entry))
+
+
+def _custom_for(entry: CachedBlocklist, fmt: str, layers: List[BlocklistCategory]) -> List[str]:
+    return custom_compacted(entry) if FORMATS[fmt].suffix else custom_domains(entry, layers)
+
+
+def _header_bytes(entry: CachedBlocklist, fmt: str) -> bytes:
+    spec = FORMATS[fmt]
+    header = spec.header(entry)
+    if spec.suffix:
+        saved = rules_saved(entry)
+        if saved:
+            header.append(f"{spec.comment} Compacted: {saved} subdomain rules covered by a parent domain")
+    return ("\n".join(header) + "\n\n").encode() if header else b""
+
+
+def category_body(category: BlocklistCategory, fmt: str) -> bytes:
+    """A category's lines in one format, rendered once and shared by all subscribers."""
+    body = category.rendered.get(fmt)
+    if body is None:
+        spec = FORMATS[fmt]
+        domains = category.compacted() if spec.suffix else category.domains
+        body = "".join(map(spec.line, domains)).encode()
+        category.rendered[fmt] = body
+    return body
+
+
+def iter_render(entry: CachedBlocklist, fmt: str) -> Iterator[bytes]:
+    """Yield one format's output in bounded chunks instead of one big string."""
+    layers = _layers(entry)
+    header = _header_bytes(entry, fmt)
+    if header:
+        yield header
+    # Shared category bodies are yielded as-is, never copied per token
+    for c in layers:
+        yield from iter_category(c, fmt)
+    yield from _iter_lines(_custom_for(entry, fmt, layers), FORMATS[fmt].line)
+    pattern_body = _pattern_body(entry, fmt)
+    if pattern_body:
+        yield pattern_body
+
+
+def _iter_lines(domains: Iterable[str], line: Callable[[str], str]) -> Iterator[bytes]:
+    buf: List[str] = []
+    for d in domains:
+        buf.append(line(d))
+        if len(buf) >= STREAM_CHUNK_LINES:
+            yield "".join(buf).encode()
+            buf.clear()
+    if buf:
+        yield "".join(buf).encode()
+
+
+def _pattern_body(entry: CachedBlocklist, fmt: str) -> bytes:
+    render = FORMATS[fmt].pattern
+    if render is None or not entry.patterns:
+        return b""
+    return "".join(map(render, entry.patterns)).encode()
+
+
+def iter_category(category: BlocklistCategory, fmt: str) -> Iterator[bytes]:
+    """
+    Index-backed categories are streamed from the mapped file on every request
+    (plain text is the file's own text section); small ones use category_body.
+    """
+    if category.index is None:
+        body = category_body(category, fmt)
+        if body:
+            yield body
+    elif fmt == "txt":
+        yield from category.index.iter_text()
+    else:
+        spec = FORMATS[fmt]
+        yield from _iter_lines(category.index.iter_domains(compacted=spec.suffix), spec.line)
+
+
+def render_parts(entry: CachedBlocklist, fmt: str) -> Optional[List[bytes]]:
+    """
+    Header, shared category bodies and the token's own lines. Only the custom part
+    is cached on the entry, so memory grows with unique domains, not subscribers.
+    None when an index-backed category is subscribed; stream with iter_render then.
+    """
+    layers = _layers(entry)
+    if any(c.index is not None for c in layers):
+        return None
+    custom = entry.rendered.get(fmt)
+    if custom is None:
+        custom = "".join(map(FORMATS[fmt].line, _custom_for(entry, fmt, layers))).encode() + _pattern_body(entry, fmt)
+        entry.rendered[fmt] = custom
+    parts = [_header_bytes(entry, fmt), *(category_body(c, fmt) for c in layers), custom]
+    return [p for p in parts if p]
+
+
+def _scheduled_items(entry: CachedBlocklist) -> List[Dict]:
+    items = []
+    for value in entry.scheduled:
+        parsed = parse_value(value)
+        if parsed is not None:
+            domain, schedule = parsed
+            items.append({"value": value, "domain": domain, "schedule": schedule.window(), "tz": schedule.tz})
+    return items
+
+
+def render_json_bytes(entry: CachedBlocklist) -> bytes:
+    """
+    The `.json` body ({base, categories, custom, scheduled, active, patterns, count}), cached
+    like the text formats. On a window view, `active` lists the scheduled domains
+    currently blocked; they are counted but not repeated in `custom`.
+    """
+    body = entry.rendered.get("json")
+    if body is None:
+        layers = _layers(entry)
+        base = sorted(BASE_BLOCKLIST)
+        body = json.dumps({
+            "base": base,
+            "categories": list(entry.categories),
+            "custom": [d for d in entry.domains if d not in entry.active],
+            "scheduled": _scheduled_items(entry),
+            "active": sorted(entry.active),
+            "patterns": list(entry.patterns),
+            "count": sum(c.size() for c in layers) + len(custom_domains(entry, layers)),
+        }, separators=(",", ":")).encode()
+        entry.rendered["json"] = body
+    return body
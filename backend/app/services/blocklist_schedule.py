@@ -0,0 +1,171 @@
+import re
+from bisect import bisect_right
+from datetime import date, datetime, time as dtime, timedelta
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+# A scheduled entry is stored as "<domain>#<days>@<HH:MM>-<HH:MM>@<tz>", e.g.
+# "youtube.com#mo,tu,we,th,fr@09:00-17:00@Europe/Berlin". normalize_domain
+# never yields '#', so scheduled values cannot collide with plain domains.
+SCHEDULE_SEP = "#"
+
+_DAYS = ["mo", "tu", "we", "th", "fr", "sa", "su"]
+_TIME_RE = re.compile(r"^([01]\d|2[0-4]):([0-5]\d)$")
+# Concrete intervals are expanded this far around "now"; the index rebuilds when t leaves it
+_HORIZON_BEFORE = timedelta(days=1)
+_HORIZON_AFTER = timedelta(days=8)
+
+
+class Schedule(NamedTuple):
+    days: FrozenSet[int]  # 0 = Monday
+    start: int  # minutes after local midnight
+    end: int  # exclusive; <= start means the window runs past midnight
+    tz: str
+
+    def window(self) -> str:
+        days = ",".join(_DAYS[d] for d in sorted(self.days))
+        return f"{days}@{_fmt_time(self.start)}-{_fmt_time(self.end)}"
+
+    def spec(self) -> str:
+        return f"{self.window()}@{self.tz}"
+
+    def intervals(self, lo: datetime, hi: datetime) -> Iterable[Tuple[float, float]]:
+        """UTC (start, end) timestamps of every window overlapping [lo, hi)."""
+        zone = ZoneInfo(self.tz)
+        day = lo.astimezone(zone).date() - timedelta(days=1)
+        last = hi.astimezone(zone).date()
+        while day <= last:
+            if day.weekday() in self.days:
+                end_day = day if self.end > self.start else day + timedelta(days=1)
+                yield _local_ts(day, self.start, zone), _local_ts(end_day, self.end, zone)
+            day += timedelta(days=1)
+
+
+def _fmt_time(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def _local_ts(day: date, minutes: int, zone: ZoneInfo) -> float:
+    return (datetime.combine(day, dtime(0), tzinfo=zone) + timedelta(minutes=minutes)).timestamp()
+
+
+def _parse_days(raw: str) -> FrozenSet[int]:
+    raw = raw.strip().lower()
+    if raw in ("*", "daily", ""):
+        return frozenset(range(7))
+    days = set()
+    for part in raw.split(","):
+        first, _, last = part.strip().partition("-")
+        a = _DAYS.index(first[:2])
+        b = _DAYS.index(last[:2]) if last else a
+        # "fr-mo" wraps over the weekend
+        days.update(range(a, b + 1) if a <= b else [*range(a, 7), *range(0, b + 1)])
+    return frozenset(days)
+
+
+def _parse_time(raw: str) -> int:
+    m = _TIME_RE.match(raw.strip())
+    if not m or (m.group(1) == "24" and m.group(2) != "00"):
+        raise ValueError(f"invalid time {raw!r}, expected HH:MM")
+    return int(m.group(1)) * 60 + int(m.group(2))
+
+
+def parse_schedule(raw: str, tz: str = "UTC") -> Schedule:
+    """
+    Parse user input like "mo-fr 09:00-17:00" (days optional, '@' also accepted
+    as separator). Raises ValueError with a readable message.
+    """
+    raw = (raw or "").strip().replace("@", " ")
+    days_part, _, times = raw.rpartition(" ")
+    start, sep, end = times.partition("-")
+    if not sep:
+        raise ValueError("schedule must contain a time range like 09:00-17:00")
+    try:
+        days = _parse_days(days_part)
+    except ValueError:
+        raise ValueError(f"invalid days {days_part!r}, use e.g. mo-fr or sa,su")
+    start_min, end_min = _parse_time(start), _parse_time(end)
+    if start_min == end_min:
+        raise ValueError("schedule start and end must differ")
+    try:
+        ZoneInfo(tz)
+    except Exception:
+        raise ValueError(f"unknown time zone {tz!r}")
+    return Schedule(days, start_min, end_min, tz)
+
+
+def schedule_value(domain: str, schedule: Schedule) -> str:
+    return f"{domain}{SCHEDULE_SEP}{schedule.spec()}"
+
+
+def parse_value(value: str) -> Optional[Tuple[str, Schedule]]:
+    """Split a stored scheduled value; None if it is malformed (it is then ignored)."""
+    domain, _, spec = value.partition(SCHEDULE_SEP)
+    days, _, rest = spec.partition("@")
+    times, _, tz = rest.partition("@")
+    try:
+        return domain, parse_schedule(f"{days} {times}", tz or "UTC")
+    except ValueError:
+        return None
+
+
+class ScheduleIndex:
+    """
+    Interval index over one list version's scheduled values.
+
+    Windows are expanded to concrete UTC intervals around the build time and swept
+    into sorted boundaries, each with the set of values active until the next one.
+    "Active at t" and "next transition" are then one bisect, and identical sets
+    share one frozenset. Rebuilt when t leaves the expanded horizon.
+    """
+
+    __slots__ = ("values", "_lo", "_hi", "_bounds", "_sets")
+
+    def __init__(self, values: Iterable[str]):
+        self.values: List[Tuple[str, str, Schedule]] = []
+        for v in values:
+            parsed = parse_value(v)
+            if parsed is not None:
+                self.values.append((v, *parsed))
+        self._lo = self._hi = 0.0
+        self._bounds: List[float] = []
+        self._sets: List[FrozenSet[str]] = []
+
+    def _build(self, t: float):
+        now = datetime.fromtimestamp(t).astimezone()
+        lo, hi = now - _HORIZON_BEFORE, now + _HORIZON_AFTER
+        events: List[Tuple[float, int, str]] = []
+        for value, _, schedule in self.values:
+            for start, end in schedule.intervals(lo, hi):
+                events.append((start, 1, value))
+                events.append((end, -1, value))
+        events.sort()
+        counts: Dict[str, int] = {}
+        interned: Dict[FrozenSet[str], FrozenSet[str]] = {}
+        bounds: List[float] = [float("-inf")]
+        sets: List[FrozenSet[str]] = [frozenset()]
+        i = 0
+        while i < len(events):
+            at = events[i][0]
+            while i < len(events) and events[i][0] == at:
+                _, delta, value = events[i]
+                counts[value] = counts.get(value, 0) + delta
+                i += 1
+            active = frozenset(v for v, n in counts.items() if n > 0)
+            active = interned.setdefault(active, active)
+            if active != sets[-1]:
+                bounds.append(at)
+                sets.append(active)
+        self._lo, self._hi = lo.timestamp(), hi.timestamp()
+        self._bounds, self._sets = bounds, sets
+
+    def active(self, t: float) -> Tuple[FrozenSet[str], Optional[float]]:
+        """Scheduled values active at t, and when that set next changes (None: not within the horizon)."""
+        if not self.values:
+            return frozenset(), None
+        # Keep at least a day of look-ahead so the next transition is always known
+        if not self._lo <= t < self._hi - 86400:
+            self._build(t)
+        i = bisect_right(self._bounds, t) - 1
+        nxt = self._bounds[i + 1] if i + 1 < len(self._bounds) else None
+        return self._sets[i], nxt
@@ -0,0 +1,205 @@
+import time
+from typing import List, Iterable, Optional, Tuple
+from app.services.blocklist_store import blocklist_store
+from app.services.blocklist_cache import blocklist_cache, CachedBlocklist
+from app.services.blocklist_journal import blocklist_journal
+from app.services.blocklist_changes import blocklist_changelog
+from app.services.blocklist_local import local_blocklist
+from app.services.blocklist_events import blocklist_events
+from app.services.blocklist_categories import blocklist_categories, category_ref
+from app.services.blocklist_schedule import SCHEDULE_SEP, Schedule, ScheduleIndex, schedule_value
+from app.services.blocklist_patterns import PATTERN_PREFIX
+from app.services.blocklist_match import matcher_for
+
+# Base list always included (the default categories, see data/blocklist_categories.json)
+BASE_BLOCKLIST: List[str] = blocklist_categories.default_domains()
+# Folded into every ETag so a deploy that changes any category changes all tags
+BASE_DIGEST = blocklist_categories.digest
+# Window views kept per list version; a week of schedules rarely has more
+_MAX_WINDOWS = 64
+
+
+def cache_blocklist(token: str, domains: Iterable[str]) -> CachedBlocklist:
+    """Replace the token's cached snapshot (new version) with the given set."""
+    old = blocklist_cache.peek(token)
+    entry = blocklist_cache.put(token, domains, BASE_DIGEST)
+    blocklist_changelog.record(token, old, entry)
+    if entry is not old:
+        blocklist_events.publish(token, {
+            "cursor": blocklist_changelog.cursor(entry),
+            "digest": entry.digest,
+        })
+    return entry
+
+
+def _uncached(token: str, domains: Iterable[str]) -> CachedBlocklist:
+    # Snapshot served when Supabase failed; not cached so the next request retries
+    blocklist_cache.invalidate(token)
+    return CachedBlocklist(token, domains, BASE_DIGEST, ttl=0)
+
+
+async def get_blocklist(token: str, refresh: bool = False) -> CachedBlocklist:
+    """Return the cached snapshot for a token, loading it on a miss (or always with `refresh`)."""
+    entry = None if refresh else blocklist_cache.get(token)
+    if entry is not None:
+        return entry
+    if blocklist_store.enabled():
+        try:
+            domains = await blocklist_store.list(token)
+            if blocklist_journal.active():
+                domains = blocklist_journal.overlay(token, domains)
+            return cache_blocklist(token, domains)
+        except Exception:
+            await local_blocklist.preload(token)
+            return _uncached(token, local_blocklist.get(token))
+    await local_blocklist.preload(token)
+    return cache_blocklist(token, local_blocklist.get(token))
+
+
+def active_blocklist(entry: CachedBlocklist, now: Optional[float] = None) -> Tuple[CachedBlocklist, Optional[float]]:
+    """
+    The list as it applies at `now` (default: current time), and the timestamp of
+    the next schedule transition. The result is a view with the active scheduled
+    domains added as plain domains, cached per window, so renders, tries and
+    ETags are keyed by the window and reused until it changes. Lists without
+    scheduled entries are returned unchanged.
+    """
+    if not entry.scheduled:
+        return entry, None
+    if entry.schedule is None:
+        entry.schedule = ScheduleIndex(entry.scheduled)
+    values, next_at = entry.schedule.active(time.time() if now is None else now)
+    view = entry.windows.get(values)
+    if view is None:
+        active = {v.partition(SCHEDULE_SEP)[0] for v in values} - set(entry.domains)
+        view = entry
+        if active:
+            view = CachedBlocklist(entry.token, [*entry.stored(), *active], BASE_DIGEST, ttl=0)
+            # Same list version: cursors and change logs do not see windows
+            view.version = entry.version
+            view.state = entry.state
+            view.active = frozenset(active)
+            view.matcher = matcher_for(entry)
+        if len(entry.windows) >= _MAX_WINDOWS:
+            entry.windows.clear()
+        entry.windows[values] = view
+    return view, next_at
+
+
+async def list_custom(token: str) -> List[str]:
+    return list((await get_blocklist(token)).domains)
+
+
+async def _cache_delta(token: str, adds: Iterable[str] = (), removes: Iterable[str] = ()) -> CachedBlocklist:
+    """
+    Apply one write to the token's newest snapshot, taken after the write returned,
+    so concurrent writes to the same token do not overwrite each other's values.
+    """
+    latest = blocklist_cache.peek(token)
+    if latest is None:
+        # Evicted while the write was in flight; the write is stored, so a read sees it
+        return await get_blocklist(token)
+    values = set(latest.stored())
+    values.update(adds)
+    values.difference_update(removes)
+    return cache_blocklist(token, values)
+
+
+async def _add_values(token: str, values: List[str]) -> CachedBlocklist:
+    """Store domains and/or category references; returns the new snapshot."""
+    if blocklist_journal.active():
+        # Write-behind: acknowledge once journaled; the flusher persists it
+        current = await get_blocklist(token)
+        blocklist_journal.record(token, adds=values)
+        if blocklist_cache.peek(token) is None:
+            # The read fell back to the local store; do not cache that as the list
+            return _uncached(token, {*current.stored(), *values})
+        return await _cache_delta(token, adds=values)
+    if blocklist_store.enabled():
+        try:
+            if blocklist_cache.get(token) is not None:
+                written = await blocklist_store.add(token, values)
+                return await _cache_delta(token, adds=written)
+            # Cold cache: the RPC answers with the whole list after the write
+            stored = await blocklist_store.add_all(token, values)
+            if blocklist_cache.peek(token) is not None:
+                wanted = set(values)
+                return await _cache_delta(token, adds=[v for v in stored if v in wanted])
+            return cache_blocklist(token, stored)
+        except Exception:
+            await local_blocklist.preload(token)
+            return _uncached(token, local_blocklist.add(token, values))
+    await local_blocklist.preload(token)
+    return cache_blocklist(token, local_blocklist.add(token, values))
+
+
+async def _remove_value(token: str, value: str) -> CachedBlocklist:
+    if blocklist_journal.active():
+        current = await get_blocklist(token)
+        blocklist_journal.record(token, removes=[value])
+        if blocklist_cache.peek(token) is None:
+            return _uncached(token, [v for v in current.stored() if v != value])
+        return await _cache_delta(token, removes=[value])
+    if blocklist_store.enabled():
+        try:
+            if blocklist_cache.get(token) is not None:
+                removed = await blocklist_store.remove(token, value)
+                return await _cache_delta(token, removes=[value, *removed])
+            stored = await blocklist_store.remove_all(token, value)
+            if blocklist_cache.peek(token) is not None:
+                return await _cache_delta(token, removes=[value])
+            return cache_blocklist(token, stored)
+        except Exception:
+            await local_blocklist.preload(token)
+            return _uncached(token, local_blocklist.discard(token, [value]))
+    await local_blocklist.preload(token)
+    return cache_blocklist(token, local_blocklist.discard(token, [value]))
+
+
+async def add_custom(token: str, domains: List[str]) -> List[str]:
+    return list((await _add_values(token, domains)).domains)
+
+
+async def remove_custom(token: str, domain: str) -> List[str]:
+    return list((await _remove_value(token, domain)).domains)
+
+
+async def subscribe_categories(token: str, names: List[str]) -> List[str]:
+    """Reference categories by name (one stored row each); returns the token's categories."""
+    return list((await _add_values(token, [category_ref(n) for n in names])).categories)
+
+
+async def unsubscribe_category(token: str, name: str) -> List[str]:
+    return list((await _remove_value(token, category_ref(name))).categories)
+
+
+async def add_scheduled(token: str, domains: List[str], schedule: Schedule) -> List[str]:
+    """Block domains only inside a weekly window; returns the token's scheduled values."""
+    return list((await _add_values(token, [schedule_value(d, schedule) for d in domains])).scheduled)
+
+
+async def remove_scheduled(token: str, domain: str, schedule: Schedule) -> List[str]:
+    return list((await _remove_value(token, schedule_value(domain, schedule))).scheduled)
+
+
+async def add_patterns(token: str, patterns: List[str]) -> List[str]:
+    """Store validated wildcard/regex rules (see blocklist_patterns); returns all of them."""
+    return list((await _add_values(token, [PATTERN_PREFIX + p for p in patterns])).patterns)
+
+
+async def remove_pattern(token: str, pattern: str) -> List[str]:
+    return list((await _remove_value(token, PATTERN_PREFIX + pattern)).patterns)
+
+
+async def write_domains(token: str, domains: List[str]) -> List[str]:
+    """
+    Persist domains without touching the cache (bulk paths update it once at the end).
+    Returns the domains actually written. Errors propagate to the caller.
+    """
+    if blocklist_store.enabled():
+        if blocklist_journal.active():
+            blocklist_journal.discard(token, domains)
+        return await blocklist_store.add(token, domains)
+    await local_blocklist.preload(token)
+    local_blocklist.add(token, domains)
+    return list(domains)
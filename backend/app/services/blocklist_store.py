@@ -0,0 +1,154 @@
+import os
+import httpx
+from typing import List, Optional, Tuple
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.deadline import outbound_timeout
+
+# --- Config ---
+SUPABASE_URL = os.getenv("SUPABASE_URL", "").rstrip("/")
+SUPABASE_SERVICE_ROLE = os.getenv("SUPABASE_SERVICE_ROLE", "")
+SB_TABLE = "blocklist_domains"
+SB_TIMEOUT = 10.0
+# Calls slower than this count against the breaker (see circuit_breaker)
+SB_SLOW_CALL = float(os.getenv("SUPABASE_BREAKER_SLOW_CALL", "2"))
+
+
+# Stored values that are not plain domains: "@category", "domain#schedule@Time/Zone"
+# and "~pattern". They are kept byte-exact (time zones and regexes are case-sensitive).
+_TAGGED = ("@", "#", "~")
+
+
+def _clean_value(value: str) -> str:
+    if any(c in value for c in _TAGGED):
+        return value
+    return value.strip().lower()
+
+
+def _clean_domains(rows: List[dict]) -> List[str]:
+    return sorted({_clean_value(row["domain"]) for row in rows if row.get("domain")})
+
+
+class SupabaseBlocklistStore:
+    """
+    Async PostgREST access to the `blocklist_domains` table.
+    A single keep-alive `httpx.AsyncClient` is shared by all requests; it is opened
+    and closed by the app lifespan (see app.main). Requests go through a circuit
+    breaker, so during an outage they raise CircuitOpen at once and callers fall
+    back to the local store instead of waiting out SB_TIMEOUT.
+    """
+
+    def __init__(self):
+        self.url = SUPABASE_URL
+        self.service_role = SUPABASE_SERVICE_ROLE
+        self.table = SB_TABLE
+        self._client: Optional[httpx.AsyncClient] = None
+        self.breaker = CircuitBreaker("supabase", SB_SLOW_CALL)
+
+    def enabled(self) -> bool:
+        return bool(self.url and self.service_role)
+
+    def _headers(self) -> dict:
+        return {
+            "apikey": self.service_role,
+            "Authorization": f"Bearer {self.service_role}",
+            "Content-Type": "application/json",
+            "Prefer": "return=representation",
+        }
+
+    async def start(self):
+        if self._client is None and self.enabled():
+            self._client = httpx.AsyncClient(
+                base_url=f"{self.url}/rest/v1",
+                headers=self._headers(),
+                timeout=SB_TIMEOUT,
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60),
+            )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _get_client(self) -> httpx.AsyncClient:
+        # Lazily open the pool when used outside the lifespan (scripts, tests)
+        if self._client is None:
+            await self.start()
+        return self._client
+
+    async def client(self) -> httpx.AsyncClient:
+        """The shared pool, for writers to other tables of the same project (see llm_usage)."""
+        return await self._get_client()
+
+    async def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        client = await self._get_client()
+        # Timeout is SB_TIMEOUT or what is left of the request's deadline, if less
+        with self.breaker.guard(), outbound_timeout(SB_TIMEOUT) as timeout:
+            resp = await client.request(method, path, timeout=timeout, **kwargs)
+            resp.raise_for_status()
+        return resp
+
+    async def list(self, token: str) -> List[str]:
+        params = {
+            "select": "domain",
+            "token": f"eq.{token}",
+            "order": "domain.asc",
+        }
+        resp = await self._request("GET", f"/{self.table}", params=params)
+        return _clean_domains(resp.json())
+
+    async def add(self, token: str, domains: List[str]) -> List[str]:
+        """Upsert unique (token, domain) rows. Returns the domains written, taken from the response body."""
+        if not domains:
+            return []
+        params = {"on_conflict": "token,domain", "select": "domain"}
+        payload = [{"token": token, "domain": d} for d in dict.fromkeys(domains)]
+        headers = {"Prefer": "resolution=merge-duplicates,return=representation"}
+        resp = await self._request("POST", f"/{self.table}", params=params, json=payload, headers=headers)
+        return _clean_domains(resp.json())
+
+    async def remove(self, token: str, domain: str) -> List[str]:
+        """Delete a (token, domain) row. Returns the domains deleted, taken from the response body."""
+        params = {
+            "token": f"eq.{token}",
+            "domain": f"eq.{domain}",
+            "select": "domain",
+        }
+        resp = await self._request("DELETE", f"/{self.table}", params=params)
+        return _clean_domains(resp.json())
+
+    async def add_all(self, token: str, domains: List[str]) -> List[str]:
+        """Upsert domains and return every value the token now stores, in one round trip (RPC)."""
+        payload = {"p_token": token, "p_domains": list(dict.fromkeys(domains))}
+        resp = await self._request("POST", "/rpc/blocklist_add", json=payload)
+        return _clean_domains(resp.json())
+
+    async def remove_all(self, token: str, domain: str) -> List[str]:
+        """Delete a (token, domain) row and return every value the token still stores (RPC)."""
+        payload = {"p_token": token, "p_domain": domain}
+        resp = await self._request("POST", "/rpc/blocklist_remove", json=payload)
+        return _clean_domains(resp.json())
+
+    async def upsert_rows(self, rows: List[Tuple[str, str]]):
+        """Bulk upsert (token, domain) pairs, possibly spanning many tokens, in one request."""
+        if not rows:
+            return
+        params = {"on_conflict": "token,domain"}
+        payload = [{"token": t, "domain": d} for t, d in rows]
+        headers = {"Prefer": "resolution=merge-duplicates,return=minimal"}
+        await self._request("POST", f"/{self.table}", params=params, json=payload, headers=headers)
+
+    async def remove_many(self, token: str, domains: List[str]):
+        """Delete several domains of one token in one request."""
+        if not domains:
+            return
+        # Quoted PostgREST list; patterns may contain quotes, backslashes and commas
+        quoted = ",".join('"' + d.replace("\\", "\\\\").replace('"', '\\"') + '"' for d in domains)
+        params = {
+            "token": f"eq.{token}",
+            "domain": f"in.({quoted})",
+        }
+        await self._request("DELETE", f"/{self.table}", params=params, headers={"Prefer": "return=minimal"})
+
+
+# Global instance
+blocklist_store = SupabaseBlocklistStore()
@@ -0,0 +1,188 @@
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Iterator
+import httpx
+from app.services.deadline import DeadlineExceeded
+
+# --- Config ---
+# Set to 0 to let every call through regardless of recent errors
+BREAKERS_ENABLED = os.getenv("CIRCUIT_BREAKERS", "1") not in ("0", "false", "")
+# Outcomes older than this many seconds no longer count
+BREAKER_WINDOW = float(os.getenv("BREAKER_WINDOW", "30"))
+# Calls needed in the window before the rates are trusted
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+# The breaker opens when either rate reaches its threshold
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_SLOW_RATE = float(os.getenv("BREAKER_SLOW_RATE", "0.8"))
+# Seconds spent open before a probe call is let through
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "15"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling a dependency whose breaker is open."""
+
+
+def is_outage(exc: BaseException) -> bool:
+    """Errors that say the dependency is unwell; a 4xx answer means it is up."""
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    return isinstance(exc, Exception)
+
+
+class _Call:
+    __slots__ = ("failed",)
+
+    def __init__(self):
+        self.failed = False
+
+    def fail(self):
+        """Count this call as failed without raising (e.g. a 5xx that will be retried)."""
+        self.failed = True
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker for one dependency.
+
+    Outcomes of the last BREAKER_WINDOW seconds are kept; once at least
+    BREAKER_MIN_CALLS are in the window, a failure rate of BREAKER_FAILURE_RATE
+    or a rate of calls slower than `slow_call` seconds of BREAKER_SLOW_RATE opens
+    it. While open every call raises CircuitOpen at once, so callers go straight
+    to their fallback. After BREAKER_OPEN_SECONDS one probe call is let through
+    (half-open): success closes the breaker, failure opens it again. Only used
+    from the event loop, so no locking is needed.
+    """
+
+    def __init__(self, name: str, slow_call: float, classify: Callable[[BaseException], bool] = is_outage):
+        self.name = name
+        self.slow_call = slow_call
+        self.classify = classify
+        self.state = CLOSED
+        # (finished at, failed, slow)
+        self._window: "deque[tuple]" = deque()
+        self._failures = 0
+        self._slow = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.opened = 0
+        self.rejected = 0
+
+    def _trim(self, now: float):
+        while self._window and self._window[0][0] < now - BREAKER_WINDOW:
+            _, failed, slow = self._window.popleft()
+            self._failures -= failed
+            self._slow -= slow
+
+    def _open(self, now: float):
+        if self.state != OPEN:
+            self.opened += 1
+            print(f"Circuit breaker {self.name} opened")
+        self.state = OPEN
+        self._opened_at = now
+
+    def _close(self):
+        print(f"Circuit breaker {self.name} closed")
+        self.state = CLOSED
+        self._window.clear()
+        self._failures = self._slow = 0
+
+    def fail_fast(self):
+        """Raise CircuitOpen if a call would be rejected now; claims nothing (use before queueing)."""
+        if not BREAKERS_ENABLED:
+            return
+        if self.state == OPEN and time.monotonic() - self._opened_at < BREAKER_OPEN_SECONDS:
+            self.rejected += 1
+            raise CircuitOpen(f"{self.name} circuit open")
+        if self.state == HALF_OPEN and self._probing:
+            self.rejected += 1
+            raise CircuitOpen(f"{self.name} circuit half-open, probe in flight")
+
+    def _admit(self):
+        self.fail_fast()
+        if self.state == OPEN:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN:
+            self._probing = True
+
+    def _record(self, failed: bool, elapsed: float):
+        now = time.monotonic()
+        slow = elapsed >= self.slow_call
+        if self.state == HALF_OPEN:
+            self._probing = False
+            if failed or slow:
+                self._open(now)
+            else:
+                self._close()
+            return
+        if self.state == OPEN:
+            # Admitted before another call opened it
+            return
+        self._window.append((now, failed, slow))
+        self._failures += failed
+        self._slow += slow
+        self._trim(now)
+        calls = len(self._window)
+        if calls >= BREAKER_MIN_CALLS and (
+            self._failures / calls >= BREAKER_FAILURE_RATE or self._slow / calls >= BREAKER_SLOW_RATE
+        ):
+            self._open(now)
+
+    def _release(self):
+        # A probe that ended without a verdict; the next call probes instead
+        if self.state == HALF_OPEN:
+            self._probing = False
+
+    @contextmanager
+    def guard(self) -> Iterator[_Call]:
+        """
+        Wrap one call: raises CircuitOpen instead of running it while open, and
+        records its latency and outcome. Exceptions pass through unchanged;
+        cancellation and the caller's own deadline are not counted either way.
+        """
+        if not BREAKERS_ENABLED:
+            yield _Call()
+            return
+        self._admit()
+        call = _Call()
+        started = time.monotonic()
+        try:
+            yield call
+        except DeadlineExceeded:
+            self._release()
+            raise
+        except Exception as e:
+            self._record(self.classify(e), time.monotonic() - started)
+            raise
+        except BaseException:
+            self._release()
+            raise
+        else:
+            self._record(call.failed, time.monotonic() - started)
+
+    def current_state(self) -> str:
+        if not BREAKERS_ENABLED:
+            return "disabled"
+        if self.state == OPEN and time.monotonic() - self._opened_at >= BREAKER_OPEN_SECONDS:
+            # Next call will probe
+            return HALF_OPEN
+        return self.state
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        self._trim(now)
+        calls = len(self._window)
+        return {
+            "state": self.current_state(),
+            "window_calls": calls,
+            "failure_rate": round(self._failures / calls, 4) if calls else 0.0,
+            "slow_rate": round(self._slow / calls, 4) if calls else 0.0,
+            "slow_call_seconds": self.slow_call,
+            "open_for": round(max(0.0, BREAKER_OPEN_SECONDS - (now - self._opened_at)), 2)
+            if self.state == OPEN else 0.0,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
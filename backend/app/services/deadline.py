@@ -0,0 +1,65 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+import httpx
+
+# --- Config ---
+# Upper bound for client-supplied budgets
+DEADLINE_MAX = float(os.getenv("REQUEST_DEADLINE_MAX", "60"))
+# Kept back from outbound timeouts to build the response (fallbacks, serialization)
+DEADLINE_RESERVE = float(os.getenv("REQUEST_DEADLINE_RESERVE", "0.25"))
+# An outbound call is not started with less time than this
+_MIN_CALL = 0.05
+
+# Monotonic time by which the current request must be answered; None = no deadline
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The request's remaining budget cannot cover an outbound call."""
+
+
+def set_deadline(seconds: Optional[float]):
+    """Start (or clear, with None) the deadline for the current context and the tasks it creates."""
+    _deadline.set(time.monotonic() + seconds if seconds is not None else None)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the deadline (may be negative), or None without one."""
+    deadline = _deadline.get()
+    return deadline - time.monotonic() if deadline is not None else None
+
+
+def can_afford(seconds: float) -> bool:
+    """Whether `seconds` of work still fit before the deadline, keeping the reserve."""
+    left = remaining()
+    return left is None or left - DEADLINE_RESERVE >= seconds
+
+
+def budget(default: float) -> float:
+    """`default` cut to what is left of the deadline; raises DeadlineExceeded when too little is."""
+    left = remaining()
+    if left is None:
+        return default
+    left -= DEADLINE_RESERVE
+    if left < _MIN_CALL:
+        raise DeadlineExceeded("request deadline reached")
+    return min(default, left)
+
+
+@contextmanager
+def outbound_timeout(default: float) -> Iterator[float]:
+    """
+    Timeout for one outbound httpx call (see budget). An httpx timeout caused
+    by the cut, not by the dependency's own limit, becomes DeadlineExceeded.
+    """
+    timeout = budget(default)
+    try:
+        yield timeout
+    except httpx.TimeoutException as e:
+        if timeout < default:
+            raise DeadlineExceeded(f"request deadline reached after {timeout:.2f}s") from e
+        raise
+
@@ -0,0 +1,199 @@
+import argparse
+import hashlib
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Iterator, Optional
+from app.services.domain_trie import DomainTrie
+
+# File layout (little-endian, sections 8-byte aligned):
+#   header | sorted u64 hashes | covered bitmap | bloom bits | "domain\n" text
+# The text is sorted; bit i of the covered bitmap is set when the i-th domain is
+# covered by a parent in the same list (dropped from suffix-semantics outputs).
+_MAGIC = b"NBDIDX01"
+_HEADER = struct.Struct("<8s16sIIQQQQQQQ")
+_FORMAT_VERSION = 1
+_TEXT_CHUNK = 1 << 20
+
+
+def domain_hash(domain: str) -> int:
+    return int.from_bytes(hashlib.blake2b(domain.encode(), digest_size=8).digest(), "little")
+
+
+def _bloom_bits(h: int, k: int, m: int) -> Iterator[int]:
+    # Double hashing: k probe positions from the two 32-bit halves of one hash
+    h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+    for i in range(k):
+        yield (h1 + i * h2) % m
+
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
+
+
+class DomainIndex:
+    """
+    Immutable, memory-mapped domain list for very large (1M+) categories.
+
+    Membership is a binary search over sorted 64-bit hashes, optionally behind a
+    Bloom filter, so lookups touch a few pages and nothing is parsed at load time.
+    The file is mapped read-only, so every worker on a host shares the same page
+    cache instead of holding its own set of strings. Exposes the DomainTrie lookup
+    API (match/exact/in) so matching code does not care which one it gets.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, digest, version, self.bloom_k, self.count, self.compacted_count,
+         self.bloom_bits, hashes_off, covered_off, bloom_off, text_off) = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC or version != _FORMAT_VERSION:
+            self._mm.close()
+            raise ValueError(f"{path}: not a domain index (version {_FORMAT_VERSION})")
+        self.digest = digest.hex()
+        view = memoryview(self._mm)
+        hashes = view[hashes_off:hashes_off + 8 * self.count]
+        if sys.byteorder == "little":
+            self._hashes = hashes.cast("Q")
+        else:
+            # Rare: big-endian host, pay for one private copy
+            self._hashes = array("Q", hashes.tobytes())
+            self._hashes.byteswap()
+        self._covered = view[covered_off:covered_off + (self.count + 7) // 8]
+        self._bloom = view[bloom_off:bloom_off + self.bloom_bits // 8] if self.bloom_bits else None
+        self._text_off = text_off
+        self.probes = 0
+        self.bloom_rejects = 0
+
+    # ---------- lookups ----------
+    def _has(self, domain: str) -> bool:
+        self.probes += 1
+        h = domain_hash(domain)
+        if self._bloom is not None:
+            for bit in _bloom_bits(h, self.bloom_k, self.bloom_bits):
+                if not self._bloom[bit >> 3] & (1 << (bit & 7)):
+                    self.bloom_rejects += 1
+                    return False
+        i = bisect_left(self._hashes, h)
+        return i < self.count and self._hashes[i] == h
+
+    def exact(self, domain: str) -> bool:
+        return self._has(domain)
+
+    def match(self, host: str) -> Optional[str]:
+        """Return the shortest listed domain covering `host`, or None."""
+        labels = host.split(".")
+        for i in range(len(labels) - 1, -1, -1):
+            candidate = ".".join(labels[i:])
+            if self._has(candidate):
+                return candidate
+        return None
+
+    def __contains__(self, host: str) -> bool:
+        return self.match(host) is not None
+
+    def __len__(self) -> int:
+        return self.count
+
+    # ---------- iteration ----------
+    def iter_text(self) -> Iterator[bytes]:
+        """The raw "domain\\n" text in ~1 MiB chunks (the plain-text rendering)."""
+        end = len(self._mm)
+        for start in range(self._text_off, end, _TEXT_CHUNK):
+            yield self._mm[start:min(start + _TEXT_CHUNK, end)]
+
+    def iter_domains(self, compacted: bool = False) -> Iterator[str]:
+        i = 0
+        rest = b""
+        covered = self._covered
+        for chunk in self.iter_text():
+            lines = (rest + chunk).split(b"\n")
+            rest = lines.pop()
+            for line in lines:
+                if not (compacted and covered[i >> 3] & (1 << (i & 7))):
+                    yield line.decode("ascii")
+                i += 1
+
+    def stats(self) -> dict:
+        return {
+            "count": self.count,
+            "bytes": len(self._mm),
+            "bloom": self._bloom is not None,
+            "probes": self.probes,
+            "bloom_rejects": self.bloom_rejects,
+        }
+
+    def close(self):
+        self._hashes = self._covered = self._bloom = None
+        self._mm.close()
+
+
+def build_index(domains: Iterable[str], path: str, bloom_bits_per_key: int = 10) -> dict:
+    """
+    Write an index file for `domains` (offline; holds the whole list in memory).
+    bloom_bits_per_key=0 leaves out the Bloom filter.
+    """
+    domains = sorted(set(domains))
+    trie = DomainTrie(domains)
+    covered = bytearray((len(domains) + 7) // 8)
+    for i, d in enumerate(domains):
+        if trie.match(d) != d:
+            covered[i >> 3] |= 1 << (i & 7)
+    compacted_count = len(domains) - sum(bin(b).count("1") for b in covered)
+
+    hashes = array("Q", sorted({domain_hash(d) for d in domains}))
+    if len(hashes) != len(domains):
+        raise ValueError("64-bit hash collision in input; rebuild is not possible with this list")
+    if sys.byteorder != "little":
+        hashes.byteswap()
+
+    bloom_bits, bloom_k = 0, 0
+    bloom = bytearray()
+    if bloom_bits_per_key > 0 and domains:
+        bloom_bits = _align(max(64, len(domains) * bloom_bits_per_key))
+        bloom_k = max(1, round(bloom_bits_per_key * math.log(2)))
+        bloom = bytearray(bloom_bits // 8)
+        for d in domains:
+            for bit in _bloom_bits(domain_hash(d), bloom_k, bloom_bits):
+                bloom[bit >> 3] |= 1 << (bit & 7)
+
+    text = "".join(f"{d}\n" for d in domains).encode("ascii")
+    digest = hashlib.blake2b(text, digest_size=16).digest()
+
+    hashes_off = _align(_HEADER.size)
+    covered_off = _align(hashes_off + 8 * len(hashes))
+    bloom_off = _align(covered_off + len(covered))
+    text_off = _align(bloom_off + len(bloom))
+    header = _HEADER.pack(_MAGIC, digest, _FORMAT_VERSION, bloom_k, len(domains), compacted_count,
+                          bloom_bits, hashes_off, covered_off, bloom_off, text_off)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        for off, section in ((0, header), (hashes_off, hashes.tobytes()), (covered_off, covered),
+                             (bloom_off, bloom), (text_off, text)):
+            f.write(b"\0" * (off - f.tell()))
+            f.write(section)
+    os.replace(tmp, path)
+    return {"count": len(domains), "compacted": compacted_count, "bytes": text_off + len(text), "bloom_bits": bloom_bits}
+
+
+if __name__ == "__main__":
+    # python -m app.services.domain_index community.txt app/data/community.idx
+    from app.services.domain_utils import parse_list_line
+
+    parser = argparse.ArgumentParser(description="Build a memory-mapped domain index from a hosts/Adblock/plain list.")
+    parser.add_argument("source")
+    parser.add_argument("output")
+    parser.add_argument("--bloom-bits-per-key", type=int, default=10, help="0 disables the Bloom filter")
+    args = parser.parse_args()
+
+    def _read(path: str) -> Iterator[str]:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                yield from parse_list_line(line)
+
+    print(build_index(_read(args.source), args.output, args.bloom_bits_per_key))
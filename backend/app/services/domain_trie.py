@@ -0,0 +1,76 @@
+from typing import Dict, Iterable, Iterator, List, Optional
+
+# Terminal marker; DNS labels are never empty, so it cannot collide with a child
+_END = ""
+
+
+class DomainTrie:
+    """
+    Reversed-label suffix trie: "m.youtube.com" is stored as com -> youtube -> m.
+    A rule matches its own domain and every subdomain, and a lookup costs
+    O(number of labels in the host) regardless of how many rules are stored.
+    """
+
+    __slots__ = ("_root", "size")
+
+    def __init__(self, domains: Iterable[str] = ()):
+        self._root: Dict[str, dict] = {}
+        self.size = 0
+        for d in domains:
+            self.add(d)
+
+    def add(self, domain: str):
+        node = self._root
+        for label in reversed(domain.split(".")):
+            node = node.setdefault(label, {})
+        if _END not in node:
+            node[_END] = domain
+            self.size += 1
+
+    def match(self, host: str) -> Optional[str]:
+        """Return the shortest rule covering `host` (itself or a parent), or None."""
+        node = self._root
+        for label in reversed(host.split(".")):
+            node = node.get(label)
+            if node is None:
+                return None
+            rule = node.get(_END)
+            if rule is not None:
+                return rule
+        return None
+
+    def exact(self, domain: str) -> bool:
+        """True only if `domain` itself was added (no parent matching)."""
+        node = self._root
+        for label in reversed(domain.split(".")):
+            node = node.get(label)
+            if node is None:
+                return False
+        return _END in node
+
+    def __contains__(self, host: str) -> bool:
+        return self.match(host) is not None
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self) -> Iterator[str]:
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            for label, child in node.items():
+                if label == _END:
+                    yield child
+                else:
+                    stack.append(child)
+
+
+def compact(domains: Iterable[str], trie: Optional[DomainTrie] = None) -> List[str]:
+    """
+    Drop domains already covered by a parent domain in the same list, keeping order.
+    Only valid for outputs with suffix semantics (a rule also blocks subdomains).
+    """
+    domains = list(domains)
+    if trie is None:
+        trie = DomainTrie(domains)
+    return [d for d in domains if trie.match(d) == d]
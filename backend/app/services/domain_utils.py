@@ -0,0 +1,95 @@
+import re
+from typing import List, Optional
+
+_LABEL_RE = re.compile(r"^(?!-)[a-z0-9_-]{1,63}(?<!-)$")
+
+# Hostnames that appear in stock hosts files and must never be imported
+_RESERVED_HOSTS = {
+    "localhost", "localhost.localdomain", "local", "broadcasthost",
+    "ip6-localhost", "ip6-loopback", "ip6-localnet", "ip6-mcastprefix",
+    "ip6-allnodes", "ip6-allrouters", "ip6-allhosts", "0.0.0.0",
+}
+
+# Adblock options that still mean "block the whole domain"
+_ADBLOCK_DOMAIN_OPTIONS = {"important", "all", "document", "doc"}
+
+
+def normalize_domain(raw: str) -> Optional[str]:
+    """
+    Reduce a URL, host or host:port to a lowercase ASCII (punycode) domain.
+    Returns None for anything that is not a plausible registrable hostname
+    (IP addresses, single labels, invalid characters).
+    """
+    s = (raw or "").strip().lower()
+    if not s:
+        return None
+    if "://" in s:
+        s = s.split("://", 1)[1]
+    elif s.startswith("//"):
+        s = s[2:]
+    # Drop path/query/fragment, userinfo and port
+    for sep in ("/", "?", "#"):
+        s = s.split(sep, 1)[0]
+    s = s.rsplit("@", 1)[-1]
+    if s.startswith("["):
+        return None  # IPv6 literal
+    s = s.split(":", 1)[0]
+    s = s.strip(".")
+    if s.startswith("*."):
+        s = s[2:]
+    if not s or "." not in s or s in _RESERVED_HOSTS:
+        return None
+    try:
+        s = s.encode("idna").decode("ascii")
+    except UnicodeError:
+        return None
+    if len(s) > 253:
+        return None
+    labels = s.split(".")
+    if not all(_LABEL_RE.match(label) for label in labels):
+        return None
+    if labels[-1].isdigit():
+        return None  # IPv4 address
+    return s
+
+
+def parse_list_line(line: str) -> List[str]:
+    """
+    Extract domains from one line of a hosts file, Adblock filter list or
+    plain domain list. Comments, exception rules and cosmetic filters yield [].
+    """
+    s = line.strip()
+    if not s or s[0] in "#!;[":
+        return []
+    if s.startswith("@@") or "##" in s or "#@#" in s:
+        return []
+    if s.startswith("||"):
+        body = s[2:]
+        rule, _, options = body.partition("$")
+        if options and not set(o.strip() for o in options.split(",")) <= _ADBLOCK_DOMAIN_OPTIONS:
+            return []
+        if rule.endswith("^") or rule.endswith("^|"):
+            rule = rule.rstrip("|").rstrip("^")
+        elif not rule.endswith("/"):
+            return []
+        if "*" in rule:
+            return []
+        d = normalize_domain(rule)
+        return [d] if d else []
+    # Hosts format: "<ip> host [host ...] [# comment]"
+    s = s.split("#", 1)[0].strip()
+    parts = s.split()
+    if not parts:
+        return []
+    if len(parts) > 1 and (parts[0][0].isdigit() or ":" in parts[0]):
+        hosts = parts[1:]
+    elif len(parts) == 1:
+        hosts = parts
+    else:
+        return []
+    out = []
+    for h in hosts:
+        d = normalize_domain(h)
+        if d:
+            out.append(d)
+    return out
@@ -1,13 +1,63 @@
+import asyncio
+import json
 import os
-import requests
-from typing import List
+import random
+import re
+import time
+from collections import OrderedDict, deque
+from contextlib import aclosing
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Dict, List, Optional
+import httpx
 from dotenv import load_dotenv
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpen
+from app.services.deadline import DeadlineExceeded, budget, can_afford, outbound_timeout
+from app.services.llm_usage import LLMQuotaExceeded, llm_usage
 
 # --- Config ---
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
 GROQ_MODEL = "llama-3.1-8b-instant"
+GROQ_TIMEOUT = float(os.getenv("GROQ_TIMEOUT", "15"))
+GROQ_MAX_CONCURRENCY = int(os.getenv("GROQ_MAX_CONCURRENCY", "16"))
+GROQ_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "3"))
+GROQ_BACKOFF_BASE = float(os.getenv("GROQ_BACKOFF_BASE", "0.5"))
+GROQ_BACKOFF_MAX = float(os.getenv("GROQ_BACKOFF_MAX", "8"))
+# A Retry-After longer than this is not waited out; the call fails over to the fallbacks
+GROQ_RETRY_AFTER_MAX = float(os.getenv("GROQ_RETRY_AFTER_MAX", "30"))
+# Hedging: when a completion is slower than the rolling GROQ_HEDGE_QUANTILE latency,
+# a second request races it (optionally on another model) and the first valid one wins
+GROQ_HEDGE = os.getenv("GROQ_HEDGE", "1") not in ("0", "false", "")
+GROQ_HEDGE_MODEL = os.getenv("GROQ_HEDGE_MODEL", "").strip() or GROQ_MODEL
+GROQ_HEDGE_QUANTILE = float(os.getenv("GROQ_HEDGE_QUANTILE", "0.9"))
+GROQ_HEDGE_MIN_DELAY = float(os.getenv("GROQ_HEDGE_MIN_DELAY", "0.5"))
+# Delay used until enough latencies have been seen
+GROQ_HEDGE_INITIAL_DELAY = float(os.getenv("GROQ_HEDGE_INITIAL_DELAY", "3"))
+# At most this fraction of calls get a hedge, so spend grows by at most this much
+GROQ_HEDGE_MAX_RATE = float(os.getenv("GROQ_HEDGE_MAX_RATE", "0.1"))
+# Provider limits for the outbound scheduler (per worker); response headers refine them
+GROQ_RPM = float(os.getenv("GROQ_RPM", "30"))
+GROQ_TPM = float(os.getenv("GROQ_TPM", "6000"))
+# Longest a call waits for rate capacity before failing over to the fallbacks
+GROQ_QUEUE_MAX_WAIT = float(os.getenv("GROQ_QUEUE_MAX_WAIT", "10"))
+# Completions slower than this count against the circuit breaker (see circuit_breaker)
+GROQ_SLOW_CALL = float(os.getenv("GROQ_BREAKER_SLOW_CALL", "10"))
+# A call is skipped for the fallbacks when less than this (or the median latency, if
+# higher) is left of the request's deadline (see deadline)
+GROQ_MIN_BUDGET = float(os.getenv("GROQ_MIN_BUDGET", "1"))
+_HEDGE_WINDOW = 200
+_HEDGE_MIN_SAMPLES = 20
+# Unused hedge budget carried over, in hedges (allows a short burst after a quiet spell)
+_HEDGE_BURST = 5.0
+
+_RETRY_STATUS = {429, 500, 502, 503, 504}
+
+try:
+    import h2  # noqa: F401  (installed by httpx[http2])
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
 
 # --- Fallback questions if Groq fails ---
 FALLBACK_QUESTIONS = [
@@ -17,55 +67,625 @@ FALLBACK_QUESTIONS = [
     "I set clear priorities for my work and stick to them.",
 ]
 
-def _call_groq(prompt: str) -> str:
+SYSTEM_PROMPT = (
+    "You are a helpful assistant. "
+    "Generate ONLY first-person statements suitable for 'Agree' or 'Disagree'. "
+    "Do NOT output questions. "
+    "Output one statement per line, no numbering, no bullets, no commentary."
+)
+
+
+def _retry_after(resp: httpx.Response) -> Optional[float]:
+    """Seconds from a Retry-After header (delta-seconds or HTTP date), if any."""
+    raw = resp.headers.get("retry-after")
+    if not raw:
+        return None
+    try:
+        return max(0.0, float(raw))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(raw).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _estimated_usage(messages: List[Dict[str, str]], content: str) -> dict:
+    prompt = sum(len(m.get("content", "")) for m in messages) // 4
+    completion = len(content) // 4
+    return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+
+def _stream_delta(line: str) -> Optional[str]:
+    """Content of one streamed SSE line ("" for non-content lines, None at [DONE])."""
+    if not line.startswith("data:"):
+        return ""
+    data = line[5:].strip()
+    if data == "[DONE]":
+        return None
+    try:
+        choice = (json.loads(data).get("choices") or [{}])[0]
+    except ValueError:
+        return ""
+    return (choice.get("delta") or {}).get("content") or ""
+
+
+class _LatencyWindow:
+    """The last _HEDGE_WINDOW successful request latencies, for rolling quantiles."""
+
+    def __init__(self, size: int = _HEDGE_WINDOW):
+        self._samples: "deque[float]" = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class GroqRateLimited(Exception):
+    """No request/token capacity became free within GROQ_QUEUE_MAX_WAIT."""
+
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+
+def _duration(raw: Optional[str]) -> Optional[float]:
+    """Seconds from a rate-limit reset header like "7.66s", "2m59.56s" or "120ms"."""
+    if not raw:
+        return None
+    parts = _DURATION_RE.findall(raw)
+    if not parts:
+        return None
+    return sum(float(n) * _DURATION_UNITS[unit] for n, unit in parts)
+
+
+def _header_int(resp: httpx.Response, name: str) -> Optional[int]:
+    try:
+        return int(float(resp.headers[name]))
+    except (KeyError, ValueError):
+        return None
+
+
+def estimate_tokens(messages: List[Dict[str, str]], max_tokens: int) -> int:
+    """Rough request cost for the TPM bucket: ~4 characters per prompt token plus the completion budget."""
+    return sum(len(m.get("content", "")) for m in messages) // 4 + max_tokens
+
+
+class _Waiter:
+    __slots__ = ("cost", "future")
+
+    def __init__(self, cost: int):
+        self.cost = cost
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class GroqRateScheduler:
+    """
+    Outbound admission control for Groq's per-minute limits.
+
+    Two token buckets, requests (RPM) and estimated tokens (TPM), refill
+    continuously. Callers wait in one FIFO per user, served round-robin, so one
+    user's burst cannot starve the others; a caller that is not admitted within
+    GROQ_QUEUE_MAX_WAIT gets GroqRateLimited. Response headers (limits, remaining,
+    reset) and 429s correct the local view, and actual usage replaces the estimate.
+    """
+
+    def __init__(self, rpm: float = GROQ_RPM, tpm: float = GROQ_TPM, max_wait: float = GROQ_QUEUE_MAX_WAIT):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_wait = max_wait
+        self._requests = rpm
+        self._tokens = tpm
+        self._refilled = time.monotonic()
+        # No admissions before this (429 Retry-After, exhausted remaining counts)
+        self._paused_until = 0.0
+        self._queues: "OrderedDict[str, deque[_Waiter]]" = OrderedDict()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.admitted = 0
+        self.timeouts = 0
+        self.max_waited = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._refilled
+        self._refilled = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    def _wait_for(self, cost: float) -> float:
+        """Seconds until `cost` tokens and one request are available (0 if now)."""
+        now = time.monotonic()
+        wait = max(0.0, self._paused_until - now)
+        if self._requests < 1:
+            wait = max(wait, (1 - self._requests) * 60 / self.rpm)
+        if self._tokens < cost:
+            wait = max(wait, (cost - self._tokens) * 60 / self.tpm)
+        return wait
+
+    def _dispatch(self):
+        self._timer = None
+        self._refill()
+        while self._queues:
+            user, queue = next(iter(self._queues.items()))
+            waiter = queue[0]
+            # A request larger than the whole bucket would never fit; let it drain the bucket instead
+            cost = min(waiter.cost, self.tpm)
+            wait = self._wait_for(cost)
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+            self._requests -= 1
+            self._tokens -= cost
+            queue.popleft()
+            # Round-robin: this user goes to the back
+            del self._queues[user]
+            if queue:
+                self._queues[user] = queue
+            if not waiter.future.done():
+                waiter.future.set_result(None)
+
+    def _remove(self, user: str, waiter: _Waiter):
+        queue = self._queues.get(user)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[user]
+
+    async def acquire(self, user: str, cost: int, max_wait: Optional[float] = None):
+        max_wait = self.max_wait if max_wait is None else max_wait
+        waiter = _Waiter(cost)
+        self._queues.setdefault(user, deque()).append(waiter)
+        if self._timer is None:
+            self._dispatch()
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), max_wait)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise GroqRateLimited(f"no Groq capacity within {max_wait:.1f}s")
+        finally:
+            self._remove(user, waiter)
+        self.admitted += 1
+        self.max_waited = max(self.max_waited, time.monotonic() - started)
+
+    def congested(self) -> bool:
+        """True when a new request would have to queue."""
+        self._refill()
+        return bool(self._queues) or self._wait_for(0) > 0
+
+    def settle(self, estimated: int, actual: int):
+        """Correct the token bucket once the response reports real usage."""
+        self._tokens = min(self.tpm, self._tokens + estimated - actual)
+
+    def observe(self, resp: httpx.Response):
+        """Adopt Groq's own view from x-ratelimit-* headers (and Retry-After on 429)."""
+        self._refill()
+        now = time.monotonic()
+        limit_tokens = _header_int(resp, "x-ratelimit-limit-tokens")
+        if limit_tokens:
+            self.tpm = float(limit_tokens)
+        remaining_tokens = _header_int(resp, "x-ratelimit-remaining-tokens")
+        if remaining_tokens is not None:
+            self._tokens = min(self._tokens, float(remaining_tokens))
+        remaining_requests = _header_int(resp, "x-ratelimit-remaining-requests")
+        if remaining_requests == 0:
+            reset = _duration(resp.headers.get("x-ratelimit-reset-requests"))
+            if reset:
+                self._paused_until = max(self._paused_until, now + reset)
+        if resp.status_code == 429:
+            retry_after = _retry_after(resp) or _duration(resp.headers.get("x-ratelimit-reset-tokens"))
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+
+    def stats(self) -> dict:
+        self._refill()
+        return {
+            "rpm": self.rpm,
+            "tpm": self.tpm,
+            "requests_available": round(self._requests, 2),
+            "tokens_available": round(self._tokens),
+            "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 2),
+            "queued": sum(len(q) for q in self._queues.values()),
+            "queued_users": len(self._queues),
+            "admitted": self.admitted,
+            "timeouts": self.timeouts,
+            "max_waited": round(self.max_waited, 3),
+        }
+
+
+class GroqClient:
+    """
+    Async Groq chat-completions client.
+
+    One keep-alive `httpx.AsyncClient` (HTTP/2 when h2 is installed) is shared by
+    all requests and opened/closed by the app lifespan (see app.main). A semaphore
+    bounds in-flight calls per worker; 429/5xx and transport errors are retried
+    with full-jitter exponential backoff, honouring Retry-After. The timeout is
+    per attempt, and the semaphore is released while backing off. Every attempt
+    is first admitted by the RPM/TPM scheduler (see GroqRateScheduler); queueing
+    and the per-attempt timeout are cut to the request's deadline, if any. It goes
+    through a circuit breaker: while Groq is failing or slow, calls raise
+    CircuitOpen at once and callers use the fallback statements.
+
+    chat() is hedged: if no answer arrives within the rolling p90 (by default)
+    latency, a second request goes to GROQ_HEDGE_MODEL and the first non-empty
+    answer wins; the other is cancelled. A budget refilled by GROQ_HEDGE_MAX_RATE
+    per call caps how many calls are hedged.
+    """
+
+    def __init__(self):
+        self.api_key = GROQ_API_KEY
+        self._client: Optional[httpx.AsyncClient] = None
+        self._sem = asyncio.Semaphore(GROQ_MAX_CONCURRENCY)
+        self.scheduler = GroqRateScheduler()
+        self.breaker = CircuitBreaker("groq", GROQ_SLOW_CALL)
+        self.in_flight = 0
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.streams_closed_early = 0
+        self.skipped_for_deadline = 0
+        self.latency = _LatencyWindow()
+        self._hedge_budget = _HEDGE_BURST
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.hedges_over_budget = 0
+        self.hedges_rate_limited = 0
+        # Per-model request accounting: attempts, successes, failures, cancelled, wins
+        self.models: Dict[str, Dict[str, int]] = {}
+
+    def enabled(self) -> bool:
+        return bool(self.api_key)
+
+    async def start(self):
+        if self._client is None and self.enabled():
+            self._client = httpx.AsyncClient(
+                headers={"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"},
+                timeout=GROQ_TIMEOUT,
+                http2=_HTTP2,
+                limits=httpx.Limits(
+                    max_connections=GROQ_MAX_CONCURRENCY,
+                    max_keepalive_connections=GROQ_MAX_CONCURRENCY,
+                    keepalive_expiry=60,
+                ),
+            )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _get_client(self) -> httpx.AsyncClient:
+        # Lazily open the pool when used outside the lifespan (scripts, tests)
+        if self._client is None:
+            await self.start()
+        return self._client
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        delay = random.uniform(0, min(GROQ_BACKOFF_MAX, GROQ_BACKOFF_BASE * 2 ** attempt))
+        return max(delay, retry_after) if retry_after is not None else delay
+
+    def _count(self, model: str, outcome: str):
+        counts = self.models.setdefault(
+            model, {"attempts": 0, "successes": 0, "failures": 0, "cancelled": 0, "wins": 0}
+        )
+        counts[outcome] += 1
+
+    async def _post(self, payload: dict, user: str) -> dict:
+        client = await self._get_client()
+        cost = estimate_tokens(payload["messages"], payload["max_tokens"])
+        for attempt in range(GROQ_MAX_RETRIES + 1):
+            retry_after = None
+            # No point queueing for rate capacity when the call would be rejected anyway
+            self.breaker.fail_fast()
+            await self.scheduler.acquire(user, cost, budget(self.scheduler.max_wait))
+            async with self._sem:
+                self.in_flight += 1
+                started = time.monotonic()
+                try:
+                    with self.breaker.guard() as call, outbound_timeout(GROQ_TIMEOUT) as timeout:
+                        resp = await client.post(GROQ_API_URL, json=payload, timeout=timeout)
+                        self.scheduler.observe(resp)
+                        if resp.status_code not in _RETRY_STATUS:
+                            resp.raise_for_status()
+                            self.latency.add(time.monotonic() - started)
+                            data = resp.json()
+                            used = (data.get("usage") or {}).get("total_tokens")
+                            if isinstance(used, int):
+                                self.scheduler.settle(cost, used)
+                            return data
+                        if resp.status_code >= 500:
+                            call.fail()
+                        error: Exception = httpx.HTTPStatusError(
+                            f"Groq returned {resp.status_code}", request=resp.request, response=resp
+                        )
+                        retry_after = _retry_after(resp)
+                except httpx.TransportError as e:
+                    error = e
+                finally:
+                    self.in_flight -= 1
+            delay = self._backoff(attempt, retry_after)
+            if attempt == GROQ_MAX_RETRIES or (retry_after or 0) > GROQ_RETRY_AFTER_MAX or not can_afford(delay):
+                raise error
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    async def _complete(self, model: str, messages: List[Dict[str, str]], temperature: float, max_tokens: int,
+                        user: str, template: str) -> str:
+        payload = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": False,
+        }
+        self._count(model, "attempts")
+        try:
+            data = await self._post(payload, user)
+        except asyncio.CancelledError:
+            self._count(model, "cancelled")
+            raise
+        except Exception:
+            self._count(model, "failures")
+            raise
+        self._count(model, "successes")
+        choice = (data.get("choices") or [{}])[0]
+        content = (choice.get("message") or {}).get("content", "")
+        usage = data.get("usage")
+        llm_usage.record(
+            user, template,
+            usage or _estimated_usage(messages, content),
+            max_tokens,
+            truncated=choice.get("finish_reason") == "length",
+            estimated=not usage,
+        )
+        return content
+
+    def affordable(self) -> bool:
+        """Whether the request's deadline leaves room for a typical completion."""
+        median = self.latency.quantile(0.5) if len(self.latency) >= _HEDGE_MIN_SAMPLES else None
+        return can_afford(max(GROQ_MIN_BUDGET, median or 0.0))
+
+    def hedge_delay(self) -> float:
+        if len(self.latency) < _HEDGE_MIN_SAMPLES:
+            return GROQ_HEDGE_INITIAL_DELAY
+        return min(GROQ_TIMEOUT, max(GROQ_HEDGE_MIN_DELAY, self.latency.quantile(GROQ_HEDGE_QUANTILE)))
+
+    def _take_hedge(self) -> bool:
+        if self.scheduler.congested():
+            # A hedge would only queue behind the primary and eat rate capacity
+            self.hedges_rate_limited += 1
+            return False
+        if self._hedge_budget < 1:
+            self.hedges_over_budget += 1
+            return False
+        self._hedge_budget -= 1
+        return True
+
+    async def chat(self, messages: List[Dict[str, str]], temperature: float = 0.7,
+                   max_tokens: Optional[int] = None, user: str = "", template: str = "default") -> str:
+        """
+        Assistant content for one (possibly hedged) chat completion; raises if every
+        request failed. `user` is the fairness key for the rate scheduler and, with
+        `template`, the usage ledger key; max_tokens defaults to the template's
+        adaptive budget (see llm_usage).
+        """
+        llm_usage.check_quota(user)
+        if max_tokens is None:
+            max_tokens = llm_usage.max_tokens(template)
+        self.calls += 1
+        self._hedge_budget = min(_HEDGE_BURST, self._hedge_budget + GROQ_HEDGE_MAX_RATE)
+        tasks = {asyncio.ensure_future(self._complete(GROQ_MODEL, messages, temperature, max_tokens, user, template)): GROQ_MODEL}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay() if GROQ_HEDGE else None)
+            if not done and self._take_hedge():
+                self.hedges += 1
+                hedge = asyncio.ensure_future(self._complete(GROQ_HEDGE_MODEL, messages, temperature, max_tokens, user, template))
+                tasks[hedge] = GROQ_HEDGE_MODEL
+            pending = set(tasks)
+            error: Optional[Exception] = None
+            content = ""
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                    elif task.result().strip() or not content:
+                        content = task.result()
+                        if content.strip():
+                            # First valid answer wins
+                            self._count(tasks[task], "wins")
+                            if len(tasks) > 1 and next(iter(tasks)) is not task:
+                                self.hedge_wins += 1
+                            return content
+            if error is not None and not content:
+                raise error
+            return content
+        except Exception:
+            self.failures += 1
+            raise
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def stream_chat(self, messages: List[Dict[str, str]], temperature: float = 0.7,
+                          max_tokens: Optional[int] = None, user: str = "",
+                          template: str = "default") -> AsyncIterator[str]:
+        """
+        Content deltas of one streamed chat completion. Retries (as in chat()) only
+        happen before the first delta. Closing the generator early closes the
+        upstream response, which stops generation; use contextlib.aclosing so that
+        happens right away rather than at garbage collection. Usage is estimated
+        from the text received (the stream may be closed before Groq reports it).
+        """
+        llm_usage.check_quota(user)
+        if max_tokens is None:
+            max_tokens = llm_usage.max_tokens(template)
+        payload = {
+            "model": GROQ_MODEL,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True,
+        }
+        client = await self._get_client()
+        cost = estimate_tokens(messages, max_tokens)
+        self.calls += 1
+        try:
+            for attempt in range(GROQ_MAX_RETRIES + 1):
+                retry_after = None
+                self.breaker.fail_fast()
+                await self.scheduler.acquire(user, cost, budget(self.scheduler.max_wait))
+                async with self._sem:
+                    self.in_flight += 1
+                    try:
+                        # Time to response headers is what the breaker judges for streams
+                        with self.breaker.guard() as call, outbound_timeout(GROQ_TIMEOUT) as timeout:
+                            request = client.build_request("POST", GROQ_API_URL, json=payload, timeout=timeout)
+                            resp = await client.send(request, stream=True)
+                            self.scheduler.observe(resp)
+                            if resp.status_code >= 500:
+                                call.fail()
+                    except httpx.TransportError as e:
+                        error: Exception = e
+                    else:
+                        try:
+                            if resp.status_code in _RETRY_STATUS:
+                                error = httpx.HTTPStatusError(
+                                    f"Groq returned {resp.status_code}", request=request, response=resp
+                                )
+                                retry_after = _retry_after(resp)
+                            else:
+                                resp.raise_for_status()
+                                received: List[str] = []
+                                try:
+                                    async for line in resp.aiter_lines():
+                                        delta = _stream_delta(line)
+                                        if delta is None:
+                                            break
+                                        if delta:
+                                            received.append(delta)
+                                            try:
+                                                yield delta
+                                            except GeneratorExit:
+                                                self.streams_closed_early += 1
+                                                raise
+                                finally:
+                                    llm_usage.record(
+                                        user, template, _estimated_usage(messages, "".join(received)),
+                                        max_tokens, estimated=True,
+                                    )
+                                return
+                        finally:
+                            await resp.aclose()
+                    finally:
+                        self.in_flight -= 1
+                delay = self._backoff(attempt, retry_after)
+                if attempt == GROQ_MAX_RETRIES or (retry_after or 0) > GROQ_RETRY_AFTER_MAX or not can_afford(delay):
+                    raise error
+                self.retries += 1
+                await asyncio.sleep(delay)
+        except Exception:
+            self.failures += 1
+            raise
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled(),
+            "http2": _HTTP2,
+            "max_concurrency": GROQ_MAX_CONCURRENCY,
+            "in_flight": self.in_flight,
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "streams_closed_early": self.streams_closed_early,
+            "skipped_for_deadline": self.skipped_for_deadline,
+            "latency_p50": self.latency.quantile(0.5),
+            "latency_p90": self.latency.quantile(0.9),
+            "hedge_delay": self.hedge_delay() if GROQ_HEDGE else None,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedges_over_budget": self.hedges_over_budget,
+            "hedges_rate_limited": self.hedges_rate_limited,
+            "models": self.models,
+            "rate": self.scheduler.stats(),
+            "breaker": self.breaker.stats(),
+        }
+
+
+def _messages(prompt: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt},
+    ]
+
+
+async def _call_groq(prompt: str, user: str = "", template: str = "default") -> str:
     """
     Calls Groq API with strict system instructions for first-person statements.
     Returns the assistant response as a string.
     """
-    if not GROQ_API_KEY:
+    if not groq_client.enabled():
         print("Groq API key not set. Using fallback statements.")
         return ""
-
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json",
-    }
-
-    payload = {
-        "model": GROQ_MODEL,
-        "messages": [
-            {
-                "role": "system",
-                "content": (
-                    "You are a helpful assistant. "
-                    "Generate ONLY first-person statements suitable for 'Agree' or 'Disagree'. "
-                    "Do NOT output questions. "
-                    "Output one statement per line, no numbering, no bullets, no commentary."
-                )
-            },
-            {"role": "user", "content": prompt},
-        ],
-        "temperature": 0.7,
-        "max_tokens": 600,
-        "stream": False,
-    }
+    if not groq_client.affordable():
+        # Not enough of the request's deadline left; answer with the fallbacks now
+        groq_client.skipped_for_deadline += 1
+        return ""
 
     try:
-        resp = requests.post(GROQ_API_URL, headers=headers, json=payload, timeout=15)
-        resp.raise_for_status()
-        data = resp.json()
-        return data.get("choices", [{}])[0].get("message", {}).get("content", "")
+        return await groq_client.chat(_messages(prompt), user=user, template=template)
+    except LLMQuotaExceeded:
+        raise
+    except GroqRateLimited as e:
+        print(f"Groq rate limit reached, using fallback statements: {e}")
+        return ""
+    except (CircuitOpen, DeadlineExceeded):
+        # Expected fast-fail paths; one log line per call would flood
+        return ""
     except Exception as e:
         print(f"Groq API call failed: {e}")
         return ""
 
 
-def generate_questions_with_prompt(prompt: str) -> List[str]:
+async def stream_lines(prompt: str, user: str = "", template: str = "default") -> AsyncIterator[str]:
+    """
+    Stripped, non-empty lines of a streamed completion for `prompt`, each yielded
+    as soon as its newline arrives. Yields nothing without an API key or when the
+    request's deadline leaves no room for a completion; errors propagate. Close it early (aclosing) to stop the generation upstream.
+    """
+    if not groq_client.enabled():
+        print("Groq API key not set. Using fallback statements.")
+        return
+    if not groq_client.affordable():
+        groq_client.skipped_for_deadline += 1
+        return
+    buf = ""
+    async with aclosing(groq_client.stream_chat(_messages(prompt), user=user, template=template)) as deltas:
+        async for delta in deltas:
+            buf += delta
+            *lines, buf = buf.split("\n")
+            for ln in lines:
+                if ln.strip():
+                    yield ln.strip()
+    if buf.strip():
+        yield buf.strip()
+
+
+async def generate_questions_with_prompt(prompt: str, user: str = "", template: str = "default") -> List[str]:
     """
     Generate 10–15 first-person statements using a fully custom prompt.
     Cleans and deduplicates lines; falls back to FALLBACK_QUESTIONS on empty.
     """
-    content = _call_groq(prompt)
+    content = await _call_groq(prompt, user, template)
     if not content:
         return FALLBACK_QUESTIONS.copy()
 
@@ -80,7 +700,7 @@ def generate_questions_with_prompt(prompt: str) -> List[str]:
             cleaned.append(ln)
     return cleaned if cleaned else FALLBACK_QUESTIONS.copy()
 
-def generate_questions_from_themes(themes: List[str]) -> List[str]:
+async def generate_questions_from_themes(themes: List[str], user: str = "") -> List[str]:
     """
     Generate 10–15 personalized first-person statements based on themes.
     Falls back to static statements if Groq fails.
@@ -97,7 +717,7 @@ def generate_questions_from_themes(themes: List[str]) -> List[str]:
         "Output one statement per line, no numbering, no bullets, no commentary."
     )
 
-    content = _call_groq(prompt)
+    content = await _call_groq(prompt, user, "themes")
     if not content:
         print("Groq returned empty response. Using fallback statements.")
         return FALLBACK_QUESTIONS.copy()
@@ -115,3 +735,7 @@ def generate_questions_from_themes(themes: List[str]) -> List[str]:
             cleaned.append(ln)
 
     return cleaned if cleaned else FALLBACK_QUESTIONS.copy()
+
+
+# Global instance
+groq_client = GroqClient()
@@ -1,10 +1,26 @@
 import json
 import os
-from typing import List, Union, Dict, Tuple
+from contextlib import aclosing
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Union
 from app.services.groq_service import (
+    FALLBACK_QUESTIONS,
     generate_questions_from_themes,
     generate_questions_with_prompt,
+    stream_lines,
 )
+from app.services.llm_usage import LLMQuotaExceeded
+from app.services.question_cache import question_cache, question_key
+from app.services.single_flight import SingleFlight
+
+# Part of the cache key: bump whenever the prompts or the line post-processing
+# change, so sets generated by the old template are not served again
+PROMPT_VERSION = "1"
+
+AXES = ["EI", "SN", "TF", "JP"]
+PER_AXIS = 4
+
+# Identical concurrent requests (double submits, several tabs) share one generation
+question_flights = SingleFlight("questions")
 
 
 def load_chatgpt_history_from_file(path: str) -> List[Dict[str, str]]:
@@ -164,113 +180,201 @@ def _build_enriched_prompt(themes: List[str], user_context: str, axes: Dict[str,
     return prompt
 
 
-def generate_questions(chat_history: List[Union[dict, str]]) -> List[Dict]:
+def _parse_tagged(line: str) -> Tuple[Optional[str], str]:
+    """Split "[EI] statement" into ("EI", "statement."); the tag is None when missing."""
+    stripped = line.strip()
+    tag = stripped[1:3] if len(stripped) >= 4 and stripped[0] == "[" and stripped[3] == "]" else None
+    if tag not in AXES:
+        return None, stripped
+    text = stripped[4:].strip()
+    if text and not text.endswith("."):
+        text += "."
+    return tag, text
+
+
+def _fill_for_axis(axis: str, need: int, user_ctx: str) -> List[str]:
+    """Simple scenario-aware fillers for an axis the model left short."""
+    fillers = []
+    lowctx = user_ctx.lower()
+    has_trip = any(k in lowctx for k in ["trip", "travel", "friends", "bali", "lombok", "nusa penida"])
+    if axis == "EI":
+        if has_trip: fillers += [
+            "On a trip with friends, I feel energized by making plans together and leading the vibe.",
+            "When traveling with a group, I naturally start conversations and bring people together.",
+        ]
+        fillers += [
+            "I recharge best by spending time alone after a busy social day.",
+            "I prefer a quiet evening to reset rather than going out again.",
+        ]
+    elif axis == "SN":
+        if has_trip: fillers += [
+            "While planning a getaway, I look for concrete details like routes, budgets, and checklists.",
+            "When choosing destinations, I focus on the big-picture vibe and unique stories of the place.",
+        ]
+        fillers += [
+            "I am drawn to practical steps and proven methods before experimenting.",
+            "I get excited by patterns and possibilities more than step-by-step instructions.",
+        ]
+    elif axis == "TF":
+        if has_trip: fillers += [
+            "If plans change during a trip, I decide based on efficiency and trade-offs.",
+            "In group decisions, I weigh how people will feel before making a call.",
+        ]
+        fillers += [
+            "I justify choices with metrics and logic even in everyday situations.",
+            "I prioritize harmony and values when outcomes affect people I care about.",
+        ]
+    elif axis == "JP":
+        if has_trip: fillers += [
+            "For travel, I like having an itinerary and sticking to a schedule.",
+            "I prefer leaving space for spontaneous detours when exploring a new place.",
+        ]
+        fillers += [
+            "I feel calm when I have clear plans and deadlines for the week.",
+            "I like to stay flexible and adapt plans as new opportunities appear.",
+        ]
+    # Dedup and trim
+    seen = set()
+    out = []
+    for s in fillers:
+        if s not in seen:
+            seen.add(s)
+            out.append(s if s.endswith('.') else s + ".")
+        if len(out) >= need:
+            break
+    return out
+
+
+async def generate_questions(chat_history: List[Union[dict, str]], user_id: str = "") -> List[Dict]:
     """
     Generate personalized first-person statements for Agree/Disagree answers
     prioritizing MBTI-discriminative, situation-based items grounded in the user's history.
+    Results are cached by the normalized model inputs (see question_cache), and
+    concurrent calls by the same user with the same inputs share one generation.
     """
-    questions: List[Dict] = []
+    themes = extract_themes(chat_history)
+    axes = extract_mbti_axis_signals(chat_history)
+    user_ctx = _summarize_user_context(chat_history)
+    key = question_key(PROMPT_VERSION, user_ctx, themes, axes)
+    cached = await question_cache.get(key)
+    if cached is not None:
+        return cached
 
-    # 1) Enriched MBTI-focused generation path
+    async def generate_and_store() -> List[Dict]:
+        questions, from_model = await _generate(themes, axes, user_ctx, user_id)
+        # Fallback sets are not cached, so a Groq outage does not outlive itself
+        if from_model:
+            await question_cache.put(key, questions)
+        return questions
+
+    # Per user: the shared call runs under the first caller's deadline, quota and billing
+    questions = await question_flights.do(f"{user_id}:{key}", generate_and_store)
+    # Waiters share one result; hand each its own copy
+    return [dict(q) for q in questions]
+
+
+def _question(text: str) -> Dict:
+    return {"question": text, "options": ["Agree", "Disagree"]}
+
+
+async def stream_questions(chat_history: List[Union[dict, str]], user_id: str = "") -> AsyncIterator[Dict]:
+    """
+    Streaming variant of generate_questions. Each tagged statement is yielded
+    (with its "axis") as soon as the model finishes its line, and the completion
+    is closed once every axis has 4. Cache hits and the theme/static fallbacks
+    have no live model output and yield their whole set at once.
+    """
     themes = extract_themes(chat_history)
     axes = extract_mbti_axis_signals(chat_history)
     user_ctx = _summarize_user_context(chat_history)
+    key = question_key(PROMPT_VERSION, user_ctx, themes, axes)
+    cached = await question_cache.get(key)
+    if cached is None and not user_ctx:
+        cached = await generate_questions(chat_history, user_id)
+    if cached is not None:
+        for q in cached:
+            yield q
+        return
+
+    buckets: Dict[str, List[str]] = {axis: [] for axis in AXES}
+    from_model = False
+    try:
+        async with aclosing(stream_lines(_build_enriched_prompt(themes, user_ctx, axes), user_id, "mbti")) as lines:
+            async for ln in lines:
+                from_model = True
+                tag, text = _parse_tagged(ln)
+                if tag is None or not text or len(buckets[tag]) >= PER_AXIS:
+                    continue
+                buckets[tag].append(text)
+                yield {"axis": tag, **_question(text)}
+                if all(len(b) >= PER_AXIS for b in buckets.values()):
+                    # Leaving the block closes the upstream stream: no tokens past the 16th line
+                    break
+    except LLMQuotaExceeded:
+        raise
+    except Exception as e:
+        print(f"Groq stream failed: {e}")
+
+    fillers = {
+        axis: _fill_for_axis(axis, PER_AXIS - len(b), user_ctx) if len(b) < PER_AXIS else []
+        for axis, b in buckets.items()
+    }
+    if not from_model and sum(map(len, fillers.values())) < PER_AXIS * len(AXES):
+        # Same as generate_questions: without model output and enough fillers, use the theme/static sets
+        questions, _ = await _generate(themes, axes, "", user_id)
+        for q in questions:
+            yield q
+        return
+    for axis in AXES:
+        for text in fillers[axis]:
+            buckets[axis].append(text)
+            yield {"axis": axis, **_question(text)}
+    final_lines = [text for axis in AXES for text in buckets[axis]]
+    if from_model and len(final_lines) == PER_AXIS * len(AXES):
+        await question_cache.put(key, [_question(text) for text in final_lines])
+
+
+async def _generate(themes: List[str], axes: Dict[str, List[str]], user_ctx: str,
+                    user_id: str = "") -> Tuple[List[Dict], bool]:
+    """The question set, and whether it came from the model rather than a fallback."""
+    questions: List[Dict] = []
+    from_model = False
+
+    # 1) Enriched MBTI-focused generation path
     if user_ctx:
         prompt = _build_enriched_prompt(themes, user_ctx, axes)
-        enriched_lines = generate_questions_with_prompt(prompt)
+        enriched_lines = await generate_questions_with_prompt(prompt, user_id, "mbti")
 
         # Parse axis tags and enforce exactly 4 statements per axis
-        buckets = {"EI": [], "SN": [], "TF": [], "JP": []}
+        buckets: Dict[str, List[str]] = {axis: [] for axis in AXES}
         for ln in enriched_lines or []:
-            stripped = ln.strip()
-            tag = None
-            if stripped.startswith("[EI]"):
-                tag = "EI"; text = stripped[4:].strip()
-            elif stripped.startswith("[SN]"):
-                tag = "SN"; text = stripped[4:].strip()
-            elif stripped.startswith("[TF]"):
-                tag = "TF"; text = stripped[4:].strip()
-            elif stripped.startswith("[JP]"):
-                tag = "JP"; text = stripped[4:].strip()
-            else:
-                # No tag: try to infer later; keep as uncategorized
-                tag = None; text = stripped
-            if tag in buckets and text:
-                if text.endswith('.'):
-                    buckets[tag].append(text)
-                else:
-                    buckets[tag].append(text + ".")
-
-        # Simple scenario-aware fillers if needed
-        def fill_for_axis(axis: str, need: int):
-            fillers = []
-            lowctx = user_ctx.lower()
-            has_trip = any(k in lowctx for k in ["trip", "travel", "friends", "bali", "lombok", "nusa penida"])
-            if axis == "EI":
-                if has_trip: fillers += [
-                    "On a trip with friends, I feel energized by making plans together and leading the vibe.",
-                    "When traveling with a group, I naturally start conversations and bring people together.",
-                ]
-                fillers += [
-                    "I recharge best by spending time alone after a busy social day.",
-                    "I prefer a quiet evening to reset rather than going out again.",
-                ]
-            elif axis == "SN":
-                if has_trip: fillers += [
-                    "While planning a getaway, I look for concrete details like routes, budgets, and checklists.",
-                    "When choosing destinations, I focus on the big-picture vibe and unique stories of the place.",
-                ]
-                fillers += [
-                    "I am drawn to practical steps and proven methods before experimenting.",
-                    "I get excited by patterns and possibilities more than step-by-step instructions.",
-                ]
-            elif axis == "TF":
-                if has_trip: fillers += [
-                    "If plans change during a trip, I decide based on efficiency and trade-offs.",
-                    "In group decisions, I weigh how people will feel before making a call.",
-                ]
-                fillers += [
-                    "I justify choices with metrics and logic even in everyday situations.",
-                    "I prioritize harmony and values when outcomes affect people I care about.",
-                ]
-            elif axis == "JP":
-                if has_trip: fillers += [
-                    "For travel, I like having an itinerary and sticking to a schedule.",
-                    "I prefer leaving space for spontaneous detours when exploring a new place.",
-                ]
-                fillers += [
-                    "I feel calm when I have clear plans and deadlines for the week.",
-                    "I like to stay flexible and adapt plans as new opportunities appear.",
-                ]
-            # Dedup and trim
-            seen = set()
-            out = []
-            for s in fillers:
-                if s not in seen:
-                    seen.add(s)
-                    out.append(s if s.endswith('.') else s + ".")
-                if len(out) >= need:
-                    break
-            return out
+            tag, text = _parse_tagged(ln)
+            # No tag: uncategorized, dropped
+            if tag is not None and text:
+                buckets[tag].append(text)
 
         # Ensure exactly 4 per axis (total 16). Fill deficits up to 4 with scenario-aware lines.
         final_lines: List[str] = []
-        for axis_key in ["EI", "SN", "TF", "JP"]:
-            items = buckets[axis_key][:4]
-            if len(items) < 4:
-                items += fill_for_axis(axis_key, 4 - len(items))
-            items = items[:4]
+        for axis_key in AXES:
+            items = buckets[axis_key][:PER_AXIS]
+            if len(items) < PER_AXIS:
+                items += _fill_for_axis(axis_key, PER_AXIS - len(items), user_ctx)
+            items = items[:PER_AXIS]
             final_lines.extend(items)
 
         # Use enriched result unconditionally (exactly 16, possibly with fillers)
-        if sum(1 for s in final_lines if s) == 16:
+        if sum(1 for s in final_lines if s) == PER_AXIS * len(AXES):
             questions = [{"question": s, "options": ["Agree", "Disagree"]} for s in final_lines]
+            # Only a set with at least one tagged model line is model output; all-filler sets are not
+            from_model = any(buckets.values())
 
     # 2) Fallback: simple themes-based generation
     if not questions and themes:
-        raw_statements = generate_questions_from_themes(themes)
+        raw_statements = await generate_questions_from_themes(themes, user_id)
         for stmt in raw_statements:
             questions.append({"question": stmt, "options": ["Agree", "Disagree"]})
+        # The fallback list is returned as-is on failure; any other line came from the model
+        from_model = any(stmt not in FALLBACK_QUESTIONS for stmt in raw_statements)
 
     # 3) Fallback: static bank
     if not questions:
@@ -317,4 +421,4 @@ def generate_questions(chat_history: List[Union[dict, str]]) -> List[Dict]:
                 {"question": "I can take a small next step toward a goal right now.", "options": ["Agree", "Disagree"]},
             ]
 
-    return questions
+    return questions, from_model
@@ -0,0 +1,227 @@
+import asyncio
+import json
+import math
+import os
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from app.services.blocklist_store import SB_SLOW_CALL, SB_TIMEOUT, blocklist_store
+from app.services.circuit_breaker import CircuitBreaker
+
+# --- Config ---
+LLM_USAGE_FLUSH_INTERVAL = float(os.getenv("LLM_USAGE_FLUSH_INTERVAL", "60"))
+# Append-only JSONL of flushed usage deltas; empty disables the file sink
+LLM_USAGE_PATH = os.getenv("LLM_USAGE_PATH", "").strip()
+# Supabase table for flushed deltas (see database/schema.sql); empty disables it
+LLM_USAGE_TABLE = os.getenv("LLM_USAGE_TABLE", "").strip()
+# Days of aggregates kept in memory for /admin/llm-usage
+LLM_USAGE_DAYS = int(os.getenv("LLM_USAGE_DAYS", "7"))
+# Tokens per user per UTC day, per worker; 0 disables the quota
+LLM_DAILY_TOKEN_QUOTA = int(os.getenv("LLM_DAILY_TOKEN_QUOTA", "0"))
+# Bounds for adaptive max_tokens; the ceiling is also the value used until enough samples exist
+LLM_MAX_TOKENS_CEILING = int(os.getenv("LLM_MAX_TOKENS_CEILING", "600"))
+LLM_MAX_TOKENS_FLOOR = int(os.getenv("LLM_MAX_TOKENS_FLOOR", "128"))
+_OUTPUT_WINDOW = 200
+_OUTPUT_MIN_SAMPLES = 20
+# max_tokens = observed p99 output length times this headroom
+_OUTPUT_HEADROOM = 1.25
+
+_COUNTERS = ("calls", "prompt_tokens", "completion_tokens", "total_tokens", "truncated", "estimated")
+
+# Which API surface a call is made for; routes set it, background work inherits it
+llm_endpoint: ContextVar[str] = ContextVar("llm_endpoint", default="other")
+
+
+class LLMQuotaExceeded(Exception):
+    """The user has used up LLM_DAILY_TOKEN_QUOTA for today."""
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+class SupabaseUsageWriter:
+    """
+    Inserts flushed usage rows into LLM_USAGE_TABLE. Shares the Supabase
+    connection pool with the blocklist store but has its own circuit breaker,
+    so a blocklist outage and usage accounting do not trip each other.
+    """
+
+    def __init__(self, table: str = LLM_USAGE_TABLE):
+        self.table = table
+        self.breaker = CircuitBreaker("supabase_usage", SB_SLOW_CALL)
+
+    def enabled(self) -> bool:
+        return bool(self.table) and blocklist_store.enabled()
+
+    async def insert(self, rows: List[dict]):
+        if not rows:
+            return
+        client = await blocklist_store.client()
+        with self.breaker.guard():
+            resp = await client.post(f"/{self.table}", json=rows, headers={"Prefer": "return=minimal"}, timeout=SB_TIMEOUT)
+            resp.raise_for_status()
+
+
+class LLMUsageLedger:
+    """
+    In-process ledger of LLM token usage per (UTC day, user, endpoint, template).
+
+    Each response's `usage` block is added to running totals and to one pending
+    delta per sink, flushed every LLM_USAGE_FLUSH_INTERVAL seconds to a JSONL file
+    and/or a Supabase table. A sink that fails keeps only its own delta for the
+    next flush, so the other one never receives a row twice. The completion lengths seen per template drive the
+    max_tokens requested next time. Totals and quotas cover this worker only.
+    """
+
+    def __init__(self, path: str = LLM_USAGE_PATH, table: str = LLM_USAGE_TABLE):
+        self.path = path
+        self.table = table
+        self.writer = SupabaseUsageWriter(table)
+        self._totals: Dict[Tuple[str, str, str, str], Dict[str, int]] = {}
+        # sink -> rows not yet written to it
+        self._pending: Dict[str, Dict[Tuple[str, str, str, str], Dict[str, int]]] = {s: {} for s in self.sinks()}
+        self._user_day: Dict[Tuple[str, str], int] = {}
+        self._outputs: Dict[str, "deque[int]"] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.flush_errors = 0
+        self.quota_rejections = 0
+
+    def sinks(self) -> List[str]:
+        return [s for s, on in (("file", bool(self.path)), ("supabase", bool(self.table))) if on]
+
+    # ---------- recording ----------
+    def record(self, user: str, template: str, usage: dict, max_tokens: int,
+               truncated: bool = False, estimated: bool = False):
+        day = _today()
+        prompt = int(usage.get("prompt_tokens") or 0)
+        completion = int(usage.get("completion_tokens") or 0)
+        total = int(usage.get("total_tokens") or prompt + completion)
+        key = (day, user, llm_endpoint.get(), template)
+        delta = {
+            "calls": 1,
+            "prompt_tokens": prompt,
+            "completion_tokens": completion,
+            "total_tokens": total,
+            "truncated": int(truncated),
+            "estimated": int(estimated),
+        }
+        for table in (self._totals, *self._pending.values()):
+            row = table.setdefault(key, dict.fromkeys(_COUNTERS, 0))
+            for k, v in delta.items():
+                row[k] += v
+        self._user_day[(day, user)] = self._user_day.get((day, user), 0) + total
+        if not estimated:
+            # A truncated answer wanted more than it got; count it as needing the whole budget again
+            self._outputs.setdefault(template, deque(maxlen=_OUTPUT_WINDOW)).append(
+                max(completion, math.ceil(max_tokens * _OUTPUT_HEADROOM)) if truncated else completion
+            )
+
+    def check_quota(self, user: str):
+        if LLM_DAILY_TOKEN_QUOTA <= 0 or not user:
+            return
+        if self._user_day.get((_today(), user), 0) >= LLM_DAILY_TOKEN_QUOTA:
+            self.quota_rejections += 1
+            raise LLMQuotaExceeded(f"daily LLM token quota of {LLM_DAILY_TOKEN_QUOTA} reached")
+
+    def max_tokens(self, template: str) -> int:
+        """Completion budget for `template`: observed p99 output length plus headroom, within bounds."""
+        outputs = self._outputs.get(template)
+        if not outputs or len(outputs) < _OUTPUT_MIN_SAMPLES:
+            return LLM_MAX_TOKENS_CEILING
+        ordered = sorted(outputs)
+        p99 = ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))]
+        return max(LLM_MAX_TOKENS_FLOOR, min(LLM_MAX_TOKENS_CEILING, math.ceil(p99 * _OUTPUT_HEADROOM)))
+
+    # ---------- reporting ----------
+    def report(self, day: Optional[str] = None, group_by: str = "user") -> dict:
+        """Totals for one day (default today) grouped by user, endpoint or template."""
+        day = day or _today()
+        index = {"user": 1, "endpoint": 2, "template": 3}[group_by]
+        groups: Dict[str, Dict[str, int]] = {}
+        for key, row in self._totals.items():
+            if key[0] != day:
+                continue
+            group = groups.setdefault(key[index], dict.fromkeys(_COUNTERS, 0))
+            for k, v in row.items():
+                group[k] += v
+        return {
+            "day": day,
+            "group_by": group_by,
+            "groups": groups,
+            "max_tokens": {t: self.max_tokens(t) for t in sorted(self._outputs)},
+            "daily_quota": LLM_DAILY_TOKEN_QUOTA or None,
+        }
+
+    # ---------- flushing ----------
+    def _write(self, rows: List[dict]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+
+    async def _flush_sink(self, sink: str, rows: List[dict]):
+        if sink == "file":
+            await asyncio.to_thread(self._write, rows)
+        elif self.writer.enabled():
+            await self.writer.insert(rows)
+
+    async def flush(self):
+        at = datetime.now(timezone.utc).isoformat()
+        for sink in list(self._pending):
+            pending, self._pending[sink] = self._pending[sink], {}
+            if not pending:
+                continue
+            rows = [
+                {"day": day, "user_id": user, "endpoint": endpoint, "template": template, "flushed_at": at, **row}
+                for (day, user, endpoint, template), row in pending.items()
+            ]
+            try:
+                await self._flush_sink(sink, rows)
+                self.flushes += 1
+            except Exception as e:
+                self.flush_errors += 1
+                print(f"LLM usage flush to {sink} failed, keeping {len(rows)} rows for the next one: {e}")
+                for key, row in pending.items():
+                    merged = self._pending[sink].setdefault(key, dict.fromkeys(_COUNTERS, 0))
+                    for k, v in row.items():
+                        merged[k] += v
+        self._prune()
+
+    def _prune(self):
+        oldest = (datetime.now(timezone.utc) - timedelta(days=LLM_USAGE_DAYS)).strftime("%Y-%m-%d")
+        self._totals = {k: v for k, v in self._totals.items() if k[0] >= oldest}
+        self._user_day = {k: v for k, v in self._user_day.items() if k[0] >= oldest}
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(LLM_USAGE_FLUSH_INTERVAL)
+            await self.flush()
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "sinks": self.sinks(),
+            "pending_rows": {sink: len(pending) for sink, pending in self._pending.items()},
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "quota_rejections": self.quota_rejections,
+        }
+
+
+# Global instance
+llm_usage = LLMUsageLedger()
@@ -0,0 +1,158 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# --- Config ---
+QUESTION_CACHE_SIZE = int(os.getenv("QUESTION_CACHE_SIZE", "1024"))
+QUESTION_CACHE_TTL = float(os.getenv("QUESTION_CACHE_TTL", "86400"))
+# Empty disables the disk tier
+QUESTION_CACHE_DIR = os.getenv("QUESTION_CACHE_DIR", "").strip()
+
+
+def question_key(version: str, user_context: str, themes: List[str], axes: Dict[str, List[str]]) -> str:
+    """Content hash of everything that reaches the model, plus the prompt template version."""
+    raw = json.dumps(
+        {
+            "v": version,
+            "ctx": user_context,
+            "themes": sorted(themes),
+            "axes": {k: axes[k] for k in sorted(axes)},
+        },
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+class QuestionCache:
+    """
+    Content-addressed cache of generated question sets.
+
+    A memory LRU answers repeats within one worker; the optional disk tier (one
+    JSON file per key) is shared by every worker on a host and survives restarts.
+    Both tiers expire entries after QUESTION_CACHE_TTL. Memory is only touched
+    from the event loop; disk reads and writes run in a thread.
+    """
+
+    def __init__(self, max_entries: int = QUESTION_CACHE_SIZE, ttl: float = QUESTION_CACHE_TTL,
+                 directory: str = QUESTION_CACHE_DIR):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.directory = directory
+        # key -> (wall-clock expiry, questions)
+        self._entries: "OrderedDict[str, Tuple[float, List[Dict]]]" = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    # ---------- disk tier ----------
+    def _read(self, key: str) -> Optional[Tuple[float, List[Dict]]]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            expires_at = float(data["expires_at"])
+            questions = data["questions"]
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Question cache entry {key} unreadable: {e}")
+            return None
+        if expires_at <= time.time():
+            return None
+        return expires_at, questions
+
+    def _write(self, key: str, expires_at: float, questions: List[Dict]):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"expires_at": expires_at, "questions": questions}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def prune(self) -> int:
+        """Delete expired disk entries; returns how many were removed."""
+        if not self.directory or not os.path.isdir(self.directory):
+            return 0
+        removed = 0
+        now = time.time()
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    # mtime is the write time; entries never outlive it by more than the TTL
+                    if os.path.getmtime(path) + self.ttl <= now:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    pass
+        return removed
+
+    async def start(self):
+        if self.directory:
+            try:
+                removed = await asyncio.to_thread(self.prune)
+                if removed:
+                    print(f"Question cache pruned {removed} expired entries")
+            except Exception as e:
+                print(f"Question cache prune failed ({self.directory}): {e}")
+
+    # ---------- lookups ----------
+    def _remember(self, key: str, expires_at: float, questions: List[Dict]):
+        self._entries[key] = (expires_at, questions)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[List[Dict]]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.time():
+            self._entries.move_to_end(key)
+            self.memory_hits += 1
+            return [dict(q) for q in entry[1]]
+        if entry is not None:
+            del self._entries[key]
+        if self.directory:
+            entry = await asyncio.to_thread(self._read, key)
+            if entry is not None:
+                self._remember(key, *entry)
+                self.disk_hits += 1
+                return [dict(q) for q in entry[1]]
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, questions: List[Dict]):
+        expires_at = time.time() + self.ttl
+        questions = [dict(q) for q in questions]
+        self._remember(key, expires_at, questions)
+        self.stores += 1
+        if self.directory:
+            try:
+                await asyncio.to_thread(self._write, key, expires_at, questions)
+            except Exception as e:
+                print(f"Question cache write failed ({self.directory}): {e}")
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "disk": bool(self.directory),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Global instance
+question_cache = QuestionCache()
@@ -0,0 +1,343 @@
+import asyncio
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Union
+from app.services.history_service import generate_questions
+from app.services.llm_usage import llm_endpoint
+
+# --- Config ---
+JOBS_WORKERS = int(os.getenv("QUESTION_JOBS_WORKERS", "4"))
+JOBS_QUEUE_MAX = int(os.getenv("QUESTION_JOBS_QUEUE_MAX", "1000"))
+# Finished jobs are kept this long for GET /history/jobs/{id}
+JOBS_TTL = float(os.getenv("QUESTION_JOBS_TTL", "3600"))
+# SQLite file for jobs (survives restarts, shared by the workers of one host); empty keeps
+# them in memory, where a poll only finds jobs created on the worker that answers it
+JOBS_DB_PATH = os.getenv("QUESTION_JOBS_DB", os.path.join(os.getcwd(), ".question-jobs.db")).strip()
+JOBS_PRUNE_INTERVAL = 60.0
+# Bound for the in-memory store, on top of the TTL
+_MEMORY_MAX_JOBS = 10000
+
+PRIORITY_MIN, PRIORITY_MAX, PRIORITY_DEFAULT = 0, 9, 5
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+FINISHED = (DONE, FAILED)
+
+
+class QuestionJob:
+    """One background question generation; `history` is dropped once it finishes."""
+
+    __slots__ = ("id", "user_id", "priority", "status", "history", "questions", "error",
+                 "created_at", "started_at", "finished_at", "owner")
+
+    def __init__(self, user_id: str, history: List[Union[dict, str]], priority: int = PRIORITY_DEFAULT):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.priority = priority
+        self.status = QUEUED
+        self.history: Optional[List[Union[dict, str]]] = history
+        self.questions: Optional[List[Dict]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        # pid of the process that queued it; only that process runs it
+        self.owner = os.getpid()
+
+    def info(self) -> dict:
+        return {
+            "job_id": self.id,
+            "user_id": self.user_id,
+            "status": self.status,
+            "priority": self.priority,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "questions": self.questions,
+            "error": self.error,
+        }
+
+
+# ---------- stores ----------
+class MemoryJobStore:
+    """Jobs of this worker only, LRU-bounded; lost on restart."""
+
+    blocking = False
+
+    def __init__(self, max_jobs: int = _MEMORY_MAX_JOBS):
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, QuestionJob]" = OrderedDict()
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def save(self, job: QuestionJob):
+        self._jobs[job.id] = job
+        self._jobs.move_to_end(job.id)
+        while len(self._jobs) > self.max_jobs:
+            self._jobs.popitem(last=False)
+
+    def load(self, job_id: str) -> Optional[QuestionJob]:
+        return self._jobs.get(job_id)
+
+    def unfinished(self) -> List[QuestionJob]:
+        return []
+
+    def prune(self, before: float) -> int:
+        stale = [j.id for j in self._jobs.values() if j.status in FINISHED and (j.finished_at or 0) < before]
+        for job_id in stale:
+            del self._jobs[job_id]
+        return len(stale)
+
+
+class SqliteJobStore:
+    """
+    Jobs in a SQLite file: they survive restarts and any worker on the host can
+    answer a poll. Blocking; the queue calls it off the event loop.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def open(self):
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS question_jobs ("
+            " id TEXT PRIMARY KEY, status TEXT NOT NULL, finished_at REAL, data TEXT NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS question_jobs_status ON question_jobs (status, finished_at)")
+        self._db = db
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def save(self, job: QuestionJob):
+        data = json.dumps({s: getattr(job, s) for s in QuestionJob.__slots__})
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO question_jobs (id, status, finished_at, data) VALUES (?, ?, ?, ?)",
+                (job.id, job.status, job.finished_at, data),
+            )
+            self._db.commit()
+
+    @staticmethod
+    def _job(data: str) -> QuestionJob:
+        job = QuestionJob.__new__(QuestionJob)
+        for k, v in json.loads(data).items():
+            setattr(job, k, v)
+        return job
+
+    def load(self, job_id: str) -> Optional[QuestionJob]:
+        with self._lock:
+            row = self._db.execute("SELECT data FROM question_jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job(row[0]) if row else None
+
+    def unfinished(self) -> List[QuestionJob]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT data FROM question_jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+            ).fetchall()
+        return [self._job(row[0]) for row in rows]
+
+    def prune(self, before: float) -> int:
+        with self._lock:
+            cur = self._db.execute(
+                "DELETE FROM question_jobs WHERE status IN (?, ?) AND finished_at < ?", (DONE, FAILED, before)
+            )
+            self._db.commit()
+        return cur.rowcount
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class QuestionJobQueue:
+    """
+    Background question generation.
+
+    Jobs wait in a bounded priority queue (higher priority first, FIFO within a
+    priority) and are run by a fixed pool of worker tasks through
+    generate_questions, so they share its cache and in-flight coalescing.
+    Every state change is written to the store; finished jobs are pruned after
+    JOBS_TTL. With the SQLite store, jobs left queued or running by a process that
+    no longer exists are picked up again at startup.
+    """
+
+    def __init__(self, store: Union[MemoryJobStore, SqliteJobStore], workers: int = JOBS_WORKERS,
+                 max_queued: int = JOBS_QUEUE_MAX):
+        self.store = store
+        self.workers = workers
+        self._queue: "asyncio.PriorityQueue" = asyncio.PriorityQueue(maxsize=max_queued)
+        self._seq = itertools.count()
+        # Jobs queued or running in this process, and their completion events
+        self._active: Dict[str, QuestionJob] = {}
+        self._events: Dict[str, asyncio.Event] = {}
+        self._tasks: List[asyncio.Task] = []
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.recovered = 0
+
+    async def _store(self, method: str, *args):
+        fn = getattr(self.store, method)
+        return await asyncio.to_thread(fn, *args) if self.store.blocking else fn(*args)
+
+    def full(self) -> bool:
+        return self._queue.full()
+
+    def _enqueue(self, job: QuestionJob):
+        self._queue.put_nowait((-job.priority, next(self._seq), job.id))
+        self._active[job.id] = job
+        self._events[job.id] = asyncio.Event()
+
+    async def submit(self, user_id: str, history: List[Union[dict, str]], priority: int = PRIORITY_DEFAULT) -> QuestionJob:
+        """Queue a job; raises asyncio.QueueFull when the queue is at capacity."""
+        if self._queue.full():
+            self.rejected += 1
+            raise asyncio.QueueFull()
+        job = QuestionJob(user_id, history, max(PRIORITY_MIN, min(PRIORITY_MAX, priority)))
+        await self._store("save", job)
+        self._enqueue(job)
+        return job
+
+    async def get(self, job_id: str) -> Optional[QuestionJob]:
+        job = self._active.get(job_id)
+        if job is not None:
+            return job
+        return await self._store("load", job_id)
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[QuestionJob]:
+        """The job once finished, or its current state after `timeout` seconds."""
+        event = self._events.get(job_id)
+        if event is not None:
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        else:
+            # Queued by another worker (SQLite store): no event here, poll the store
+            job = await self.get(job_id)
+            if job is None or job.status in FINISHED:
+                return job
+            await asyncio.sleep(min(timeout, 1.0))
+        return await self.get(job_id)
+
+    # ---------- workers ----------
+    async def _run(self):
+        while True:
+            _, _, job_id = await self._queue.get()
+            job = self._active.get(job_id)
+            try:
+                if job is not None:
+                    await self._process(job)
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, job: QuestionJob):
+        llm_endpoint.set("history/jobs")
+        job.status = RUNNING
+        job.started_at = time.time()
+        await self._save(job)
+        try:
+            job.questions = await generate_questions(job.history or [], job.user_id)
+            job.status = DONE
+            self.completed += 1
+        except Exception as e:
+            job.error = f"Error generating questions: {e}"
+            job.status = FAILED
+            self.failed += 1
+        job.finished_at = time.time()
+        job.history = None
+        await self._save(job)
+        self._active.pop(job.id, None)
+        event = self._events.pop(job.id, None)
+        if event is not None:
+            event.set()
+
+    async def _save(self, job: QuestionJob):
+        try:
+            await self._store("save", job)
+        except Exception as e:
+            # The in-process copy is still answered from _active
+            print(f"Question job {job.id} not saved: {e}")
+
+    async def _prune(self):
+        while True:
+            await asyncio.sleep(JOBS_PRUNE_INTERVAL)
+            try:
+                await self._store("prune", time.time() - JOBS_TTL)
+            except Exception as e:
+                print(f"Question job prune failed: {e}")
+
+    # ---------- lifecycle ----------
+    async def start(self):
+        if self._tasks:
+            return
+        try:
+            await self._store("open")
+            for job in await self._store("unfinished"):
+                if self._queue.full():
+                    break
+                # Nothing runs here yet, so our own pid means a previous incarnation (e.g. pid 1 in a container)
+                if job.owner == os.getpid() or not _alive(job.owner):
+                    job.owner = os.getpid()
+                    job.status = QUEUED
+                    await self._store("save", job)
+                    self._enqueue(job)
+                    self.recovered += 1
+        except Exception as e:
+            print(f"Question job store unavailable ({getattr(self.store, 'path', 'memory')}): {e}")
+            self.store = MemoryJobStore()
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._prune()))
+
+    async def close(self):
+        # Queued jobs stay in a persistent store and are recovered by the next process
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        await self._store("close")
+
+    def stats(self) -> dict:
+        return {
+            "store": "sqlite" if self.store.blocking else "memory",
+            "workers": self.workers,
+            "queued": self._queue.qsize(),
+            "max_queued": self._queue.maxsize,
+            "active": len(self._active),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "recovered": self.recovered,
+        }
+
+
+# Global instance
+question_jobs = QuestionJobQueue(SqliteJobStore(JOBS_DB_PATH) if JOBS_DB_PATH else MemoryJobStore())
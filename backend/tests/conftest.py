@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# Tests import the app package the same way uvicorn does (from backend/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Keep the local fallback store out of the working tree
+_tmp = tempfile.mkdtemp()
+os.environ.setdefault("BLOCKLIST_LOCAL_PATH", os.path.join(_tmp, "blocklist-local.db"))
+os.environ.setdefault("QUESTION_JOBS_DB", os.path.join(_tmp, "question-jobs.db"))
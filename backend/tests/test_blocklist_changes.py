@@ -0,0 +1,35 @@
+from app.services.blocklist_cache import CachedBlocklist
+from app.services.blocklist_changes import BlocklistChangeLog
+
+
+def _entry(values):
+    return CachedBlocklist("tok", values, "base", ttl=60)
+
+
+def test_cursor_from_another_worker_is_answered():
+    # Two workers observe the same states with their own versions and logs
+    a, b = BlocklistChangeLog(), BlocklistChangeLog()
+    a1, a2 = _entry(["x.com"]), _entry(["x.com", "y.com"])
+    b1, b2 = _entry(["x.com"]), _entry(["x.com", "y.com"])
+    a.record("tok", None, a1)
+    a.record("tok", a1, a2)
+    b.record("tok", None, b1)
+    b.record("tok", b1, b2)
+    assert a1.version != b1.version
+    changes = b.since("tok", a.cursor(a1), b2)
+    assert [(c["op"], c["domain"]) for c in changes] == [("add", "y.com")]
+    assert changes[0]["version"] == a.cursor(a2)
+    assert b.since("tok", a.cursor(a2), b2) == []
+
+
+def test_unknown_or_compacted_cursor_resyncs():
+    log = BlocklistChangeLog(max_ops=1)
+    e1, e2, e3 = _entry(["a.com"]), _entry(["a.com", "b.com"]), _entry(["a.com", "b.com", "c.com"])
+    log.record("tok", None, e1)
+    log.record("tok", e1, e2)
+    log.record("tok", e2, e3)
+    assert log.since("tok", log.cursor(e1), e3) is None
+    assert log.since("tok", log.cursor(e2), e3) == [
+        {"version": log.cursor(e3), "op": "add", "domain": "c.com"}
+    ]
+    assert log.since("tok", "stale.1", e3) is None
@@ -0,0 +1,75 @@
+import asyncio
+import json
+
+from app.services import blocklist_dnr
+from app.services.blocklist_cache import CachedBlocklist
+from app.services.blocklist_dnr import DNR_RULE_ID_BASE, RuleIdRegistry, dnr_diff, render_dnr_bytes
+
+
+def _registry(tmp_path, monkeypatch) -> RuleIdRegistry:
+    registry = RuleIdRegistry(str(tmp_path / "dnr.db"))
+    asyncio.run(registry.start())
+    monkeypatch.setattr(blocklist_dnr, "rule_ids", registry)
+    return registry
+
+
+def _entry(values):
+    return CachedBlocklist("tok", values, "base", ttl=60)
+
+
+def _ruleset(entry):
+    rules = json.loads(asyncio.run(render_dnr_bytes(entry)))
+    return {r["id"]: r["condition"]["requestDomains"][0] for r in rules}
+
+
+def test_rule_ids_are_stable_and_never_reused(tmp_path):
+    path = str(tmp_path / "dnr.db")
+    first = RuleIdRegistry(path)
+    asyncio.run(first.start())
+    assert first.assign("tok", ["a.com", "b.com"]) == {"a.com": 1, "b.com": 2}
+    # Another worker sharing the database sees the same IDs and allocates after them
+    second = RuleIdRegistry(path)
+    asyncio.run(second.start())
+    assert second.assign("tok", ["b.com", "c.com"]) == {"b.com": 2, "c.com": 3}
+    assert first.assign("tok", ["d.com", "a.com"]) == {"d.com": 4, "a.com": 1}
+    # IDs are per token
+    assert second.assign("other", ["a.com"]) == {"a.com": 1}
+
+
+def test_diff_turns_the_previous_ruleset_into_the_current_one(tmp_path, monkeypatch):
+    _registry(tmp_path, monkeypatch)
+    before = _entry(["example.com", "b.com"])
+    after = _entry(["a.example.com", "x.example.com", "b.com", "c.com"])
+    rules = _ruleset(before)
+    base = set(_ruleset(_entry([])).values())
+    assert sorted(set(rules.values()) - base) == ["b.com", "example.com"]
+
+    diff = asyncio.run(dnr_diff(after, [
+        {"op": "add", "domain": "a.example.com"},
+        {"op": "add", "domain": "x.example.com"},
+        {"op": "remove", "domain": "example.com"},
+        {"op": "add", "domain": "c.com"},
+    ]))
+
+    # Removing the parent re-adds rules for the subdomains it was covering
+    added = {r["id"]: r["condition"]["requestDomains"][0] for r in diff["addRules"]}
+    assert sorted(added.values()) == ["a.example.com", "c.com", "x.example.com"]
+    for rule_id in diff["removeRuleIds"]:
+        rules.pop(rule_id, None)
+    rules.update(added)
+    assert rules == _ruleset(after)
+    assert min(rules) > DNR_RULE_ID_BASE
+
+
+def test_readded_domain_gets_its_old_rule_id(tmp_path, monkeypatch):
+    _registry(tmp_path, monkeypatch)
+    old_id = {d: i for i, d in _ruleset(_entry(["a.com", "b.com"])).items()}["b.com"]
+    diff = asyncio.run(dnr_diff(_entry(["a.com", "b.com"]), [
+        {"op": "remove", "domain": "b.com"},
+        {"op": "add", "domain": "b.com"},
+    ]))
+    # The op pair cancels out against the client's list, so nothing changes
+    assert diff == {"addRules": [], "removeRuleIds": []}
+    diff = asyncio.run(dnr_diff(_entry(["a.com", "b.com"]), [{"op": "add", "domain": "b.com"}]))
+    assert [r["id"] for r in diff["addRules"]] == [old_id]
+    assert diff["removeRuleIds"] == [old_id]
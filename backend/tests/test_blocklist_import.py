@@ -0,0 +1,49 @@
+import asyncio
+
+from app.services.blocklist_cache import blocklist_cache
+from app.services.blocklist_import import import_domains
+from app.services.blocklist_service import (
+    add_custom, add_patterns, add_scheduled, get_blocklist, remove_custom, subscribe_categories,
+)
+from app.services.blocklist_schedule import parse_schedule
+from app.services.blocklist_categories import blocklist_categories
+
+
+def test_import_keeps_other_stored_values():
+    token = "import-keeps-values"
+    category = blocklist_categories.all()[0].name
+
+    async def body():
+        yield b"0.0.0.0 imported.example\n"
+
+    async def run():
+        await add_custom(token, ["cnn.com"])
+        await subscribe_categories(token, [category])
+        await add_patterns(token, ["*.reddit.com/r/all*"])
+        await add_scheduled(token, ["youtube.com"], parse_schedule("mo-fr 09:00-17:00", "Europe/Berlin"))
+        before = set((await get_blocklist(token)).stored())
+        await import_domains(token, body())
+        return before, set((await get_blocklist(token)).stored())
+
+    before, after = asyncio.run(run())
+    blocklist_cache.invalidate(token)
+    assert after == before | {"imported.example"}
+
+
+def test_import_keeps_writes_made_while_it_runs():
+    token = "import-concurrent-write"
+
+    async def body():
+        yield b"first.example\n"
+        # A DELETE handled while the upload is still streaming
+        await remove_custom(token, "cnn.com")
+        yield b"second.example\n"
+
+    async def run():
+        await add_custom(token, ["cnn.com"])
+        await import_domains(token, body())
+        return set((await get_blocklist(token)).domains)
+
+    after = asyncio.run(run())
+    blocklist_cache.invalidate(token)
+    assert after == {"first.example", "second.example"}
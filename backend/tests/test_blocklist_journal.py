@@ -0,0 +1,108 @@
+import asyncio
+import os
+
+from app.services import blocklist_journal as journal_module
+from app.services.blocklist_journal import WriteBehindJournal
+
+
+def test_in_flight_ops_stay_visible_until_acknowledged(tmp_path, monkeypatch):
+    calls = []
+
+    async def run():
+        written, release = asyncio.Event(), asyncio.Event()
+
+        async def upsert_rows(rows):
+            calls.append(rows)
+            written.set()
+            await release.wait()
+
+        async def remove_many(token, domains):
+            calls.append((token, domains))
+
+        monkeypatch.setattr(journal_module.blocklist_store, "upsert_rows", upsert_rows)
+        monkeypatch.setattr(journal_module.blocklist_store, "remove_many", remove_many)
+        journal = WriteBehindJournal()
+        journal.spool_dir = str(tmp_path)
+        journal._lock = asyncio.Lock()
+        await journal._rewrite_spool()
+        journal.record("tok", adds=["a.com"], removes=["old.com"])
+        flushing = asyncio.create_task(journal.flush())
+        await written.wait()
+        during = journal.overlay("tok", ["old.com", "x.com"])
+        # Recorded while the batch is in flight; must survive the spool rewrite
+        journal.record("tok", adds=["b.com"])
+        release.set()
+        await flushing
+        with open(journal._spool_path(), encoding="utf-8") as f:
+            spool = f.read()
+        return during, journal.overlay("tok", ["a.com", "x.com"]), spool
+
+    during, after, spool = asyncio.run(run())
+    assert during == {"a.com", "x.com"}
+    assert after == {"a.com", "b.com", "x.com"}
+    assert '"b.com"' in spool and '"a.com"' not in spool
+    assert calls[0] == [("tok", "a.com")] and calls[1] == ("tok", ["old.com"])
+
+
+def _journal(tmp_path, monkeypatch, upsert_rows) -> WriteBehindJournal:
+    async def remove_many(token, domains):
+        pass
+
+    monkeypatch.setattr(journal_module.blocklist_store, "upsert_rows", upsert_rows)
+    monkeypatch.setattr(journal_module.blocklist_store, "remove_many", remove_many)
+    journal = WriteBehindJournal()
+    journal.spool_dir = str(tmp_path)
+    journal.interval = 60.0
+    monkeypatch.setattr(journal, "enabled", lambda: True)
+    return journal
+
+
+def test_close_waits_for_a_running_flush(tmp_path, monkeypatch):
+    written = []
+
+    async def run():
+        started = asyncio.Event()
+
+        async def upsert_rows(rows):
+            started.set()
+            await asyncio.sleep(0.05)
+            written.extend(rows)
+
+        journal = _journal(tmp_path, monkeypatch, upsert_rows)
+        await journal.start()
+        journal.record("tok", adds=["a.com"])
+        journal._wake.set()
+        await started.wait()
+        await journal.close()
+        return journal
+
+    journal = asyncio.run(run())
+    assert written == [("tok", "a.com")]
+    assert not os.path.exists(journal._spool_path())
+
+
+def test_cancelled_flush_keeps_ops_in_the_spool(tmp_path, monkeypatch):
+    async def run():
+        started = asyncio.Event()
+
+        async def upsert_rows(rows):
+            started.set()
+            await asyncio.sleep(10)
+
+        journal = _journal(tmp_path, monkeypatch, upsert_rows)
+        journal._lock = asyncio.Lock()
+        await journal._rewrite_spool()
+        journal.record("tok", adds=["a.com"])
+        flushing = asyncio.create_task(journal.flush())
+        await started.wait()
+        flushing.cancel()
+        try:
+            await flushing
+        except asyncio.CancelledError:
+            pass
+        with open(journal._spool_path(), encoding="utf-8") as f:
+            return journal.overlay("tok", []), f.read()
+
+    overlay, spool = asyncio.run(run())
+    assert overlay == {"a.com"}
+    assert '"a.com"' in spool
@@ -0,0 +1,44 @@
+import asyncio
+
+from app.services.blocklist_local import LocalBlocklistStore
+
+
+def _open(path, **kwargs) -> LocalBlocklistStore:
+    store = LocalBlocklistStore(str(path), **kwargs)
+    # What start() does, without the periodic snapshot task
+    store._open()
+    return store
+
+
+def test_workers_sharing_the_file_keep_each_others_writes(tmp_path):
+    path = tmp_path / "local.db"
+    a, b = _open(path), _open(path)
+    a.add("tok", ["a.com", "gone.com"])
+    b.add("tok", ["b.com"])
+    a.snapshot()
+    b.snapshot()
+    a.discard("tok", ["gone.com"])
+    a.snapshot()
+    c = _open(path)
+    asyncio.run(c.preload("tok"))
+    assert c.get("tok") == {"a.com", "b.com"}
+
+
+def test_evicted_token_keeps_unsnapshotted_ops(tmp_path):
+    store = _open(tmp_path / "local.db", max_tokens=16)
+    store.add("tok", ["a.com", "b.com"])
+    store.snapshot()
+    store.discard("tok", ["a.com"])
+    store.add("tok", ["c.com"])
+    # Fill tok's shard until it is evicted
+    shard = store._shard("tok")
+    i = 0
+    while "tok" in shard.sets:
+        store.add(f"other-{i}", ["x.com"])
+        i += 1
+    asyncio.run(store.preload("tok"))
+    assert "tok" in shard.sets
+    assert store.get("tok") == {"b.com", "c.com"}
+    store.snapshot()
+    shard.sets.clear()
+    assert store.get("tok") == {"b.com", "c.com"}
@@ -0,0 +1,27 @@
+import time
+
+import pytest
+
+from app.services.blocklist_patterns import PatternMatcher, parse_pattern
+
+
+@pytest.mark.parametrize("pattern", ["/a*a*a*a*b/", "/(a+)+b/", "/(a)\\1/", "/ad(?=s)/"])
+def test_backtracking_prone_regexes_are_rejected(pattern):
+    with pytest.raises(ValueError):
+        parse_pattern(pattern)
+
+
+def test_match_time_is_bounded():
+    matcher = PatternMatcher(["/^ads?\\d*\\./", "/a+b/", "x.com/*a*a*a*c", "*.reddit.com/r/all*"])
+    started = time.monotonic()
+    assert matcher.match("a" * 2048) is None
+    assert matcher.match("x.com", "/" + "a" * 2040) is None
+    assert time.monotonic() - started < 0.1
+    assert matcher.match("old.reddit.com", "/r/all/top") == "*.reddit.com/r/all*"
+
+
+def test_regex_case_is_kept():
+    # \D and \d mean opposite things
+    assert parse_pattern("/^ads?\\D/") == "/^ads?\\D/"
+    assert PatternMatcher(["/^ads?\\D/"]).match("ad-x.example.com") == "/^ads?\\D/"
+    assert PatternMatcher(["/^ads?\\D/"]).match("ad1.example.com") is None
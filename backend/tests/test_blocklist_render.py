@@ -0,0 +1,14 @@
+from app.services.blocklist_cache import BlocklistCache
+from app.services.blocklist_render import _rpz_header
+
+
+def _serial(entry) -> int:
+    return int(_rpz_header(entry)[2].split()[5])
+
+
+def test_rpz_serial_grows_with_every_change():
+    cache = BlocklistCache()
+    serials = [_serial(cache.put("tok", domains, "base")) for domains in (["b.com"], ["a.com"], ["a.com", "c.com"])]
+    assert serials[0] < serials[1] < serials[2]
+    # A reload of unchanged content keeps the serial
+    assert _serial(cache.put("tok", ["a.com", "c.com"], "base")) == serials[2]
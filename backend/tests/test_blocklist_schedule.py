@@ -0,0 +1,78 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from app.services.blocklist_schedule import ScheduleIndex, parse_schedule, parse_value, schedule_value
+
+BERLIN = ZoneInfo("Europe/Berlin")
+
+
+def _ts(*args, tz=BERLIN) -> float:
+    return datetime(*args, tzinfo=tz).timestamp()
+
+
+def _naive_active(schedule, t: float) -> bool:
+    local = datetime.fromtimestamp(t, ZoneInfo(schedule.tz))
+    minute, day = local.hour * 60 + local.minute, local.weekday()
+    if schedule.end > schedule.start:
+        return day in schedule.days and schedule.start <= minute < schedule.end
+    # Past midnight: the window belongs to the day it started on
+    return (day in schedule.days and minute >= schedule.start) or (
+        (day - 1) % 7 in schedule.days and minute < schedule.end
+    )
+
+
+def test_parse_and_round_trip():
+    schedule = parse_schedule("fr-mo 22:00-06:30", "Europe/Berlin")
+    assert schedule.days == frozenset({4, 5, 6, 0})
+    assert (schedule.start, schedule.end) == (22 * 60, 6 * 60 + 30)
+    value = schedule_value("youtube.com", schedule)
+    assert value == "youtube.com#mo,fr,sa,su@22:00-06:30@Europe/Berlin"
+    assert parse_value(value) == ("youtube.com", schedule)
+    assert parse_schedule("09:00-24:00").days == frozenset(range(7))
+
+
+@pytest.mark.parametrize("raw,tz", [
+    ("mo-fr 09:00", "UTC"),
+    ("mo-fr 9-17", "UTC"),
+    ("xx 09:00-17:00", "UTC"),
+    ("09:00-09:00", "UTC"),
+    ("09:00-17:00", "Mars/Olympus"),
+])
+def test_invalid_schedules_are_rejected(raw, tz):
+    with pytest.raises(ValueError):
+        parse_schedule(raw, tz)
+    assert parse_value(f"a.com#{raw.replace(' ', '@')}@{tz}") is None
+
+
+def test_index_matches_the_schedules_over_a_week():
+    values = [
+        "a.com#mo,tu,we,th,fr@09:00-17:00@Europe/Berlin",
+        "b.com#fr,sa@22:00-02:00@Europe/Berlin",
+        "c.com#mo,tu,we,th,fr,sa,su@12:00-13:00@America/New_York",
+        "broken#nope",
+    ]
+    index = ScheduleIndex(values)
+    assert len(index.values) == 3
+    t, end = _ts(2026, 6, 1), _ts(2026, 6, 10)
+    while t < end:
+        active, nxt = index.active(t)
+        assert active == {v for v, _, s in index.values if _naive_active(s, t)}
+        # Nothing changes before the reported transition, and something does at it
+        assert nxt is not None and nxt > t
+        assert index.active(nxt)[0] != active
+        t += 15 * 60
+
+
+def test_windows_follow_local_time_across_dst():
+    index = ScheduleIndex(["a.com#mo,tu,we,th,fr,sa,su@09:00-10:00@Europe/Berlin"])
+    # Berlin moves from UTC+1 to UTC+2 on 2026-03-29
+    assert index.active(_ts(2026, 3, 28, 9, 30))[0] == {"a.com#mo,tu,we,th,fr,sa,su@09:00-10:00@Europe/Berlin"}
+    assert index.active(_ts(2026, 3, 29, 9, 30))[0] == {"a.com#mo,tu,we,th,fr,sa,su@09:00-10:00@Europe/Berlin"}
+    assert index.active(_ts(2026, 3, 29, 8, 30, tz=ZoneInfo("UTC")))[0] == frozenset()
+    assert index.active(_ts(2026, 3, 29, 10, 30))[0] == frozenset()
+
+
+def test_empty_index():
+    assert ScheduleIndex([]).active(_ts(2026, 6, 1)) == (frozenset(), None)
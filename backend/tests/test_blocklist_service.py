@@ -0,0 +1,78 @@
+import asyncio
+
+import httpx
+
+from app.services import blocklist_service
+from app.services.blocklist_cache import blocklist_cache
+from app.services.blocklist_store import blocklist_store
+from test_blocklist_store import FakePostgrest
+
+
+def _use(server, monkeypatch, delay: float = 0.0):
+    async def handler(request):
+        # The first write answers last, so a stale read-before-write would show up
+        if request.method == "POST" and b"first.com" in request.content:
+            await asyncio.sleep(delay)
+        return server(request)
+
+    monkeypatch.setattr(blocklist_store, "url", "http://supabase.test")
+    monkeypatch.setattr(blocklist_store, "service_role", "key")
+    monkeypatch.setattr(
+        blocklist_store, "_client",
+        httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://supabase.test/rest/v1"),
+    )
+
+
+def test_concurrent_writes_keep_each_others_values(monkeypatch):
+    server = FakePostgrest()
+    server.rows = {("tok-concurrent", "old.com")}
+    _use(server, monkeypatch, delay=0.05)
+
+    async def run():
+        await blocklist_service.get_blocklist("tok-concurrent")
+        await asyncio.gather(
+            blocklist_service.add_custom("tok-concurrent", ["first.com"]),
+            blocklist_service.add_custom("tok-concurrent", ["second.com"]),
+        )
+        return blocklist_cache.get("tok-concurrent").domains
+
+    assert asyncio.run(run()) == ("first.com", "old.com", "second.com")
+
+
+def test_cold_cache_write_takes_the_list_from_the_write(monkeypatch):
+    server = FakePostgrest()
+    server.rows = {("tok-cold", "old.com")}
+    _use(server, monkeypatch)
+    blocklist_cache.invalidate("tok-cold")
+
+    async def run():
+        added = await blocklist_service.add_custom("tok-cold", ["new.com"])
+        removed = await blocklist_service.remove_custom("tok-cold", "old.com")
+        return added, removed
+
+    added, removed = asyncio.run(run())
+    assert added == ["new.com", "old.com"] and removed == ["new.com"]
+    # One round trip each: the RPC for the cold write, then a plain delete on the warm cache
+    assert [m for m, _ in server.requests] == ["POST", "DELETE"]
+
+
+def test_journal_write_after_failed_read_is_not_cached(monkeypatch):
+    from app.services.blocklist_journal import blocklist_journal
+
+    recorded = []
+    monkeypatch.setattr(blocklist_journal, "_task", object())
+    monkeypatch.setattr(blocklist_journal, "record", lambda token, adds=(), removes=(): recorded.append(adds))
+    monkeypatch.setattr(blocklist_store, "url", "http://supabase.test")
+    monkeypatch.setattr(blocklist_store, "service_role", "key")
+    monkeypatch.setattr(
+        blocklist_store, "_client",
+        httpx.AsyncClient(
+            transport=httpx.MockTransport(lambda request: httpx.Response(503)),
+            base_url="http://supabase.test/rest/v1",
+        ),
+    )
+    blocklist_cache.invalidate("tok-degraded")
+
+    added = asyncio.run(blocklist_service.add_custom("tok-degraded", ["new.com"]))
+    assert added == ["new.com"] and recorded == [["new.com"]]
+    assert blocklist_cache.peek("tok-degraded") is None
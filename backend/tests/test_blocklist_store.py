@@ -0,0 +1,118 @@
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+import httpx
+
+from app.services.blocklist_schedule import parse_schedule, parse_value, schedule_value
+from app.services.blocklist_store import SupabaseBlocklistStore
+
+
+class FakePostgrest:
+    """Just enough of PostgREST's blocklist_domains table: eq/in filters, upserts, deletes, RPCs."""
+
+    def __init__(self):
+        self.rows = set()
+        self.requests = []
+
+    def _rpc(self, name: str, args: dict) -> httpx.Response:
+        token = args["p_token"]
+        if name == "blocklist_add":
+            self.rows.update((token, d) for d in args["p_domains"])
+        else:
+            self.rows.discard((token, args["p_domain"]))
+        return httpx.Response(200, json=[{"domain": d} for t, d in sorted(self.rows) if t == token])
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append((request.method, request.url.path))
+        if "/rpc/" in request.url.path:
+            return self._rpc(request.url.path.rsplit("/", 1)[1], json.loads(request.content))
+        params = {k: v[0] for k, v in parse_qs(request.url.query.decode()).items()}
+        token = params.get("token", "eq.")[3:]
+        if request.method == "POST":
+            body = json.loads(request.content)
+            for row in body:
+                self.rows.add((row["token"], row["domain"]))
+            return httpx.Response(201, json=[{"domain": row["domain"]} for row in body])
+        matched = [(t, d) for t, d in self.rows if t == token and self._domain_matches(params, d)]
+        if request.method == "DELETE":
+            self.rows.difference_update(matched)
+        return httpx.Response(200, json=[{"domain": d} for _, d in matched])
+
+    @staticmethod
+    def _domain_matches(params: dict, domain: str) -> bool:
+        if "domain" not in params:
+            return True
+        if params["domain"].startswith("in.("):
+            return domain in _parse_in(params["domain"][4:-1])
+        return params["domain"] == f"eq.{domain}"
+
+
+def _parse_in(body: str) -> list:
+    """Values of a PostgREST in.(...) list: comma-separated, optionally double-quoted with \\ escapes."""
+    values, cur, quoted, i = [], "", False, 0
+    while i < len(body):
+        c = body[i]
+        if quoted and c == "\\":
+            i += 1
+            cur += body[i]
+        elif c == '"':
+            quoted = not quoted
+        elif c == "," and not quoted:
+            values.append(cur)
+            cur = ""
+        else:
+            cur += c
+        i += 1
+    return values + [cur]
+
+
+def _store(server: FakePostgrest) -> SupabaseBlocklistStore:
+    store = SupabaseBlocklistStore()
+    store.url, store.service_role = "http://supabase.test", "key"
+    store._client = httpx.AsyncClient(transport=httpx.MockTransport(server), base_url="http://supabase.test/rest/v1")
+    return store
+
+
+def test_scheduled_value_round_trips_through_store():
+    value = schedule_value("youtube.com", parse_schedule("mo,tu 09:00-17:00", "Europe/Berlin"))
+
+    async def run():
+        store = _store(FakePostgrest())
+        written = await store.add("tok", [value, "Example.COM"])
+        listed = await store.list("tok")
+        removed = await store.remove("tok", value)
+        return written, listed, removed, await store.list("tok")
+
+    written, listed, removed, after = asyncio.run(run())
+    stored = next(v for v in listed if "#" in v)
+    assert stored == value and value in written and removed == [value]
+    assert parse_value(stored) == ("youtube.com", parse_schedule("mo,tu 09:00-17:00", "Europe/Berlin"))
+    # Plain domains are still normalized
+    assert "example.com" in listed and after == ["example.com"]
+
+
+def test_pattern_value_round_trips_through_store():
+    value = "~/^ads?\\D/"
+
+    async def run():
+        store = _store(FakePostgrest())
+        await store.add("tok", [value])
+        listed = await store.list("tok")
+        removed = await store.remove("tok", listed[0])
+        return listed, removed, await store.list("tok")
+
+    listed, removed, after = asyncio.run(run())
+    assert listed == [value] and removed == [value] and after == []
+
+
+def test_remove_many_escapes_quotes_and_backslashes():
+    values = ["~/a\\d\"x,y/", "~/b\\\\/", "plain.com"]
+
+    async def run():
+        server = FakePostgrest()
+        server.rows = {("tok", v) for v in values} | {("tok", "keep.com")}
+        await _store(server).remove_many("tok", values)
+        return server.rows
+
+    assert asyncio.run(run()) == {("tok", "keep.com")}
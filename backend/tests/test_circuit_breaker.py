@@ -0,0 +1,76 @@
+import httpx
+import pytest
+
+from app.services import circuit_breaker
+from app.services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(circuit_breaker, "BREAKERS_ENABLED", True)
+    monkeypatch.setattr(circuit_breaker, "BREAKER_MIN_CALLS", 4)
+    monkeypatch.setattr(circuit_breaker, "BREAKER_FAILURE_RATE", 0.5)
+    monkeypatch.setattr(circuit_breaker, "BREAKER_OPEN_SECONDS", 15.0)
+    return now
+
+
+def _fail(breaker: CircuitBreaker):
+    with pytest.raises(RuntimeError):
+        with breaker.guard():
+            raise RuntimeError("down")
+
+
+def _succeed(breaker: CircuitBreaker):
+    with breaker.guard():
+        pass
+
+
+def test_opens_on_failure_rate_and_rejects(clock):
+    breaker = CircuitBreaker("dep", slow_call=5.0)
+    _succeed(breaker)
+    _succeed(breaker)
+    _fail(breaker)
+    assert breaker.state == CLOSED  # below BREAKER_MIN_CALLS
+    _fail(breaker)
+    assert breaker.state == OPEN and breaker.opened == 1
+    with pytest.raises(CircuitOpen):
+        _succeed(breaker)
+    assert breaker.rejected == 1
+
+
+def test_half_open_probe_closes_or_reopens(clock):
+    breaker = CircuitBreaker("dep", slow_call=5.0)
+    for _ in range(4):
+        _fail(breaker)
+    assert breaker.state == OPEN
+    clock[0] += 15.0
+    assert breaker.current_state() == HALF_OPEN
+    # A failed probe opens it again for another BREAKER_OPEN_SECONDS
+    _fail(breaker)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpen):
+        _succeed(breaker)
+    clock[0] += 15.0
+    with breaker.guard():
+        # Only one probe at a time
+        with pytest.raises(CircuitOpen):
+            breaker.fail_fast()
+    assert breaker.state == CLOSED
+
+
+def test_slow_calls_and_client_errors(clock):
+    breaker = CircuitBreaker("dep", slow_call=1.0)
+    request = httpx.Request("GET", "http://dep.test")
+    for _ in range(4):
+        # 4xx means the dependency is up; it does not count as a failure
+        with pytest.raises(httpx.HTTPStatusError):
+            with breaker.guard():
+                raise httpx.HTTPStatusError("bad", request=request, response=httpx.Response(404, request=request))
+    assert breaker.state == CLOSED
+    breaker = CircuitBreaker("dep", slow_call=1.0)
+    for _ in range(4):
+        with breaker.guard():
+            clock[0] += 2.0
+    assert breaker.state == OPEN
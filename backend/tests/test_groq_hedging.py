@@ -0,0 +1,73 @@
+import asyncio
+import json
+
+import httpx
+
+from app.services import groq_service
+from app.services.groq_service import GroqClient
+from app.services.llm_usage import LLMUsageLedger
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def _groq(monkeypatch, delays):
+    """A GroqClient whose fake API answers each model after delays[model] seconds."""
+    monkeypatch.setattr(groq_service, "llm_usage", LLMUsageLedger(path="", table=""))
+    monkeypatch.setattr(groq_service, "GROQ_HEDGE", True)
+    monkeypatch.setattr(groq_service, "GROQ_HEDGE_MODEL", "hedge-model")
+    monkeypatch.setattr(groq_service, "GROQ_HEDGE_INITIAL_DELAY", 0.05)
+    seen = {"started": [], "cancelled": []}
+
+    async def handler(request):
+        model = json.loads(request.content)["model"]
+        seen["started"].append(model)
+        try:
+            await asyncio.sleep(delays[model])
+        except asyncio.CancelledError:
+            seen["cancelled"].append(model)
+            raise
+        return httpx.Response(200, json={"choices": [{"message": {"content": f"from {model}"}}]})
+
+    groq = GroqClient()
+    groq._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return groq, seen
+
+
+def test_slow_primary_is_hedged_and_cancelled(monkeypatch):
+    groq, seen = _groq(monkeypatch, {groq_service.GROQ_MODEL: 1.0, "hedge-model": 0.01})
+
+    content = asyncio.run(groq.chat(MESSAGES, max_tokens=10))
+
+    assert content == "from hedge-model"
+    assert seen == {"started": [groq_service.GROQ_MODEL, "hedge-model"], "cancelled": [groq_service.GROQ_MODEL]}
+    assert groq.hedges == 1 and groq.hedge_wins == 1
+    assert groq.models[groq_service.GROQ_MODEL]["cancelled"] == 1
+    assert groq.models["hedge-model"]["wins"] == 1
+
+
+def test_fast_primary_is_not_hedged(monkeypatch):
+    groq, seen = _groq(monkeypatch, {groq_service.GROQ_MODEL: 0.01, "hedge-model": 0.01})
+
+    content = asyncio.run(groq.chat(MESSAGES, max_tokens=10))
+
+    assert content == f"from {groq_service.GROQ_MODEL}"
+    assert seen["started"] == [groq_service.GROQ_MODEL]
+    assert groq.hedges == 0
+
+
+def test_no_hedge_without_budget(monkeypatch):
+    groq, seen = _groq(monkeypatch, {groq_service.GROQ_MODEL: 0.1, "hedge-model": 0.01})
+    groq._hedge_budget = 0
+    monkeypatch.setattr(groq_service, "GROQ_HEDGE_MAX_RATE", 0.5)
+
+    async def run():
+        # The first call only refills half a hedge; the second can afford one
+        first = await groq.chat(MESSAGES, max_tokens=10)
+        second = await groq.chat(MESSAGES, max_tokens=10)
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert first == f"from {groq_service.GROQ_MODEL}"
+    assert second == "from hedge-model"
+    assert groq.hedges_over_budget == 1 and groq.hedges == 1
@@ -0,0 +1,68 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.services.groq_service import GroqRateLimited, GroqRateScheduler
+
+
+def _drained(rpm: float = 1200, tpm: float = 1_000_000) -> GroqRateScheduler:
+    """A scheduler with no requests left; one frees up every 60 / rpm seconds."""
+    scheduler = GroqRateScheduler(rpm=rpm, tpm=tpm, max_wait=2)
+    scheduler._requests = 0
+    return scheduler
+
+
+def test_users_are_admitted_round_robin():
+    async def run():
+        scheduler = _drained()
+        order = []
+
+        async def call(user, n):
+            await scheduler.acquire(user, 10)
+            order.append(f"{user}{n}")
+
+        await asyncio.gather(call("a", 1), call("a", 2), call("a", 3), call("b", 1))
+        return scheduler, order
+
+    scheduler, order = asyncio.run(run())
+    assert order == ["a1", "b1", "a2", "a3"]
+    assert scheduler.admitted == 4
+    assert scheduler.stats()["queued"] == 0
+
+
+def test_caller_gives_up_after_max_wait():
+    async def run():
+        scheduler = _drained(rpm=60)
+        with pytest.raises(GroqRateLimited):
+            await scheduler.acquire("a", 10, max_wait=0.05)
+        return scheduler
+
+    scheduler = asyncio.run(run())
+    assert scheduler.timeouts == 1 and scheduler.admitted == 0
+    assert scheduler.stats()["queued"] == 0
+
+
+def test_token_bucket_holds_large_requests():
+    async def run():
+        # 600 tokens refill in 0.1s
+        scheduler = GroqRateScheduler(rpm=1000, tpm=360_000, max_wait=2)
+        scheduler._tokens = 0
+        started = time.monotonic()
+        await scheduler.acquire("a", 600)
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) >= 0.09
+
+
+def test_429_retry_after_pauses_admission():
+    async def run():
+        scheduler = GroqRateScheduler(rpm=1000, tpm=1_000_000, max_wait=2)
+        scheduler.observe(httpx.Response(429, headers={"retry-after": "0.1"}))
+        assert scheduler.congested()
+        started = time.monotonic()
+        await scheduler.acquire("a", 10)
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) >= 0.09
@@ -0,0 +1,24 @@
+import asyncio
+
+from app.services import history_service
+
+
+def _generate(monkeypatch, reply):
+    async def fake(prompt, user="", template="default"):
+        return list(reply)
+
+    monkeypatch.setattr(history_service, "generate_questions_with_prompt", fake)
+    themes, axes = ["study"], {axis: [] for axis in history_service.AXES}
+    return asyncio.run(history_service._generate(themes, axes, "planning a trip with friends", "u1"))
+
+
+def test_untagged_model_reply_is_not_model_output(monkeypatch):
+    questions, from_model = _generate(monkeypatch, ["Some line without a tag.", "Another one."])
+    assert len(questions) == history_service.PER_AXIS * len(history_service.AXES)
+    assert from_model is False
+
+
+def test_tagged_model_reply_is_model_output(monkeypatch):
+    axis = history_service.AXES[0]
+    _, from_model = _generate(monkeypatch, [f"[{axis}] I plan my week on Sunday evenings."])
+    assert from_model is True
@@ -0,0 +1,67 @@
+import asyncio
+import json
+import time
+
+import httpx
+
+from app.services import llm_usage as llm_usage_module
+from app.services.circuit_breaker import OPEN
+from app.services.llm_usage import LLMUsageLedger
+
+
+def _supabase(monkeypatch, handler):
+    store = llm_usage_module.blocklist_store
+    monkeypatch.setattr(store, "url", "http://supabase.test")
+    monkeypatch.setattr(store, "service_role", "key")
+    monkeypatch.setattr(
+        store, "_client",
+        httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://supabase.test/rest/v1"),
+    )
+    return store
+
+
+def test_failed_sink_does_not_make_the_other_double_count(tmp_path, monkeypatch):
+    inserted = []
+    fail = [True]
+
+    def handler(request):
+        if fail[0]:
+            return httpx.Response(503)
+        inserted.extend(json.loads(request.content))
+        return httpx.Response(201)
+
+    _supabase(monkeypatch, handler)
+    path = tmp_path / "usage.jsonl"
+    ledger = LLMUsageLedger(path=str(path), table="llm_usage")
+    usage = {"prompt_tokens": 10, "completion_tokens": 5}
+
+    async def run():
+        ledger.record("u1", "questions", usage, max_tokens=100)
+        await ledger.flush()
+        fail[0] = False
+        ledger.record("u1", "questions", usage, max_tokens=100)
+        await ledger.flush()
+
+    asyncio.run(run())
+    with open(path, encoding="utf-8") as f:
+        file_rows = [json.loads(line) for line in f]
+    assert sum(r["total_tokens"] for r in file_rows) == 30
+    assert sum(r["total_tokens"] for r in inserted) == 30
+    assert ledger.stats()["pending_rows"] == {"file": 0, "supabase": 0}
+
+
+def test_open_blocklist_breaker_does_not_drop_usage(monkeypatch):
+    inserted = []
+
+    def handler(request):
+        assert request.url.path == "/rest/v1/llm_usage"
+        inserted.extend(json.loads(request.content))
+        return httpx.Response(201)
+
+    store = _supabase(monkeypatch, handler)
+    monkeypatch.setattr(store.breaker, "state", OPEN)
+    monkeypatch.setattr(store.breaker, "_opened_at", time.monotonic())
+    ledger = LLMUsageLedger(path="", table="llm_usage")
+    ledger.record("u1", "questions", {"prompt_tokens": 1, "completion_tokens": 1}, max_tokens=100)
+    asyncio.run(ledger.flush())
+    assert len(inserted) == 1 and ledger.flush_errors == 0
@@ -0,0 +1,21 @@
+import asyncio
+
+from app.services import history_service
+
+
+def test_flights_are_not_shared_across_users(monkeypatch):
+    callers = []
+
+    async def fake_generate(themes, axes, user_ctx, user_id=""):
+        callers.append(user_id)
+        await asyncio.sleep(0.01)
+        return [{"question": "q", "options": ["Agree", "Disagree"]}], False
+
+    monkeypatch.setattr(history_service, "_generate", fake_generate)
+    history = [{"role": "user", "content": "I study late at night before exams"}]
+
+    async def run():
+        await asyncio.gather(*(history_service.generate_questions(history, u) for u in ("u1", "u1", "u2")))
+
+    asyncio.run(run())
+    assert sorted(callers) == ["u1", "u2"]
@@ -0,0 +1,18 @@
+import asyncio
+
+from app.api.routes_blocklist import blocklist_add, blocklist_remove
+from app.services.blocklist_cache import blocklist_cache
+
+
+def test_remove_normalizes_like_add():
+    token = "routes-remove-normalized"
+
+    async def run():
+        for raw in ("https://Bücher.example:8443/path", "News.example:80"):
+            await blocklist_add(token, {"domain": raw})
+        await blocklist_remove(token, {"domain": "https://Bücher.example:8443/path"})
+        return await blocklist_remove(token, {"domain": "News.example:80"})
+
+    result = asyncio.run(run())
+    blocklist_cache.invalidate(token)
+    assert result == {"custom": []}
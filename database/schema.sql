@@ -166,3 +166,43 @@ create table if not exists recommendations (
 );
 create index if not exists idx_recommendations_user_id on recommendations(user_id);
 create index if not exists idx_recommendations_created_at on recommendations(created_at);
+
+-- 7) LLM USAGE (flushed deltas from the backend ledger; sum per day/user/endpoint/template)
+create table if not exists llm_usage (
+  id bigserial primary key,
+  day date not null,
+  user_id text not null default '',
+  endpoint text not null,
+  template text not null,
+  calls int not null default 0,
+  prompt_tokens int not null default 0,
+  completion_tokens int not null default 0,
+  total_tokens int not null default 0,
+  truncated int not null default 0,
+  estimated int not null default 0,
+  flushed_at timestamp with time zone default now()
+);
+create index if not exists idx_llm_usage_day_user on llm_usage(day, user_id);
+
+-- 8) BLOCKLIST DOMAINS (per-token values behind /blocklist: domains, "@category", "domain#schedule", "~pattern")
+create table if not exists blocklist_domains (
+  token text not null,
+  domain text not null,
+  created_at timestamp with time zone default now(),
+  primary key (token, domain)
+);
+
+-- Writes on a cold cache: upsert/delete and return the token's whole list in one round trip
+create or replace function blocklist_add(p_token text, p_domains text[])
+returns table(domain text) language sql as $$
+  insert into blocklist_domains (token, domain)
+  select p_token, d from unnest(p_domains) as d
+  on conflict (token, domain) do nothing;
+  select b.domain from blocklist_domains b where b.token = p_token order by b.domain;
+$$;
+
+create or replace function blocklist_remove(p_token text, p_domain text)
+returns table(domain text) language sql as $$
+  delete from blocklist_domains b where b.token = p_token and b.domain = p_domain;
+  select b.domain from blocklist_domains b where b.token = p_token order by b.domain;
+$$;